@@ -1,6 +1,6 @@
 from pydantic_settings import BaseSettings
 from pydantic import PostgresDsn
-from typing import Optional
+from typing import List, Optional
 
 
 class Settings(BaseSettings):
@@ -9,6 +9,108 @@ class Settings(BaseSettings):
     ALGORITHM: str
     ACCESS_TOKEN_EXPIRE_MINUTES: int
 
+    # Пул соединений с БД (у синхронного и асинхронного движка — по своему пулу).
+    # Роутеры работают через асинхронный движок: asyncpg / aiosqlite
+    DB_ASYNC_URL: str = ""  # пусто — DB_URL с асинхронным драйвером
+    DB_POOL_SIZE: int = 10
+    DB_MAX_OVERFLOW: int = 20
+    DB_POOL_TIMEOUT_SECONDS: float = 30.0
+    DB_POOL_PRE_PING: bool = True
+    DB_POOL_RECYCLE_SECONDS: int = 1800  # -1 — не пересоздавать соединения
+
+    # Кэш аутентифицированных пользователей (снимки в памяти процесса)
+    AUTH_USER_CACHE_TTL_SECONDS: float = 30.0
+    AUTH_USER_CACHE_MAX_ENTRIES: int = 10000
+    # Кэш проверенных JWT (до exp токена); 0 — проверять подпись каждый раз
+    AUTH_TOKEN_CACHE_MAX_ENTRIES: int = 10000
+
+    # Хеширование паролей: bcrypt в отдельном пуле процессов. При смене
+    # стоимости хеш пользователя пересчитывается при следующем входе
+    PASSWORD_BCRYPT_ROUNDS: int = 12
+    PASSWORD_HASH_WORKERS: int = 2
+    PASSWORD_HASH_MAX_PENDING: int = 64  # хеширований в работе и в очереди, дальше — 503
+    PASSWORD_HASH_RETRY_AFTER_SECONDS: int = 1
+
+    # Загрузка и прогрев модели при старте (в фоне)
+    CLASSIFIER_EAGER_LOAD: bool = True
+    CLASSIFIER_WARMUP_BATCH_SIZES: List[int] = [1, 4, 8]
+
+    # Микро-батчинг инференса классификатора
+    CLASSIFIER_BATCHING_ENABLED: bool = True
+    CLASSIFIER_BATCH_MAX_SIZE: int = 16
+    CLASSIFIER_BATCH_MAX_WAIT_MS: float = 10.0
+    CLASSIFIER_MAX_BATCH_FILES: int = 16  # файлов в одном запросе /classify-batch
+
+    # Бэкенд инференса: eager | int8 | torchscript | onnx.
+    # При загрузке бэкенд сверяется с fp32 по top-1 на калибровочном наборе
+    CLASSIFIER_BACKEND: str = "eager"
+    # Без калибровочных изображений бэкенд не включается
+    CLASSIFIER_CALIBRATION_DIR: str = ""
+    CLASSIFIER_CALIBRATION_SIZE: int = 16
+    CLASSIFIER_CALIBRATION_SYNTHETIC: bool = False  # сверять на шуме, если каталога нет (только для отладки)
+    CLASSIFIER_MIN_AGREEMENT: float = 0.95
+
+    # Кэш результатов классификации по хешу изображения
+    CLASSIFIER_CACHE_ENABLED: bool = True
+    CLASSIFIER_CACHE_MAX_MB: float = 16.0
+    CLASSIFIER_CACHE_TTL_SECONDS: int = 3600
+    CLASSIFIER_CACHE_DISK_DIR: str = ""  # пусто — только память
+
+    # Поиск похожих блюд по эмбеддингам: flat — точный перебор, ivf — IVF + int8
+    EMBEDDING_INDEX_MODE: str = "flat"
+    EMBEDDING_IVF_LISTS: int = 16
+    EMBEDDING_IVF_PROBES: int = 4
+    EMBEDDING_INDEX_MAX_USERS: int = 1000
+    EMBEDDING_INDEX_TTL_SECONDS: float = 600.0  # индекс в памяти перестраивается не реже
+    MEAL_MATCH_MIN_SIMILARITY: float = 0.92
+
+    # Пул потоков инференса. С батчингом воркеры в основном ждут планировщик,
+    # поэтому их число ограничивает сверху достижимый размер батча
+    INFERENCE_WORKERS: int = 8
+    INFERENCE_MAX_PENDING: int = 32  # запросов в работе и в очереди, дальше — 503
+    INFERENCE_TORCH_THREADS: int = 0  # 0 — подобрать автоматически
+    INFERENCE_RETRY_AFTER_SECONDS: int = 1
+
+    # Режим классификатора: "local" — модель в процессе API,
+    # "server" — инференс в отдельном сервере модели (python -m app.models.server)
+    CLASSIFIER_MODE: str = "local"
+    MODEL_SERVER_ADDRESS: str = "127.0.0.1:8765"  # host:port или путь unix-сокета
+    MODEL_SERVER_AUTHKEY: str = ""  # по умолчанию используется SECRET_KEY
+    MODEL_SERVER_PROCESSES: int = 2
+    MODEL_SERVER_TORCH_THREADS: int = 0  # 0 — ядра делятся поровну между процессами
+    MODEL_SERVER_TIMEOUT_SECONDS: float = 30.0
+
+    # Ограничения загрузок: размер тела запроса проверяется до разбора multipart,
+    # размер и формат каждого файла — до декодирования
+    UPLOAD_MAX_REQUEST_MB: float = 50.0
+    UPLOAD_MAX_FILE_MB: float = 15.0
+
+    # Таблица КБЖУ по классам классификатора (CSV на 100 г); перечитывается
+    # при изменении файла, проверка не чаще раза в интервал
+    NUTRITION_TABLE_PATH: str = ""  # пусто — app/models/nutrition.csv
+    NUTRITION_RELOAD_INTERVAL_SECONDS: float = 5.0
+
+    # Оценка порции: сегментация блюда и вес по площади.
+    # auto — DeepLab при наличии весов, иначе классическая сегментация
+    PORTION_MODE: str = "auto"  # auto | deeplab | classical
+    PORTION_RESOLUTION: int = 128  # сторона маски; меньше — быстрее на CPU
+    SEGMENTATION_MODEL_PATH: str = ""  # пусто — app/models/segmentation_model.pth
+    PORTION_REFERENCE_AREA: float = 0.25  # доля кадра, занимаемая типичной порцией
+
+    # Кэш отчётов /analytics/progress: сбрасывается после новых записей
+    # о приемах пищи; TTL ограничивает устаревание в других процессах API
+    ANALYTICS_CACHE_TTL_SECONDS: float = 300.0
+    ANALYTICS_CACHE_MAX_USERS: int = 1024
+    ANALYTICS_CACHE_MAX_REPORTS_PER_USER: int = 8
+
+    # Миниатюры фотографий блюд (WebP, создаются в фоне после загрузки)
+    THUMBNAIL_SIZE: int = 320
+    THUMBNAIL_QUALITY: int = 75
+    THUMBNAIL_WORKERS: int = 1
+
+    # Метрики Prometheus на /metrics: этапы инференса, SQL, HTTP
+    METRICS_ENABLED: bool = True
+
     class Config:
         env_file = ".env"
         env_file_encoding = "utf-8"
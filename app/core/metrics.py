@@ -0,0 +1,249 @@
+# app/core/metrics.py
+"""
+Метрики в текстовом формате Prometheus без внешних зависимостей.
+
+Гистограммы и счётчики обновляются под короткой блокировкой (bisect по
+фиксированным корзинам), поэтому их можно вызывать на горячем пути.
+Значения, которые уже хранятся в других объектах (кэш, очереди), снимаются
+функциями-сборщиками в момент запроса /metrics.
+"""
+
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Sequence, Tuple
+
+# Корзины задержек, секунды: от 0.5 мс до 30 с
+LATENCY_BUCKETS = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1,
+    0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0,
+)
+
+_REGISTRY: List["_Metric"] = []
+_COLLECTORS: List[Callable[[], List[Tuple[str, str, str, Dict[Tuple, float]]]]] = []
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names: Sequence[str], values: Sequence) -> str:
+    if not names:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in zip(names, values)) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        _REGISTRY.append(self)
+
+    def _key(self, labels: dict) -> Tuple:
+        return tuple(labels.get(name, "") for name in self.labelnames)
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    """Монотонный счётчик"""
+
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def render(self) -> List[str]:
+        lines = super().render()
+        with self._lock:
+            items = list(self._values.items())
+        for key, value in items:
+            lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}")
+        return lines
+
+
+class Gauge(Counter):
+    """Текущее значение"""
+
+    kind = "gauge"
+
+    def set(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = float(value)
+
+
+class Histogram(_Metric):
+    """Гистограмма с фиксированными корзинами"""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # По ключу меток: (счётчики по корзинам + переполнение, сумма)
+        self._series: Dict[Tuple, list] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    @contextmanager
+    def time(self, **labels):
+        """Замеряет длительность блока with"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def render(self) -> List[str]:
+        lines = super().render()
+        with self._lock:
+            items = [(key, list(counts), total) for key, (counts, total) in self._series.items()]
+        for key, counts, total in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                labels = _format_labels(self.labelnames + ("le",), key + (_format_value(bound),))
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+def register_collector(collector: Callable[[], List[Tuple[str, str, str, Dict[Tuple, float]]]]):
+    """
+    Регистрирует функцию, снимающую значения при запросе /metrics.
+    Функция возвращает список (имя, тип, описание, {(пары меток...): значение}).
+    """
+    _COLLECTORS.append(collector)
+    return collector
+
+
+def render() -> str:
+    """Все метрики в текстовом формате Prometheus 0.0.4"""
+    lines: List[str] = []
+    for metric in _REGISTRY:
+        lines.extend(metric.render())
+    for collector in _COLLECTORS:
+        for name, kind, documentation, values in collector():
+            lines.append(f"# HELP {name} {documentation}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, value in values.items():
+                names = tuple(label for label, _ in labels)
+                label_values = tuple(label_value for _, label_value in labels)
+                lines.append(f"{name}{_format_labels(names, label_values)} {_format_value(value)}")
+    return "\n".join(lines) + "\n"
+
+
+# Метрики приложения
+
+HTTP_REQUEST_SECONDS = Histogram(
+    "snapcalorie_http_request_duration_seconds",
+    "Длительность обработки HTTP-запроса",
+    ("method", "route", "status"),
+)
+
+INFERENCE_STAGE_SECONDS = Histogram(
+    "snapcalorie_inference_stage_duration_seconds",
+    "Длительность этапов классификации: validate, decode, transform, forward, postprocess",
+    ("stage",),
+)
+
+INFERENCE_BATCH_SIZE = Histogram(
+    "snapcalorie_inference_batch_size",
+    "Размер батча forward-прохода",
+    buckets=(1, 2, 4, 8, 16, 32, 64),
+)
+
+DB_QUERY_SECONDS = Histogram(
+    "snapcalorie_db_query_duration_seconds",
+    "Длительность SQL-запросов",
+    ("operation",),
+)
+
+MODEL_LOAD_SECONDS = Gauge(
+    "snapcalorie_model_load_seconds",
+    "Длительность последней загрузки (load) и прогрева (warmup) модели",
+    ("phase",),
+)
+
+
+def instrument_engine(engine):
+    """Замеряет каждый SQL-запрос движка SQLAlchemy"""
+    from sqlalchemy import event
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        started = conn.info["query_started"].pop()
+        operation = statement.lstrip().split(None, 1)[0].lower() if statement.strip() else "other"
+        DB_QUERY_SECONDS.observe(time.perf_counter() - started, operation=operation)
+
+    @event.listens_for(engine, "handle_error")
+    def _error(context):
+        # Запрос упал — after_cursor_execute не будет вызван
+        if context.connection is not None:
+            stack = context.connection.info.get("query_started")
+            if stack:
+                stack.pop()
+
+
+class MetricsMiddleware:
+    """ASGI-middleware: длительность запросов по шаблону маршрута (не по URL)"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        status = [500]
+
+        async def send_with_status(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            # Роутер дописывает найденный маршрут в scope
+            route = getattr(scope.get("route"), "path", "unmatched")
+            HTTP_REQUEST_SECONDS.observe(
+                time.perf_counter() - started,
+                method=scope["method"], route=route, status=status[0],
+            )
@@ -0,0 +1,146 @@
+# app/core/passwords.py
+"""
+Хеширование паролей в отдельном пуле процессов.
+
+bcrypt — сотни миллисекунд чистого CPU на вызов: в общем пуле потоков
+всплеск входов занимает все потоки и тормозит остальные запросы. Пул
+процессов ограничен по числу воркеров (сколько ядер отдаётся bcrypt) и по
+очереди: при переполнении сразу выбрасывается PasswordQueueFull (503 с
+Retry-After) вместо бесконечного роста очереди.
+"""
+
+import asyncio
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Callable, Optional, Tuple
+
+from app.core import security
+from app.core.metrics import register_collector
+
+logger = logging.getLogger(__name__)
+
+
+class PasswordQueueFull(Exception):
+    """Очередь хеширования переполнена — запрос нужно повторить позже"""
+
+    def __init__(self, retry_after: int = 1):
+        super().__init__("Очередь хеширования паролей переполнена")
+        self.retry_after = retry_after
+
+
+class PasswordHasher:
+    """Ограниченный пул процессов для bcrypt"""
+
+    def __init__(self, workers: int = 2, max_pending: int = 64, retry_after: int = 1):
+        self.workers = max(1, workers)
+        self.max_pending = max(self.workers, max_pending)
+        self.retry_after = retry_after
+
+        self._executor = self._create_executor()
+        # Счётчики меняются только из event loop, блокировка не нужна
+        self._pending = 0
+        self._completed = 0
+        self._failed = 0
+        self._rejected = 0
+
+    def _create_executor(self) -> ProcessPoolExecutor:
+        # spawn, а не fork: в процессе API уже работают потоки (torch, пулы),
+        # fork с ними может оставить в дочернем процессе захваченные блокировки
+        return ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+
+    async def _run(self, fn: Callable, *args):
+        if self._pending >= self.max_pending:
+            self._rejected += 1
+            raise PasswordQueueFull(self.retry_after)
+
+        self._pending += 1
+        try:
+            loop = asyncio.get_running_loop()
+            executor = self._executor
+            try:
+                result = await loop.run_in_executor(executor, fn, *args)
+            except BrokenProcessPool:
+                # Воркер упал (например, OOM killer) — пересоздаём пул и повторяем один раз.
+                # BrokenProcessPool получают все задачи в полёте: пул пересоздаёт
+                # только первая, остальные повторяют уже на новом
+                if self._executor is executor:
+                    logger.warning("Пул хеширования паролей сломан, пересоздаём")
+                    executor.shutdown(wait=False, cancel_futures=True)
+                    self._executor = self._create_executor()
+                result = await loop.run_in_executor(self._executor, fn, *args)
+        except BaseException:
+            self._failed += 1
+            raise
+        finally:
+            self._pending -= 1
+        self._completed += 1
+        return result
+
+    async def hash(self, password: str) -> str:
+        """bcrypt-хеш пароля с текущей стоимостью"""
+        return await self._run(security.hash_password, password)
+
+    async def verify_and_update(self, password: str, hashed: str) -> Tuple[bool, Optional[str]]:
+        """(пароль верен, новый хеш или None — если стоимость не менялась)"""
+        return await self._run(security.verify_and_update_password, password, hashed)
+
+    def stats(self) -> dict:
+        """Статистика пула"""
+        return {
+            "workers": self.workers,
+            "pending": self._pending,
+            "max_pending": self.max_pending,
+            "completed": self._completed,
+            "failed": self._failed,
+            "rejected": self._rejected,
+        }
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+_hasher: Optional[PasswordHasher] = None
+
+
+def get_password_hasher() -> PasswordHasher:
+    """Возвращает пул хеширования паролей (singleton)"""
+    global _hasher
+    if _hasher is None:
+        from app.core.config import settings
+
+        _hasher = PasswordHasher(
+            workers=settings.PASSWORD_HASH_WORKERS,
+            max_pending=settings.PASSWORD_HASH_MAX_PENDING,
+            retry_after=settings.PASSWORD_HASH_RETRY_AFTER_SECONDS,
+        )
+    return _hasher
+
+
+def shutdown_password_hasher():
+    """Останавливает процессы пула (при завершении приложения)"""
+    global _hasher
+    if _hasher is not None:
+        _hasher.shutdown()
+        _hasher = None
+
+
+@register_collector
+def _collect_metrics():
+    """Глубина очереди и отказы пула хеширования для /metrics"""
+    if _hasher is None:
+        return []
+    stats = _hasher.stats()
+    return [
+        ("snapcalorie_password_hash_pending", "gauge", "Хеширований паролей в работе и в очереди",
+         {(): stats["pending"]}),
+        ("snapcalorie_password_hash_requests_total", "counter", "Хеширований паролей по результату", {
+            (("result", "completed"),): stats["completed"],
+            (("result", "failed"),): stats["failed"],
+            (("result", "rejected"),): stats["rejected"],
+        }),
+    ]
@@ -1,13 +1,25 @@
 # app/core/security.py
 
+import hashlib
+import threading
+import time
+from collections import OrderedDict
 from passlib.context import CryptContext
 from datetime import datetime, timedelta
+from typing import Optional, Tuple
 import jwt
 
 from app.core.config import settings
 
-# Настраиваем bcrypt
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Настраиваем bcrypt: хеши с другой стоимостью считаются устаревшими
+# (в обе стороны) и пересчитываются при следующем успешном входе
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__default_rounds=settings.PASSWORD_BCRYPT_ROUNDS,
+    bcrypt__min_rounds=settings.PASSWORD_BCRYPT_ROUNDS,
+    bcrypt__max_rounds=settings.PASSWORD_BCRYPT_ROUNDS,
+)
 
 
 def hash_password(password: str) -> str:
@@ -24,6 +36,14 @@ def verify_password(plain: str, hashed: str) -> bool:
     return pwd_context.verify(plain, hashed)
 
 
+def verify_and_update_password(plain: str, hashed: str) -> Tuple[bool, Optional[str]]:
+    """
+    Проверяет пароль; если хеш устарел (другая стоимость bcrypt),
+    возвращает новый хеш вторым элементом, иначе None.
+    """
+    return pwd_context.verify_and_update(plain, hashed)
+
+
 def create_access_token(user_id: int) -> str:
     """
     Генерирует JWT с полем 'sub' = user_id и временем жизни из настроек.
@@ -37,14 +57,84 @@ def create_access_token(user_id: int) -> str:
     return token
 
 
+class VerifiedTokenCache:
+    """
+    LRU уже проверенных токенов: sha256 токена -> (exp, user_id).
+
+    Запись живёт до exp самого токена, поэтому просроченный токен снова
+    идёт через jwt.decode и получает ExpiredSignatureError. Хранится хеш,
+    а не сам токен: дамп памяти процесса не раскрывает действующие токены.
+    """
+
+    def __init__(self, max_entries: int = 10000):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[bytes, Tuple[float, int]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+        self._hits = 0
+        self._misses = 0
+
+    def get(self, key: bytes) -> Optional[int]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and time.time() < entry[0]:
+                self._entries.move_to_end(key)
+                self._hits += 1
+                return entry[1]
+            if entry is not None:
+                del self._entries[key]
+            self._misses += 1
+            return None
+
+    def put(self, key: bytes, user_id: int, expires_at: float):
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (expires_at, user_id)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "hits": self._hits,
+                "misses": self._misses,
+            }
+
+
+_token_cache: Optional[VerifiedTokenCache] = None
+
+
+def get_token_cache() -> VerifiedTokenCache:
+    """Возвращает кэш проверенных токенов (singleton)"""
+    global _token_cache
+    if _token_cache is None:
+        _token_cache = VerifiedTokenCache(max_entries=settings.AUTH_TOKEN_CACHE_MAX_ENTRIES)
+    return _token_cache
+
+
 def decode_access_token(token: str) -> int:
     """
     Раскодирует JWT, проверяет подпись и срок, возвращает user_id.
+
+    Токен, уже проверенный этим процессом и ещё не истёкший, берётся из
+    кэша — повторные запросы с тем же токеном обходятся без HMAC и разбора JSON.
     """
-    try:
-        payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
-        return int(payload.get("sub"))
-    except jwt.ExpiredSignatureError:
-        raise
-    except Exception:
-        raise
+    cache = get_token_cache()
+    key = hashlib.sha256(token.encode()).digest()
+    user_id = cache.get(key)
+    if user_id is not None:
+        return user_id
+
+    payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
+    user_id = int(payload.get("sub"))
+    # Токены без exp не кэшируем: запись ограничена сроком жизни токена
+    if "exp" in payload:
+        cache.put(key, user_id, float(payload["exp"]))
+    return user_id
@@ -1,3 +1,4 @@
 # app/db/__init__.py
-from .session import engine, SessionLocal
+from .session import engine, SessionLocal, async_engine, AsyncSessionLocal
 from .models import Base
+from . import summaries  # noqa: F401 — обработчики flush для daily_nutrition_summary
@@ -1,6 +1,6 @@
 # app/db/models.py
 from datetime import datetime
-from sqlalchemy import Column, Integer, String, DateTime, Float, ForeignKey, Boolean, Enum
+from sqlalchemy import Column, Integer, String, Date, DateTime, Float, ForeignKey, Boolean, Enum, LargeBinary, Index
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
 import enum
@@ -68,6 +68,10 @@ class UserProfile(Base):
 
 class MealRecord(Base):
     __tablename__ = "meal_records"
+    __table_args__ = (
+        # История пользователя: фильтр по user_id, порядок и курсор по (datetime, id)
+        Index("ix_meal_records_user_datetime_id", "user_id", "datetime", "id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
@@ -81,6 +85,48 @@ class MealRecord(Base):
     
     # Relationship with User
     user = relationship("User", back_populates="meal_records")
+    # Relationship with MealEmbedding
+    embedding = relationship(
+        "MealEmbedding", back_populates="meal", uselist=False, cascade="all, delete-orphan"
+    )
+
+
+class MealEmbedding(Base):
+    __tablename__ = "meal_embeddings"
+
+    meal_id = Column(Integer, ForeignKey("meal_records.id", ondelete="CASCADE"), primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
+    model_version = Column(String, nullable=False)  # эмбеддинги разных моделей несравнимы
+    vector = Column(LargeBinary, nullable=False)  # float16, 768 значений
+
+    # Relationship with MealRecord
+    meal = relationship("MealRecord", back_populates="embedding")
+
+
+class DailyNutritionSummary(Base):
+    """
+    Суммы КБЖУ пользователя за день. Поддерживается инкрементально при
+    каждом flush записей MealRecord (app/db/summaries.py), пересобирается
+    командой python -m app.db.summaries rebuild
+    """
+    __tablename__ = "daily_nutrition_summary"
+
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    date = Column(Date, primary_key=True)
+    calories = Column(Float, nullable=False, default=0)  # в ккал
+    proteins = Column(Float, nullable=False, default=0)  # в граммах
+    fats = Column(Float, nullable=False, default=0)      # в граммах
+    carbs = Column(Float, nullable=False, default=0)     # в граммах
+    meals_count = Column(Integer, nullable=False, default=0)
+    # Количество приемов пищи по MealType
+    breakfast_count = Column(Integer, nullable=False, default=0)
+    morning_snack_count = Column(Integer, nullable=False, default=0)
+    lunch_count = Column(Integer, nullable=False, default=0)
+    afternoon_snack_count = Column(Integer, nullable=False, default=0)
+    dinner_count = Column(Integer, nullable=False, default=0)
+    evening_snack_count = Column(Integer, nullable=False, default=0)
+    workout_count = Column(Integer, nullable=False, default=0)
+    other_count = Column(Integer, nullable=False, default=0)
 
 
 class UserPlan(Base):
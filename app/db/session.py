@@ -1,15 +1,69 @@
 # app/db/session.py
+"""
+Движки базы данных.
+
+Роутеры работают через асинхронный движок (asyncpg для PostgreSQL,
+aiosqlite для SQLite): запрос, ожидающий базу, не занимает поток, поэтому
+число одновременных запросов ограничено пулом соединений, а не пулом
+потоков. Синхронный движок остаётся для создания таблиц при старте,
+CLI (python -m app.db.summaries) и скриптов.
+"""
+
 from sqlalchemy import create_engine
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker
 
 from app.core.config import settings
+from app.core.metrics import instrument_engine
+
+# Асинхронные драйверы по бэкенду
+ASYNC_DRIVERS = {"postgresql": "asyncpg", "sqlite": "aiosqlite"}
+
+
+def _async_url(url: str) -> str:
+    """URL для асинхронного движка: DB_ASYNC_URL или DB_URL с асинхронным драйвером"""
+    if settings.DB_ASYNC_URL:
+        return settings.DB_ASYNC_URL
+    parsed = make_url(url)
+    backend = parsed.get_backend_name()
+    if backend in ASYNC_DRIVERS and parsed.get_driver_name() != ASYNC_DRIVERS[backend]:
+        parsed = parsed.set(drivername=f"{backend}+{ASYNC_DRIVERS[backend]}")
+    return parsed.render_as_string(hide_password=False)
+
+
+def _engine_options(url: str) -> dict:
+    """Параметры пула; SQLite в памяти использует собственный пул без размеров"""
+    parsed = make_url(url)
+    options = {
+        "pool_pre_ping": settings.DB_POOL_PRE_PING,
+        "pool_recycle": settings.DB_POOL_RECYCLE_SECONDS,
+    }
+    if parsed.get_backend_name() == "sqlite" and parsed.database in (None, "", ":memory:"):
+        return options
+    options.update(
+        pool_size=settings.DB_POOL_SIZE,
+        max_overflow=settings.DB_MAX_OVERFLOW,
+        pool_timeout=settings.DB_POOL_TIMEOUT_SECONDS,
+    )
+    return options
 
 
+_url = str(settings.DB_URL)
+
 engine = create_engine(
-    settings.DB_URL,
-    connect_args={"check_same_thread": False}  # для sqlite
+    _url,
+    # для sqlite: соединение из пула может достаться другому потоку
+    connect_args={"check_same_thread": False} if make_url(_url).get_backend_name() == "sqlite" else {},
+    **_engine_options(_url)
 )
 
+async_engine = create_async_engine(_async_url(_url), **_engine_options(_async_url(_url)))
+
+if settings.METRICS_ENABLED:
+    instrument_engine(engine)
+    instrument_engine(async_engine.sync_engine)
+
 
 SessionLocal = sessionmaker(
     autocommit=False,
@@ -17,11 +71,17 @@ SessionLocal = sessionmaker(
     bind=engine
 )
 
+# expire_on_commit=False: после commit обращение к атрибутам не должно
+# делать скрытых запросов — в асинхронной сессии это ошибка
+AsyncSessionLocal = async_sessionmaker(
+    async_engine,
+    autoflush=False,
+    expire_on_commit=False
+)
+
 
-def get_db():
-    """Dependency для получения сессии базы данных"""
-    db = SessionLocal()
-    try:
+async def get_db():
+    """Dependency для получения асинхронной сессии базы данных"""
+    async with AsyncSessionLocal() as db:
         yield db
-    finally:
-        db.close()
+
@@ -0,0 +1,280 @@
+# app/db/summaries.py
+"""
+Инкрементальное обновление daily_nutrition_summary.
+
+При каждом flush изменения MealRecord (новые, изменённые и удалённые записи)
+сводятся в дельты по (user_id, дата) и применяются к сводке в той же
+транзакции атомарным upsert: x = x + delta. Массовые query.update()/delete()
+идут мимо ORM и сводку не обновляют — после них нужна пересборка:
+
+    python -m app.db.summaries rebuild [--user-id ID]
+
+Для уже существующих данных сводка собирается при старте приложения
+(backfill_if_empty), если таблица пуста, а приемы пищи есть.
+"""
+
+import argparse
+import logging
+from collections import defaultdict
+from datetime import date
+from typing import Callable, Dict, List, NamedTuple, Optional, Set
+
+from sqlalchemy import and_, delete, event, func, insert, or_, select, update
+from sqlalchemy.orm import Session
+
+from app.db.models import DailyNutritionSummary, MealRecord, MealType
+
+logger = logging.getLogger(__name__)
+
+MACROS = ("calories", "proteins", "fats", "carbs")
+MEAL_TYPE_COLUMNS = {meal_type: f"{meal_type.name.lower()}_count" for meal_type in MealType}
+SUMMARY_COLUMNS = MACROS + ("meals_count",) + tuple(MEAL_TYPE_COLUMNS.values())
+
+_OLD_STATES = "daily_summary_old_states"
+_CHANGED_USERS = "daily_summary_changed_users"
+
+# Вызываются после commit с множеством user_id, чьи сводки изменились
+_change_listeners: List[Callable[[Set[int]], None]] = []
+
+_table = DailyNutritionSummary.__table__
+
+
+class _MealState(NamedTuple):
+    user_id: int
+    day: date
+    meal_type: MealType
+    calories: float
+    proteins: float
+    fats: float
+    carbs: float
+
+
+def _meal_type(value) -> MealType:
+    try:
+        return MealType(int(value))
+    except (TypeError, ValueError):
+        return MealType.OTHER
+
+
+def _state(user_id, moment, meal_type, calories, proteins, fats, carbs) -> _MealState:
+    return _MealState(user_id, moment.date(), _meal_type(meal_type), calories, proteins, fats, carbs)
+
+
+def _current_state(meal: MealRecord) -> _MealState:
+    return _state(meal.user_id, meal.datetime, meal.meal_type, *(getattr(meal, name) for name in MACROS))
+
+
+def _add(deltas: Dict, state: _MealState, sign: int):
+    delta = deltas[(state.user_id, state.day)]
+    for name in MACROS:
+        delta[name] += sign * (getattr(state, name) or 0.0)
+    delta["meals_count"] += sign
+    delta[MEAL_TYPE_COLUMNS[state.meal_type]] += sign
+
+
+@event.listens_for(Session, "before_flush")
+def _remember_old_states(session: Session, flush_context, instances):
+    """
+    Значения изменяемых и удаляемых записей до flush читаются из базы:
+    в объекте прежние значения могут быть уже выгружены (expired)
+    """
+    ids = [
+        meal.id for meal in session.dirty
+        if isinstance(meal, MealRecord) and meal.id is not None and session.is_modified(meal)
+    ]
+    ids += [meal.id for meal in session.deleted if isinstance(meal, MealRecord) and meal.id is not None]
+    if not ids:
+        return
+
+    rows = session.connection().execute(
+        select(
+            MealRecord.id, MealRecord.user_id, MealRecord.datetime, MealRecord.meal_type,
+            *(getattr(MealRecord, name) for name in MACROS),
+        ).where(MealRecord.id.in_(ids))
+    )
+    old = session.info.setdefault(_OLD_STATES, {})
+    for meal_id, *values in rows:
+        old[meal_id] = _state(*values)
+
+
+@event.listens_for(Session, "after_flush")
+def _update_daily_summaries(session: Session, flush_context):
+    """
+    Применяет дельты к сводке. В after_flush new/dirty/deleted ещё описывают
+    состояние до flush, а значения по умолчанию (datetime) уже заполнены
+    """
+    old = session.info.pop(_OLD_STATES, {})
+    deltas = defaultdict(lambda: defaultdict(int))
+
+    for meal in session.new:
+        if isinstance(meal, MealRecord):
+            _add(deltas, _current_state(meal), +1)
+    for meal in session.dirty:
+        if isinstance(meal, MealRecord) and meal.id in old:
+            _add(deltas, old[meal.id], -1)
+            _add(deltas, _current_state(meal), +1)
+    for meal in session.deleted:
+        if isinstance(meal, MealRecord) and meal.id in old:
+            _add(deltas, old[meal.id], -1)
+
+    if deltas:
+        apply_deltas(session.connection(), deltas)
+        session.info.setdefault(_CHANGED_USERS, set()).update(user_id for user_id, _ in deltas)
+
+
+def add_change_listener(callback: Callable[[Set[int]], None]):
+    """Подписка на изменения сводок (например, для сброса кэшей по пользователю)"""
+    _change_listeners.append(callback)
+
+
+@event.listens_for(Session, "after_commit")
+def _notify_listeners(session: Session):
+    # После commit, а не после flush: иначе параллельный запрос успеет
+    # закэшировать ещё не зафиксированное состояние
+    users = session.info.pop(_CHANGED_USERS, None)
+    if not users:
+        return
+    for callback in _change_listeners:
+        try:
+            callback(users)
+        except Exception as e:
+            logger.warning(f"Ошибка обработчика изменений сводок: {e}")
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_changes(session: Session):
+    session.info.pop(_CHANGED_USERS, None)
+    session.info.pop(_OLD_STATES, None)
+
+
+def _upsert(dialect: str):
+    """INSERT ... ON CONFLICT для PostgreSQL и SQLite; None — диалект без upsert"""
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    elif dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+    else:
+        return None
+    return dialect_insert
+
+
+def apply_deltas(connection, deltas: Dict):
+    """
+    Прибавляет дельты к строкам сводки (создавая недостающие); дни, где
+    не осталось приемов пищи, удаляются
+
+    Args:
+        connection: Соединение текущей транзакции
+        deltas: {(user_id, date): {колонка: прибавка}}
+    """
+    dialect_insert = _upsert(connection.dialect.name)
+    emptied = []
+
+    for (user_id, day), delta in deltas.items():
+        delta = {name: value for name, value in delta.items() if value}
+        if not delta:
+            continue
+        if delta.get("meals_count", 0) < 0:
+            emptied.append((user_id, day))
+
+        if dialect_insert is not None:
+            statement = dialect_insert(_table).values(user_id=user_id, date=day, **delta)
+            connection.execute(statement.on_conflict_do_update(
+                index_elements=[_table.c.user_id, _table.c.date],
+                set_={name: _table.c[name] + statement.excluded[name] for name in delta},
+            ))
+            continue
+
+        key = and_(_table.c.user_id == user_id, _table.c.date == day)
+        result = connection.execute(
+            update(_table).where(key).values({name: _table.c[name] + value for name, value in delta.items()})
+        )
+        if result.rowcount == 0:
+            connection.execute(insert(_table).values(user_id=user_id, date=day, **delta))
+
+    if emptied:
+        connection.execute(delete(_table).where(
+            _table.c.meals_count <= 0,
+            or_(*(and_(_table.c.user_id == user_id, _table.c.date == day) for user_id, day in emptied)),
+        ))
+
+
+def rebuild(db: Session, user_id: Optional[int] = None) -> int:
+    """
+    Пересчитывает сводку из meal_records (для одного пользователя или всех)
+
+    Returns:
+        Количество строк сводки
+    """
+    day = func.date(MealRecord.datetime)
+    query = db.query(
+        MealRecord.user_id, day, MealRecord.meal_type,
+        *(func.sum(getattr(MealRecord, name)) for name in MACROS),
+        func.count(MealRecord.id),
+    ).group_by(MealRecord.user_id, day, MealRecord.meal_type)
+    if user_id is not None:
+        query = query.filter(MealRecord.user_id == user_id)
+
+    totals = defaultdict(lambda: defaultdict(int))
+    for owner, meal_day, meal_type, *sums, count in query:
+        # SQLite возвращает date() строкой, PostgreSQL — датой
+        if isinstance(meal_day, str):
+            meal_day = date.fromisoformat(meal_day)
+        row = totals[(owner, meal_day)]
+        for name, value in zip(MACROS, sums):
+            row[name] += value or 0.0
+        row["meals_count"] += count
+        row[MEAL_TYPE_COLUMNS[_meal_type(meal_type)]] += count
+
+    stale = delete(_table)
+    if user_id is not None:
+        stale = stale.where(_table.c.user_id == user_id)
+    db.execute(stale)
+    if totals:
+        db.execute(insert(_table), [
+            {"user_id": owner, "date": meal_day, **{name: row[name] for name in SUMMARY_COLUMNS}}
+            for (owner, meal_day), row in totals.items()
+        ])
+    db.info.setdefault(_CHANGED_USERS, set()).update(owner for owner, _ in totals)
+    db.commit()
+    return len(totals)
+
+
+def backfill_if_empty(db: Session) -> Optional[int]:
+    """
+    Собирает сводку, если она пуста, а в meal_records есть записи
+    (первый запуск после появления таблицы)
+
+    Returns:
+        Количество строк сводки или None, если пересборка не понадобилась
+    """
+    if db.execute(select(_table.c.user_id).limit(1)).first() is not None:
+        return None
+    if db.execute(select(MealRecord.id).limit(1)).first() is None:
+        return None
+    rows = rebuild(db)
+    logger.info(f"daily_nutrition_summary заполнена из meal_records: {rows} строк")
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Сводки КБЖУ по дням (daily_nutrition_summary)")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    rebuild_parser = subparsers.add_parser("rebuild", help="Пересчитать сводку из meal_records")
+    rebuild_parser.add_argument("--user-id", type=int, help="Только для одного пользователя")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    from app.db.session import SessionLocal, engine
+
+    _table.create(bind=engine, checkfirst=True)
+    db = SessionLocal()
+    try:
+        rows = rebuild(db, args.user_id)
+    finally:
+        db.close()
+    logger.info(f"Сводка пересобрана: {rows} строк")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,15 @@
+import logging
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
 from fastapi.staticfiles import StaticFiles
-from app.db import engine, Base
+from app.core import metrics
+from app.core.config import settings
+from app.core.passwords import shutdown_password_hasher
+from app.db import engine, async_engine, Base, SessionLocal
+from app.db.summaries import backfill_if_empty
 from app.routers.auth import router as auth_router
 from app.routers.users import router as users_router
 from app.routers.meals import router as meals_router
@@ -9,12 +17,44 @@ from app.routers.onboarding import router as onboarding_plan_router
 from app.routers.plans import router as plans_router
 from app.routers.profiles import router as profiles_router
 from app.routers.classification import router as classification_router
+from app.routers.analytics import router as analytics_router
+from app.utils.storage import shutdown_image_store
+from app.utils.uploads import UploadLimitMiddleware
+
+logger = logging.getLogger(__name__)
 
 # для разработки: создаём таблицы по описанным моделям
 Base.metadata.create_all(bind=engine)
+# create_all не добавляет новые индексы в уже существующие таблицы
+for table in Base.metadata.sorted_tables:
+    for index in table.indexes:
+        index.create(bind=engine, checkfirst=True)
+# Сводки по дням для данных, записанных до появления daily_nutrition_summary
+with SessionLocal() as _db:
+    backfill_if_empty(_db)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Загружаем и прогреваем модель в фоне: /classification/ready
+    # отвечает 200 только после прогрева
+    if settings.CLASSIFIER_EAGER_LOAD:
+        try:
+            from app.models.classifier import get_classifier
+            get_classifier().start_background_load(settings.CLASSIFIER_WARMUP_BATCH_SIZES)
+        except Exception as e:
+            logger.error(f"Не удалось запустить загрузку модели: {e}")
+    yield
+    # Закрываем соединения пула асинхронного движка, процессы хеширования паролей
+    # и дожидаемся записи миниатюр
+    await async_engine.dispose()
+    shutdown_password_hasher()
+    shutdown_image_store()
+
 
 app = FastAPI(
     title="CalorieCounter API",
+    lifespan=lifespan,
     version="0.1.0",
     # Отключаем повторную валидацию для ускорения
     validate_all=False,
@@ -31,8 +71,20 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
 
+# Слишком большие запросы отклоняем до чтения тела
+app.add_middleware(UploadLimitMiddleware, max_bytes=int(settings.UPLOAD_MAX_REQUEST_MB * 1024 * 1024))
+
+if settings.METRICS_ENABLED:
+    app.add_middleware(metrics.MetricsMiddleware)
+
+    @app.get("/metrics", include_in_schema=False)
+    def get_metrics():
+        """Метрики в текстовом формате Prometheus"""
+        return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
 # Монтируем статические файлы
 app.mount("/static", StaticFiles(directory="app/static"), name="static")
 
@@ -43,4 +95,5 @@ app.include_router(meals_router)
 app.include_router(onboarding_plan_router)
 app.include_router(plans_router, tags=["Plans"])
 app.include_router(profiles_router)
-app.include_router(classification_router, prefix="/classification", tags=["Classification"])
\ No newline at end of file
+app.include_router(classification_router, prefix="/classification", tags=["Classification"])
+app.include_router(analytics_router)
\ No newline at end of file
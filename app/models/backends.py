@@ -0,0 +1,134 @@
+import logging
+import os
+from typing import Callable, List, Optional
+
+import torch
+
+logger = logging.getLogger(__name__)
+
+# Доступные бэкенды инференса
+EAGER = "eager"          # fp32, обычный PyTorch
+INT8 = "int8"            # динамическая int8-квантизация Linear-слоёв
+TORCHSCRIPT = "torchscript"  # trace + freeze
+ONNX = "onnx"            # экспорт в ONNX, инференс через ONNX Runtime (CPU)
+
+BACKENDS = (EAGER, INT8, TORCHSCRIPT, ONNX)
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".webp", ".bmp")
+
+
+class OnnxRunner:
+    """Обёртка над onnxruntime.InferenceSession с интерфейсом модели torch"""
+
+    def __init__(self, path: str, num_threads: int = 0):
+        try:
+            import onnxruntime as ort
+        except ImportError as e:
+            raise ImportError(f"Для бэкенда onnx установите onnxruntime: {e}")
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if num_threads > 0:
+            options.intra_op_num_threads = num_threads
+
+        self.session = ort.InferenceSession(path, options, providers=["CPUExecutionProvider"])
+        self.input_name = self.session.get_inputs()[0].name
+
+    def __call__(self, x):
+        embeddings, logits = self.session.run(None, {self.input_name: x.contiguous().numpy()})
+        return torch.from_numpy(embeddings), torch.from_numpy(logits)
+
+
+def _export_onnx(model, example, path: str):
+    """Экспортирует модель в ONNX с динамическим размером батча"""
+    torch.onnx.export(
+        model,
+        example,
+        path,
+        input_names=["input"],
+        output_names=["embedding", "logits"],
+        dynamic_axes={"input": {0: "batch"}, "embedding": {0: "batch"}, "logits": {0: "batch"}},
+        opset_version=17,
+    )
+
+
+def build_backend(model, name: str, onnx_path: Optional[str] = None) -> Callable:
+    """
+    Строит исполнитель инференса поверх fp32-модели
+
+    Args:
+        model: EmbeddingViT в режиме eval
+        name: Имя бэкенда из BACKENDS
+        onnx_path: Куда сохранять экспортированную ONNX-модель
+
+    Returns:
+        Callable: принимает тензор (N, 3, 224, 224),
+        возвращает (эмбеддинги (N, 768), логиты (N, num_classes))
+    """
+    if name == EAGER:
+        return model
+
+    if name == INT8:
+        return torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+    example = torch.randn(1, 3, 224, 224)
+
+    if name == TORCHSCRIPT:
+        with torch.no_grad():
+            traced = torch.jit.trace(model, example)
+        return torch.jit.freeze(traced.eval())
+
+    if name == ONNX:
+        if not onnx_path:
+            raise ValueError("Не задан путь для ONNX-модели")
+        _export_onnx(model, example, onnx_path)
+        return OnnxRunner(onnx_path, torch.get_num_threads())
+
+    raise ValueError(f"Неизвестный бэкенд инференса: {name}. Доступные: {', '.join(BACKENDS)}")
+
+
+def load_calibration_set(transform, directory: Optional[str], size: int = 16, synthetic: bool = False):
+    """
+    Загружает калибровочный набор для проверки бэкенда
+
+    Берёт до size изображений из directory. Если каталог не задан или пуст,
+    возвращает детерминированные синтетические входы только при synthetic=True:
+    совпадение top-1 на шуме ничего не говорит о точности на фотографиях еды.
+
+    Raises:
+        ValueError: Нет калибровочных изображений, а синтетические входы не разрешены
+    """
+    images: List = []
+    if directory and os.path.isdir(directory):
+        from PIL import Image
+
+        for name in sorted(os.listdir(directory)):
+            if len(images) >= size:
+                break
+            if not name.lower().endswith(IMAGE_EXTENSIONS):
+                continue
+            try:
+                with Image.open(os.path.join(directory, name)) as img:
+                    images.append(transform(img))
+            except Exception as e:
+                logger.warning(f"Пропускаю калибровочное изображение {name}: {e}")
+
+    if images:
+        return torch.stack(images)
+    if not synthetic:
+        raise ValueError(f"Нет калибровочных изображений в CLASSIFIER_CALIBRATION_DIR={directory!r}")
+
+    generator = torch.Generator().manual_seed(0)
+    return torch.randn(size, 3, 224, 224, generator=generator)
+
+
+def top1_agreement(reference: Callable, candidate: Callable, inputs, batch_size: int = 8) -> float:
+    """Доля входов, на которых top-1 класс кандидата совпадает с эталонной моделью"""
+    matches = 0
+    with torch.no_grad():
+        for start in range(0, len(inputs), batch_size):
+            batch = inputs[start:start + batch_size]
+            expected = reference(batch)[1].argmax(dim=1)
+            actual = candidate(batch)[1].argmax(dim=1)
+            matches += int((expected == actual).sum())
+    return matches / len(inputs)
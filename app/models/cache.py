@@ -0,0 +1,173 @@
+import hashlib
+import json
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+
+# Размер блока чтения при хешировании файлов
+_HASH_CHUNK_SIZE = 1024 * 1024
+
+# Примерные накладные расходы на запись (кортежи, float, узел OrderedDict)
+_ENTRY_OVERHEAD = 200
+
+# Результат классификации: (класс, вероятность) по убыванию вероятности
+Ranked = List[Tuple[str, float]]
+
+
+class ResultCache:
+    """
+    LRU-кэш результатов классификации с TTL и ограничением по памяти.
+
+    Ключ — хеш байтов изображения и версия модели, значение — top-k классов
+    с вероятностями.
+    Необязательный дисковый уровень хранит результаты между перезапусками
+    и делится между процессами API.
+    """
+
+    def __init__(self, max_bytes: int = 16 * 1024 * 1024, ttl_seconds: float = 3600.0,
+                 disk_dir: Optional[str] = None):
+        self.max_bytes = max_bytes
+        self.ttl = ttl_seconds
+        self.disk_dir = disk_dir
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+
+        self._entries: "OrderedDict[str, Tuple[float, Ranked, int]]" = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+        self._hits = 0
+        self._disk_hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._expirations = 0
+
+    @staticmethod
+    def digest(image) -> str:
+        """Быстрый хеш содержимого изображения (байты или файл — читается по частям)"""
+        if isinstance(image, (bytes, bytearray)):
+            return hashlib.blake2b(image, digest_size=16).hexdigest()
+
+        hasher = hashlib.blake2b(digest_size=16)
+        position = image.tell()
+        image.seek(0)
+        for chunk in iter(lambda: image.read(_HASH_CHUNK_SIZE), b""):
+            hasher.update(chunk)
+        image.seek(position)
+        return hasher.hexdigest()
+
+    @staticmethod
+    def make_key(digest: str, model_version: str) -> str:
+        """Ключ кэша: хеш изображения с учётом версии модели"""
+        return f"{model_version}:{digest}"
+
+    def get(self, key: str) -> Optional[Ranked]:
+        """Возвращает результат из кэша или None"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, value, size = entry
+                if expires_at > now:
+                    self._entries.move_to_end(key)
+                    self._hits += 1
+                    return value
+                self._remove(key)
+                self._expirations += 1
+
+        value = self._disk_get(key)
+        with self._lock:
+            if value is None:
+                self._misses += 1
+                return None
+            self._disk_hits += 1
+        self._put(key, value, now)
+        return value
+
+    def set(self, key: str, value: Ranked):
+        """Сохраняет результат в памяти и (если включён) на диске"""
+        self._put(key, value, time.monotonic())
+        self._disk_set(key, value)
+
+    def _put(self, key: str, value: Ranked, now: float):
+        size = sys.getsizeof(key) + sum(sys.getsizeof(name) + _ENTRY_OVERHEAD for name, _ in value)
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (now + self.ttl, value, size)
+            self._size += size
+
+            # Вытесняем самые давние записи, пока не уложимся в лимит
+            while self._size > self.max_bytes and self._entries:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self._evictions += 1
+
+    def _remove(self, key: str):
+        _, _, size = self._entries.pop(key)
+        self._size -= size
+
+    def _disk_path(self, key: str) -> str:
+        name = key.replace(":", "_")
+        return os.path.join(self.disk_dir, name[-2:], f"{name}.json")
+
+    def _disk_get(self, key: str) -> Optional[Ranked]:
+        if not self.disk_dir:
+            return None
+        path = self._disk_path(key)
+        try:
+            with open(path, encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return None
+
+        # На диске храним wall-clock время: файлы переживают перезапуск
+        if data["expires_at"] <= time.time():
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            return None
+        return [(name, prob) for name, prob in data["ranked"]]
+
+    def _disk_set(self, key: str, value: Ranked):
+        if not self.disk_dir:
+            return
+        path = self._disk_path(key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({
+                    "ranked": value,
+                    "expires_at": time.time() + self.ttl,
+                }, f)
+            os.replace(tmp_path, path)
+        except OSError:
+            pass
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+    def stats(self) -> dict:
+        """Статистика попаданий и вытеснений"""
+        with self._lock:
+            lookups = self._hits + self._disk_hits + self._misses
+            return {
+                "entries": len(self._entries),
+                "size_bytes": self._size,
+                "max_bytes": self.max_bytes,
+                "ttl_seconds": self.ttl,
+                "hits": self._hits,
+                "disk_hits": self._disk_hits,
+                "misses": self._misses,
+                "hit_rate": round((self._hits + self._disk_hits) / lookups, 3) if lookups else 0.0,
+                "evictions": self._evictions,
+                "expirations": self._expirations,
+                "disk_enabled": bool(self.disk_dir),
+            }
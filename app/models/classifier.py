@@ -1,6 +1,17 @@
-import io
+import logging
 import os
-from typing import Tuple, Optional
+import queue
+import threading
+import time
+from collections import Counter
+from concurrent.futures import Future
+from typing import Callable, List, Tuple, Optional
+
+from app.core.metrics import (
+    INFERENCE_BATCH_SIZE, INFERENCE_STAGE_SECONDS, MODEL_LOAD_SECONDS, register_collector,
+)
+from app.models.cache import ResultCache
+from app.models.preprocessing import ImageSource, Preprocessor
 
 # Отложенные импорты для избежания проблем при запуске
 torch = None
@@ -14,6 +25,9 @@ DEVICE = None
 # Пути к файлам модели
 MODEL_PATH = os.path.join(os.path.dirname(__file__), 'class_model.pth')
 CLASSES_PATH = os.path.join(os.path.dirname(__file__), 'classes.pth')
+ONNX_PATH = os.path.join(os.path.dirname(__file__), 'class_model.onnx')
+
+logger = logging.getLogger(__name__)
 
 def _lazy_import():
     """Отложенный импорт зависимостей"""
@@ -42,6 +56,18 @@ except ImportError:
     # Если зависимости не установлены, оставляем None
     pass
 
+def set_torch_threads(num_threads: int):
+    """
+    Задаёт число intra-op потоков torch; 0 — не менять.
+
+    Настройка общая для процесса, а не для вызывающего потока:
+    torch.set_num_threads меняет значение по умолчанию, которое наследуют
+    новые потоки, и число потоков MKL. Все вызовы в процессе должны
+    передавать одно и то же значение, иначе действует последний.
+    """
+    if num_threads > 0 and torch is not None:
+        torch.set_num_threads(num_threads)
+
 class FineTunedViT(torch.nn.Module):
     """Архитектура модели Vision Transformer для классификации"""
     def __init__(self, num_classes, model_name='vit_base_patch16_224', freeze_backbone=False):
@@ -73,21 +99,224 @@ class FineTunedViT(torch.nn.Module):
         feat = self.backbone(x)
         return self.classifier(feat)
 
+    def forward_with_embedding(self, x):
+        """Возвращает (вектор признаков бэкбона, логиты) за один проход"""
+        feat = self.backbone(x)
+        return feat, self.classifier(feat)
+
+class EmbeddingViT(torch.nn.Module):
+    """
+    Обёртка над FineTunedViT, forward которой возвращает (эмбеддинг, логиты).
+    Бэкенды (int8, TorchScript, ONNX) строятся поверх неё, поэтому эмбеддинг
+    получается из того же forward-прохода, что и классификация.
+    """
+    def __init__(self, model: FineTunedViT):
+        super().__init__()
+        self.model = model
+
+    def forward(self, x):
+        return self.model.forward_with_embedding(x)
+
+class BatchScheduler:
+    """
+    Планировщик микро-батчей.
+
+    Собирает параллельные запросы в течение окна ожидания (или до достижения
+    максимального размера батча), выполняет один батчевый forward-проход
+    в отдельном потоке и раздаёт результаты ожидающим запросам.
+    """
+
+    def __init__(
+        self,
+        run_batch: Callable,
+        max_batch_size: int = 16,
+        max_wait_ms: float = 10.0,
+        torch_threads: int = 0,
+    ):
+        self._run_batch = run_batch
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait_ms) / 1000.0
+        self.torch_threads = torch_threads
+
+        self._queue: "queue.Queue" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+
+        # Статистика для подбора параметров
+        self._stats_lock = threading.Lock()
+        self._batches = 0
+        self._requests = 0
+        self._max_queue_depth = 0
+        self._batch_sizes = Counter()
+
+    def _ensure_started(self):
+        """Запускает рабочий поток при первом обращении"""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._start_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(
+                    target=self._loop, name="classifier-batcher", daemon=True
+                )
+                self._thread.start()
+
+    def submit(self, x) -> Future:
+        """
+        Ставит тензор одного изображения (3, H, W) в очередь
+
+        Returns:
+            Future: строка вероятностей по классам для этого изображения
+        """
+        self._ensure_started()
+        future: Future = Future()
+        self._queue.put((x, future))
+
+        depth = self._queue.qsize()
+        with self._stats_lock:
+            if depth > self._max_queue_depth:
+                self._max_queue_depth = depth
+        return future
+
+    def _loop(self):
+        """Основной цикл: собирает батч и выполняет его"""
+        set_torch_threads(self.torch_threads)
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+
+            batch = [item]
+            stop = False
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                timeout = deadline - time.monotonic()
+                try:
+                    # Уже пришедшие запросы забираем без ожидания
+                    item = self._queue.get(timeout=timeout) if timeout > 0 else self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    stop = True
+                    break
+                batch.append(item)
+
+            self._execute(batch)
+            if stop:
+                return
+
+    def _execute(self, batch):
+        """Выполняет один батчевый forward-проход и раздаёт результаты"""
+        # Отменённые запросы в батч не берём
+        batch = [(x, f) for x, f in batch if f.set_running_or_notify_cancel()]
+        if not batch:
+            return
+
+        with self._stats_lock:
+            self._batches += 1
+            self._requests += len(batch)
+            self._batch_sizes[len(batch)] += 1
+
+        try:
+            outputs = self._run_batch(torch.stack([x for x, _ in batch]))
+        except Exception as e:
+            for _, future in batch:
+                future.set_exception(e)
+            return
+
+        # Выходов может быть несколько (кортеж) — каждому запросу своя строка каждого
+        for i, (_, future) in enumerate(batch):
+            if isinstance(outputs, tuple):
+                future.set_result(tuple(output[i] for output in outputs))
+            else:
+                future.set_result(outputs[i])
+
+    def stats(self) -> dict:
+        """Возвращает статистику очереди и размеров батчей"""
+        with self._stats_lock:
+            return {
+                "queue_depth": self._queue.qsize(),
+                "max_queue_depth": self._max_queue_depth,
+                "batches": self._batches,
+                "requests": self._requests,
+                "avg_batch_size": round(self._requests / self._batches, 2) if self._batches else 0.0,
+                "batch_sizes": {str(size): count for size, count in sorted(self._batch_sizes.items())},
+                "max_batch_size": self.max_batch_size,
+                "max_wait_ms": self.max_wait * 1000.0,
+            }
+
+    def stop(self):
+        """Останавливает рабочий поток после обработки уже поставленных запросов"""
+        if self._thread is not None and self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join()
+        self._thread = None
+
+
 class ImageClassifier:
     """Класс для классификации изображений"""
     
-    def __init__(self):
+    def __init__(
+        self,
+        batching: bool = False,
+        max_batch_size: int = 16,
+        max_wait_ms: float = 10.0,
+        torch_threads: int = 0,
+        backend: str = "eager",
+        calibration_dir: Optional[str] = None,
+        calibration_size: int = 16,
+        calibration_synthetic: bool = False,
+        min_agreement: float = 0.95,
+        onnx_path: str = ONNX_PATH,
+        cache: Optional[ResultCache] = None,
+        cache_top_k: int = 5,
+    ):
         self.model: Optional[FineTunedViT] = None
         self.classes: Optional[list] = None
         self.transform = None
+        self.preprocessor = Preprocessor()
         self.confidence_threshold = 0.9  # 90% порог уверенности
         self._is_loaded = False
+        self._load_lock = threading.Lock()
+
+        # Состояние загрузки: not_loaded -> loading -> loaded -> warming -> ready
+        # (или failed); используется проверкой готовности
+        self.load_state = "not_loaded"
+        self.load_error: Optional[str] = None
+
+        # Бэкенд инференса и параметры его проверки против fp32
+        self.backend = backend
+        self.backend_agreement: Optional[float] = None
+        self.calibration_dir = calibration_dir
+        self.calibration_size = calibration_size
+        self.calibration_synthetic = calibration_synthetic
+        self.min_agreement = min_agreement
+        self.onnx_path = onnx_path
+
+        # Кэш результатов по содержимому изображения
+        self.cache = cache
+        self.cache_top_k = cache_top_k
+        self._model_version: Optional[str] = None
+
+        # Планировщик микро-батчей (если включён)
+        self.scheduler: Optional[BatchScheduler] = None
+        if batching:
+            self.scheduler = BatchScheduler(
+                self._forward_batch, max_batch_size, max_wait_ms, torch_threads
+            )
     
     def _load_model(self):
         """Загружает модель и классы"""
         if self._is_loaded:
             return
-            
+
+        with self._load_lock:
+            if not self._is_loaded:
+                self._load_model_locked()
+
+    def _load_model_locked(self):
+        """Загрузка модели; вызывается под блокировкой"""
+        self.load_state = "loading"
+        started = time.perf_counter()
         try:
             _lazy_import()
             
@@ -113,7 +342,8 @@ class ImageClassifier:
             self.model = self.model.to(DEVICE)
             self.model.eval()
             
-            # Настраиваем пре-процессинг
+            # Эталонный пре-процессинг torchvision (калибровка бэкендов);
+            # в запросах используется self.preprocessor
             self.transform = transforms.Compose([
                 transforms.Lambda(lambda img: img.convert('RGB')),
                 transforms.Resize(256),
@@ -122,47 +352,269 @@ class ImageClassifier:
                 transforms.Normalize([0.485, 0.456, 0.406], [0.229, 0.224, 0.225]),
             ])
             
+            # Выбираем бэкенд инференса (после проверки против fp32);
+            # модель возвращает эмбеддинг вместе с логитами
+            self.model = self._select_backend(EmbeddingViT(self.model).eval())
+            
             self._is_loaded = True
             
             # Тестовый прогон для проверки
             test_input = torch.randn(1, 3, 224, 224).to(DEVICE)
             with torch.no_grad():
                 test_output = self.model(test_input)
+
+            self.load_state = "loaded"
+            MODEL_LOAD_SECONDS.set(time.perf_counter() - started, phase="load")
             
         except Exception as e:
+            self.load_state = "failed"
+            self.load_error = str(e)
             import traceback
             traceback.print_exc()
             raise
+
+    def warmup(self, batch_sizes=(1,)):
+        """
+        Загружает модель и прогревает её на нескольких размерах батча,
+        чтобы первые запросы не платили за инициализацию потоков и аллокаторов
+        """
+        self._load_model()
+        self.load_state = "warming"
+        started = time.perf_counter()
+        try:
+            for size in batch_sizes:
+                if self.scheduler is not None:
+                    # Прогреваем тот поток, который выполняет forward
+                    futures = [self.scheduler.submit(torch.zeros(3, 224, 224)) for _ in range(size)]
+                    for future in futures:
+                        future.result()
+                else:
+                    self._forward_batch(torch.zeros(size, 3, 224, 224))
+        except Exception as e:
+            self.load_state = "failed"
+            self.load_error = str(e)
+            raise
+        self.load_state = "ready"
+        MODEL_LOAD_SECONDS.set(time.perf_counter() - started, phase="warmup")
+
+    def start_background_load(self, warmup_batch_sizes=(1,)) -> threading.Thread:
+        """Загружает и прогревает модель в фоновом потоке"""
+        def run():
+            started = time.perf_counter()
+            try:
+                self.warmup(warmup_batch_sizes)
+                logger.info(f"Модель загружена и прогрета за {time.perf_counter() - started:.1f} с")
+            except Exception as e:
+                logger.error(f"Ошибка фоновой загрузки модели: {e}")
+
+        thread = threading.Thread(target=run, name="classifier-loader", daemon=True)
+        thread.start()
+        return thread
     
-    def predict(self, image_bytes: bytes) -> str:
+    def _select_backend(self, model):
+        """
+        Строит выбранный бэкенд и проверяет совпадение top-1 с fp32-моделью
+        на калибровочном наборе. При ошибке или низком совпадении остаётся fp32.
+        """
+        from app.models import backends
+
+        if self.backend == backends.EAGER:
+            return model
+
+        try:
+            runner = backends.build_backend(model, self.backend, self.onnx_path)
+            inputs = backends.load_calibration_set(
+                self.transform, self.calibration_dir, self.calibration_size, self.calibration_synthetic
+            )
+            agreement = backends.top1_agreement(model, runner, inputs)
+        except ValueError as e:
+            logger.error(f"Бэкенд {self.backend} не включён, используется eager: {e}")
+            self.backend = backends.EAGER
+            self._model_version = None
+            return model
+        except Exception as e:
+            logger.warning(f"Не удалось подготовить бэкенд {self.backend}, используется eager: {e}")
+            self.backend = backends.EAGER
+            self._model_version = None
+            return model
+
+        self.backend_agreement = agreement
+        if agreement < self.min_agreement:
+            logger.warning(
+                f"Бэкенд {self.backend} совпадает с fp32 на {agreement:.1%} "
+                f"(< {self.min_agreement:.1%}), используется eager"
+            )
+            self.backend = backends.EAGER
+            self._model_version = None
+            return model
+
+        logger.info(f"Бэкенд инференса: {self.backend} (совпадение top-1 с fp32: {agreement:.1%})")
+        return runner
+
+    def _forward_batch(self, x):
+        """
+        Батчевый forward-проход
+
+        Args:
+            x: Тензор (N, 3, 224, 224)
+
+        Returns:
+            (эмбеддинги (N, 768), вероятности (N, num_classes))
+        """
+        INFERENCE_BATCH_SIZE.observe(len(x))
+        with INFERENCE_STAGE_SECONDS.time(stage="forward"), torch.no_grad():
+            embeddings, logits = self.model(x)
+            return embeddings, torch.nn.functional.softmax(logits, dim=1)
+
+    def _infer_batch(self, x):
+        """Эмбеддинги и вероятности по классам для батча (N, 3, 224, 224)"""
+        if self.scheduler is not None:
+            # Изображения уходят в планировщик и могут объединиться
+            # с параллельными запросами в один forward-проход
+            futures = [self.scheduler.submit(row) for row in x]
+            rows = [future.result() for future in futures]
+            return (
+                torch.stack([embedding for embedding, _ in rows]),
+                torch.stack([probs for _, probs in rows]),
+            )
+        return self._forward_batch(x)
+
+    def batch_stats(self) -> dict:
+        """Статистика планировщика батчей"""
+        if self.scheduler is None:
+            return {"enabled": False}
+        return {"enabled": True, **self.scheduler.stats()}
+
+    @property
+    def model_version(self) -> str:
+        """
+        Версия модели для ключей кэша: бэкенд и размер/время изменения файла весов.
+        Не требует загрузки модели.
+        """
+        if self._model_version is None:
+            try:
+                stat = os.stat(MODEL_PATH)
+                self._model_version = f"{self.backend}-{stat.st_size:x}-{stat.st_mtime_ns:x}"
+            except OSError:
+                return f"{self.backend}-missing"
+        return self._model_version
+
+    def classify_batch(
+        self, images: List[ImageSource], top_k: int = 1
+    ) -> List[Optional[List[Tuple[str, float]]]]:
+        """
+        Классифицирует несколько изображений за один forward-проход
+        
+        Args:
+            images: Байты или файлы изображений
+            top_k: Сколько наиболее вероятных классов вернуть
+            
+        Returns:
+            Для каждого изображения список (класс, вероятность) по убыванию
+            вероятности без учёта порога; None, если изображение не декодируется
+        """
+        return [
+            result[0] if result is not None else None
+            for result in self._run(images, top_k, with_embeddings=False)
+        ]
+
+    def embed_batch(self, images: List[ImageSource], top_k: int = 1) -> List[Optional[tuple]]:
+        """
+        Классифицирует изображения и возвращает эмбеддинги бэкбона
+
+        Returns:
+            Для каждого изображения (top-k классов, эмбеддинг float32 (768,))
+            или None, если изображение не декодируется
+        """
+        return self._run(images, top_k, with_embeddings=True)
+
+    def _run(self, images: List[ImageSource], top_k: int, with_embeddings: bool) -> List[Optional[tuple]]:
+        """Общий путь: кэш -> декодирование в буфер батча -> один forward -> top-k"""
+        results: List[Optional[tuple]] = [None] * len(images)
+        digests: List[Optional[str]] = [None] * len(images)
+
+        # Кэш хранит cache_top_k лучших классов; попадание не обращается к torch.
+        # Эмбеддинги в кэше не хранятся, поэтому за ними всегда идём в модель
+        use_cache = self.cache is not None and top_k <= self.cache_top_k
+        pending = []
+        for i, image_bytes in enumerate(images):
+            # Уже декодированные изображения не хешируются и в кэш не попадают
+            if use_cache and not self.preprocessor.is_decoded(image_bytes):
+                digests[i] = self.cache.digest(image_bytes)
+                if not with_embeddings:
+                    cached = self.cache.get(self.cache.make_key(digests[i], self.model_version))
+                    if cached is not None:
+                        results[i] = (cached[:top_k], None)
+                        continue
+            pending.append(i)
+
+        if not pending:
+            return results
+
+        # Загружаем модель при первом обращении
+        self._load_model()
+
+        # Декодируем и нормализуем изображения в общий буфер батча
+        batch = self.preprocessor.buffer(len(pending))
+        decoded = []
+        for i in pending:
+            try:
+                with INFERENCE_STAGE_SECONDS.time(stage="decode"):
+                    img = self.preprocessor.decode(images[i])
+                with INFERENCE_STAGE_SECONDS.time(stage="transform"):
+                    self.preprocessor.normalize_into(self.preprocessor.crop(img), batch[len(decoded)])
+                decoded.append(i)
+            except Exception as e:
+                logger.warning(f"Не удалось декодировать изображение: {e}")
+
+        if not decoded:
+            return results
+
+        # Один forward-проход и top-k для всего батча
+        embeddings, probs = self._infer_batch(torch.from_numpy(batch[:len(decoded)]).to(DEVICE))
+        postprocess_started = time.perf_counter()
+        k = min(max(top_k, self.cache_top_k if use_cache else 0), len(self.classes))
+        values, indices = probs.topk(k, dim=1)
+        if with_embeddings:
+            embeddings = embeddings.float().numpy()
+
+        for row, i in enumerate(decoded):
+            ranked = [
+                (self.classes[idx], prob)
+                for idx, prob in zip(indices[row].tolist(), values[row].tolist())
+            ]
+            if digests[i] is not None:
+                # Версию берём заново: при загрузке бэкенд мог откатиться на eager
+                self.cache.set(self.cache.make_key(digests[i], self.model_version), ranked)
+            results[i] = (ranked[:top_k], embeddings[row].copy() if with_embeddings else None)
+
+        INFERENCE_STAGE_SECONDS.observe(time.perf_counter() - postprocess_started, stage="postprocess")
+        return results
+
+    def cache_stats(self) -> dict:
+        """Статистика кэша результатов"""
+        if self.cache is None:
+            return {"enabled": False}
+        return {"enabled": True, **self.cache.stats()}
+
+    def predict(self, image_bytes: ImageSource) -> str:
         """
         Классифицирует изображение
         
         Args:
-            image_bytes: Байты изображения
+            image_bytes: Байты или файл изображения
             
         Returns:
             str: Название класса или 'unknown' если уверенность < 90%
         """
         try:
-            # Загружаем модель при первом обращении
-            self._load_model()
-            
-            # Открываем изображение
-            img = Image.open(io.BytesIO(image_bytes)).convert('RGB')
-            
-            # Применяем трансформации
-            x = self.transform(img).unsqueeze(0).to(DEVICE)
-            
-            # Делаем предсказание
-            with torch.no_grad():
-                logits = self.model(x)
-                probs = torch.nn.functional.softmax(logits, dim=1)
-                confidence, idx = probs.max(dim=1)
+            ranked = self.classify_batch([image_bytes])[0]
+            if ranked is None:
+                return "unknown"
+            predicted_class, confidence = ranked[0]
             
             # Проверяем порог уверенности
-            if confidence.item() >= self.confidence_threshold:
-                predicted_class = self.classes[idx.item()]
+            if confidence >= self.confidence_threshold:
                 return predicted_class
             else:
                 return "unknown"
@@ -172,34 +624,21 @@ class ImageClassifier:
             traceback.print_exc()
             return "unknown"
     
-    def get_prediction_with_confidence(self, image_bytes: bytes) -> Tuple[str, float]:
+    def get_prediction_with_confidence(self, image_bytes: ImageSource) -> Tuple[str, float]:
         """
         Классифицирует изображение и возвращает результат с уверенностью
         
         Args:
-            image_bytes: Байты изображения
+            image_bytes: Байты или файл изображения
             
         Returns:
             Tuple[str, float]: (класс, уверенность)
         """
         try:
-            # Загружаем модель при первом обращении
-            self._load_model()
-            
-            # Открываем изображение
-            img = Image.open(io.BytesIO(image_bytes)).convert('RGB')
-            
-            # Применяем трансформации
-            x = self.transform(img).unsqueeze(0).to(DEVICE)
-            
-            # Делаем предсказание
-            with torch.no_grad():
-                logits = self.model(x)
-                probs = torch.nn.functional.softmax(logits, dim=1)
-                confidence, idx = probs.max(dim=1)
-            
-            class_name = self.classes[idx.item()]
-            conf_value = confidence.item()
+            ranked = self.classify_batch([image_bytes])[0]
+            if ranked is None:
+                return "unknown", 0.0
+            class_name, conf_value = ranked[0]
             
             # Проверяем порог уверенности
             if conf_value >= self.confidence_threshold:
@@ -213,21 +652,11 @@ class ImageClassifier:
             return "unknown", 0.0
     
     def is_ready(self) -> bool:
-        """Проверяет, готова ли модель к работе"""
-        try:
-            # Проверяем наличие файлов
-            files_exist = (os.path.exists(MODEL_PATH) and os.path.exists(CLASSES_PATH))
-            
-            # Если файлы есть, но модель не загружена, пытаемся загрузить
-            if files_exist and not self._is_loaded:
-                try:
-                    self._load_model()
-                except Exception as e:
-                    return False
-            
-            return files_exist and self._is_loaded and self.model is not None
-        except Exception as e:
-            return False
+        """
+        Проверяет, готова ли модель к работе.
+        Модель не загружает: загрузка выполняется при старте или первом запросе.
+        """
+        return self.load_state in ("loaded", "ready") and self.model is not None
 
 # Создаем глобальный экземпляр классификатора
 classifier = None
@@ -236,5 +665,73 @@ def get_classifier() -> ImageClassifier:
     """Возвращает экземпляр классификатора (singleton)"""
     global classifier
     if classifier is None:
-        classifier = ImageClassifier()
-    return classifier 
\ No newline at end of file
+        from app.core.config import settings
+
+        if settings.CLASSIFIER_MODE == "server":
+            # Инференс выполняет отдельный сервер модели с общей копией весов
+            from app.models.server import RemoteClassifier
+
+            classifier = RemoteClassifier(
+                address=settings.MODEL_SERVER_ADDRESS,
+                authkey=(settings.MODEL_SERVER_AUTHKEY or settings.SECRET_KEY).encode(),
+                timeout=settings.MODEL_SERVER_TIMEOUT_SECONDS,
+            )
+            return classifier
+
+        classifier = ImageClassifier(
+            batching=settings.CLASSIFIER_BATCHING_ENABLED,
+            max_batch_size=settings.CLASSIFIER_BATCH_MAX_SIZE,
+            max_wait_ms=settings.CLASSIFIER_BATCH_MAX_WAIT_MS,
+            # Forward выполняет поток планировщика — отдаём ему все ядра
+            torch_threads=settings.INFERENCE_TORCH_THREADS or (os.cpu_count() or 1),
+            backend=settings.CLASSIFIER_BACKEND,
+            calibration_dir=settings.CLASSIFIER_CALIBRATION_DIR or None,
+            calibration_size=settings.CLASSIFIER_CALIBRATION_SIZE,
+            calibration_synthetic=settings.CLASSIFIER_CALIBRATION_SYNTHETIC,
+            min_agreement=settings.CLASSIFIER_MIN_AGREEMENT,
+            cache=ResultCache(
+                max_bytes=int(settings.CLASSIFIER_CACHE_MAX_MB * 1024 * 1024),
+                ttl_seconds=settings.CLASSIFIER_CACHE_TTL_SECONDS,
+                disk_dir=settings.CLASSIFIER_CACHE_DISK_DIR or None,
+            ) if settings.CLASSIFIER_CACHE_ENABLED else None,
+        )
+    return classifier
+
+
+@register_collector
+def _collect_metrics():
+    """Состояние модели, кэша и очереди планировщика для /metrics"""
+    if classifier is None:
+        return []
+
+    collected = [(
+        "snapcalorie_model_state", "gauge", "Состояние загрузки модели (1 — текущее)",
+        {(("state", classifier.load_state),): 1},
+    )]
+
+    batch = classifier.batch_stats()
+    if batch.get("enabled"):
+        collected += [
+            ("snapcalorie_batch_queue_depth", "gauge", "Запросов в очереди планировщика батчей",
+             {(): batch["queue_depth"]}),
+            ("snapcalorie_batch_requests_total", "counter", "Запросов, обработанных планировщиком",
+             {(): batch["requests"]}),
+        ]
+
+    cache = classifier.cache_stats()
+    if cache.get("enabled"):
+        collected += [
+            ("snapcalorie_cache_lookups_total", "counter", "Обращения к кэшу результатов", {
+                (("result", "hit"),): cache["hits"],
+                (("result", "disk_hit"),): cache["disk_hits"],
+                (("result", "miss"),): cache["misses"],
+            }),
+            ("snapcalorie_cache_hit_ratio", "gauge", "Доля попаданий в кэш результатов",
+             {(): cache["hit_rate"]}),
+            ("snapcalorie_cache_entries", "gauge", "Записей в кэше результатов",
+             {(): cache["entries"]}),
+            ("snapcalorie_cache_size_bytes", "gauge", "Размер кэша результатов в памяти",
+             {(): cache["size_bytes"]}),
+        ]
+    return collected
+
@@ -0,0 +1,234 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Hashable, Iterable, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+# Индекс: "flat" — точный перебор, "ivf" — инвертированные списки с int8-векторами
+FLAT = "flat"
+IVF = "ivf"
+
+
+def normalize(vectors: np.ndarray) -> np.ndarray:
+    """L2-нормализация по строкам (косинусная близость = скалярное произведение)"""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+def to_bytes(vector: np.ndarray) -> bytes:
+    """Компактное хранение эмбеддинга в БД: float16"""
+    return np.asarray(vector, dtype=np.float16).tobytes()
+
+
+def from_bytes(data: bytes) -> np.ndarray:
+    return np.frombuffer(data, dtype=np.float16).astype(np.float32)
+
+
+class EmbeddingIndex:
+    """
+    Индекс эмбеддингов блюд одного пользователя.
+
+    В режиме flat — точный перебор: одно матричное умножение по нормализованной
+    матрице float32. В режиме ivf векторы разбиваются k-means на nlist списков
+    и хранятся в int8; поиск просматривает nprobe ближайших списков.
+    IVF включается только когда векторов достаточно (min_ivf_size).
+    """
+
+    def __init__(self, dim: int = 768, mode: str = FLAT, nlist: int = 16, nprobe: int = 4,
+                 min_ivf_size: int = 1024):
+        self.dim = dim
+        self.mode = mode
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.min_ivf_size = min_ivf_size
+
+        self._ids = np.empty(0, dtype=np.int64)
+        self._vectors = np.empty((0, dim), dtype=np.float32)
+        self._lock = threading.Lock()
+
+        # Структуры IVF (строятся лениво при первом поиске после изменений)
+        self._centroids: Optional[np.ndarray] = None
+        self._lists: List[Tuple[np.ndarray, np.ndarray]] = []
+        self._dirty = True
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def add(self, ids: Iterable[int], vectors: np.ndarray):
+        """Добавляет (или заменяет) векторы с указанными id"""
+        ids = np.asarray(list(ids), dtype=np.int64)
+        vectors = normalize(np.asarray(vectors).reshape(len(ids), self.dim))
+        with self._lock:
+            keep = ~np.isin(self._ids, ids)
+            self._ids = np.concatenate([self._ids[keep], ids])
+            self._vectors = np.concatenate([self._vectors[keep], vectors])
+            self._dirty = True
+
+    def remove(self, ids: Iterable[int]):
+        ids = np.asarray(list(ids), dtype=np.int64)
+        with self._lock:
+            keep = ~np.isin(self._ids, ids)
+            self._ids = self._ids[keep]
+            self._vectors = self._vectors[keep]
+            self._dirty = True
+
+    def search(self, vector: np.ndarray, k: int = 1) -> List[Tuple[int, float]]:
+        """Возвращает до k пар (id, косинусная близость) по убыванию близости"""
+        query = normalize(np.asarray(vector).reshape(self.dim))
+        with self._lock:
+            if not len(self._ids):
+                return []
+            if self.mode == IVF and len(self._ids) >= self.min_ivf_size:
+                if self._dirty:
+                    self._build_ivf()
+                ids, scores = self._search_ivf(query)
+            else:
+                ids, scores = self._ids, self._vectors @ query
+
+        k = min(k, len(ids))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(int(ids[i]), float(scores[i])) for i in top]
+
+    def _build_ivf(self, iterations: int = 10):
+        """k-means по нормализованным векторам + int8-квантизация списков"""
+        nlist = min(self.nlist, len(self._ids))
+        rng = np.random.default_rng(0)
+        centroids = self._vectors[rng.choice(len(self._vectors), nlist, replace=False)]
+        for _ in range(iterations):
+            assignment = np.argmax(self._vectors @ centroids.T, axis=1)
+            for c in range(nlist):
+                members = self._vectors[assignment == c]
+                if len(members):
+                    centroids[c] = members.mean(axis=0)
+            centroids = normalize(centroids)
+
+        assignment = np.argmax(self._vectors @ centroids.T, axis=1)
+        self._centroids = centroids
+        self._lists = []
+        for c in range(nlist):
+            mask = assignment == c
+            # Компоненты нормализованного вектора лежат в [-1, 1] — масштаб 127
+            quantized = np.round(self._vectors[mask] * 127).astype(np.int8)
+            self._lists.append((self._ids[mask], quantized))
+        self._dirty = False
+
+    def _search_ivf(self, query: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        probes = np.argsort(-(self._centroids @ query))[:self.nprobe]
+        ids = np.concatenate([self._lists[c][0] for c in probes])
+        vectors = np.concatenate([self._lists[c][1] for c in probes])
+        return ids, (vectors.astype(np.float32) @ query) / 127.0
+
+
+class _RegistryEntry(NamedTuple):
+    index: "EmbeddingIndex"
+    version: Optional[Hashable]
+    expires: float
+
+
+class EmbeddingIndexRegistry:
+    """
+    Индексы эмбеддингов по пользователям с ограничением числа пользователей в памяти.
+    Индекс пользователя строится при первом обращении через loader.
+
+    Индекс живёт в одном процессе, а эмбеддинги пишут все воркеры API,
+    поэтому вместе с индексом хранится версия данных (например, количество
+    и максимальный meal_id эмбеддингов пользователя в базе): индекс с другой
+    версией строится заново. TTL — страховка для изменений, которые версию
+    не меняют (пересчёт эмбеддинга уже существующего блюда).
+    """
+
+    def __init__(self, max_users: int = 1000, ttl_seconds: float = 600.0, **index_options):
+        self.max_users = max_users
+        self.ttl = ttl_seconds
+        self.index_options = index_options
+        self._indexes: "OrderedDict[int, _RegistryEntry]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _fresh(self, user_id: int, version: Optional[Hashable]) -> Optional["EmbeddingIndex"]:
+        """Индекс из памяти, если он не истёк и его версия совпадает; вызывается под блокировкой"""
+        entry = self._indexes.get(user_id)
+        if entry is None:
+            return None
+        if time.monotonic() >= entry.expires or (version is not None and entry.version != version):
+            del self._indexes[user_id]
+            return None
+        self._indexes.move_to_end(user_id)
+        return entry.index
+
+    def get(
+        self,
+        user_id: int,
+        loader: Callable[[], Tuple[List[int], np.ndarray]],
+        version: Optional[Hashable] = None,
+    ) -> EmbeddingIndex:
+        """
+        Индекс пользователя; loader возвращает (id блюд, матрица эмбеддингов),
+        version — версия данных, которые он вернёт (None — не проверять)
+        """
+        with self._lock:
+            index = self._fresh(user_id, version)
+            if index is not None:
+                return index
+
+        index = EmbeddingIndex(**self.index_options)
+        ids, vectors = loader()
+        if len(ids):
+            index.add(ids, vectors)
+
+        with self._lock:
+            # Параллельный запрос мог успеть построить индекс той же версии — оставляем его
+            existing = self._fresh(user_id, version)
+            if existing is not None:
+                return existing
+            self._indexes[user_id] = _RegistryEntry(index, version, time.monotonic() + self.ttl)
+            while len(self._indexes) > self.max_users:
+                self._indexes.popitem(last=False)
+            return index
+
+    def peek(self, user_id: int, version: Optional[Hashable] = None) -> Optional[EmbeddingIndex]:
+        """Индекс пользователя, если он уже в памяти и актуален (без загрузки)"""
+        with self._lock:
+            return self._fresh(user_id, version)
+
+    def add(self, user_id: int, meal_id: int, vector: np.ndarray):
+        """
+        Добавляет эмбеддинг нового блюда в индекс пользователя, если он уже в памяти.
+        Версия (количество, максимальный meal_id) сдвигается так же, как в базе;
+        эмбеддинг блюда не новее последнего (пересчёт) сбрасывает индекс
+        """
+        with self._lock:
+            entry = self._indexes.get(user_id)
+            if entry is None:
+                return
+            if isinstance(entry.version, tuple) and meal_id > entry.version[1]:
+                self._indexes[user_id] = entry._replace(version=(entry.version[0] + 1, meal_id))
+            elif entry.version is not None:
+                del self._indexes[user_id]
+                return
+        entry.index.add([meal_id], vector[None, :])
+
+    def discard(self, user_id: int):
+        with self._lock:
+            self._indexes.pop(user_id, None)
+
+
+_registry: Optional[EmbeddingIndexRegistry] = None
+
+
+def get_index_registry() -> EmbeddingIndexRegistry:
+    """Возвращает реестр индексов (singleton)"""
+    global _registry
+    if _registry is None:
+        from app.core.config import settings
+
+        _registry = EmbeddingIndexRegistry(
+            max_users=settings.EMBEDDING_INDEX_MAX_USERS,
+            ttl_seconds=settings.EMBEDDING_INDEX_TTL_SECONDS,
+            mode=settings.EMBEDDING_INDEX_MODE,
+            nlist=settings.EMBEDDING_IVF_LISTS,
+            nprobe=settings.EMBEDDING_IVF_PROBES,
+        )
+    return _registry
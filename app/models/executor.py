@@ -0,0 +1,132 @@
+import asyncio
+import functools
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Optional
+
+from app.core.metrics import register_collector
+from app.models.classifier import set_torch_threads
+
+
+class InferenceQueueFull(Exception):
+    """Очередь инференса переполнена — запрос нужно повторить позже"""
+
+    def __init__(self, retry_after: int = 1):
+        super().__init__("Очередь инференса переполнена")
+        self.retry_after = retry_after
+
+
+class InferenceExecutor:
+    """
+    Ограниченный пул потоков для инференса.
+
+    Блокирующие вызовы классификатора выполняются вне event loop, поэтому
+    остальные эндпоинты не ждут forward-проход. Число запросов в работе
+    и в очереди ограничено: при переполнении сразу выбрасывается
+    InferenceQueueFull вместо бесконечного роста очереди.
+    """
+
+    def __init__(
+        self,
+        workers: int = 2,
+        max_pending: int = 32,
+        torch_threads: int = 0,
+        retry_after: int = 1,
+    ):
+        self.workers = max(1, workers)
+        self.max_pending = max(self.workers, max_pending)
+        self.torch_threads = torch_threads
+        self.retry_after = retry_after
+
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.workers,
+            thread_name_prefix="inference",
+            initializer=set_torch_threads,
+            initargs=(torch_threads,),
+        )
+        # Счётчики меняются только из event loop, блокировка не нужна
+        self._pending = 0
+        self._completed = 0
+        self._rejected = 0
+
+    async def run(self, fn: Callable, *args):
+        """Выполняет fn(*args) в пуле или выбрасывает InferenceQueueFull"""
+        if self._pending >= self.max_pending:
+            self._rejected += 1
+            raise InferenceQueueFull(self.retry_after)
+
+        self._pending += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._executor, functools.partial(fn, *args))
+        finally:
+            self._pending -= 1
+            self._completed += 1
+
+    def stats(self) -> dict:
+        """Статистика пула"""
+        return {
+            "workers": self.workers,
+            "torch_threads": self.torch_threads,
+            "pending": self._pending,
+            "max_pending": self.max_pending,
+            "completed": self._completed,
+            "rejected": self._rejected,
+        }
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+def _resolve_torch_threads(workers: int, batching: bool, configured: int) -> int:
+    """
+    Политика потоков torch для воркеров пула (0 — воркеры настройку не меняют):
+    - явно заданное значение используется как есть — его же берут планировщики;
+    - с батчингом forward выполняют потоки планировщиков, и число потоков
+      задают они: настройка общая для процесса, и воркеры её бы перезаписали;
+    - без батчинга ядра делятся поровну между воркерами.
+    """
+    if configured > 0:
+        return configured
+    if batching:
+        return 0
+    return max(1, (os.cpu_count() or 1) // workers)
+
+
+_executor: Optional[InferenceExecutor] = None
+
+
+def get_inference_executor() -> InferenceExecutor:
+    """Возвращает пул инференса (singleton)"""
+    global _executor
+    if _executor is None:
+        from app.core.config import settings
+
+        _executor = InferenceExecutor(
+            workers=settings.INFERENCE_WORKERS,
+            max_pending=settings.INFERENCE_MAX_PENDING,
+            torch_threads=_resolve_torch_threads(
+                settings.INFERENCE_WORKERS,
+                settings.CLASSIFIER_BATCHING_ENABLED,
+                settings.INFERENCE_TORCH_THREADS,
+            ),
+            retry_after=settings.INFERENCE_RETRY_AFTER_SECONDS,
+        )
+    return _executor
+
+
+@register_collector
+def _collect_metrics():
+    """Глубина очереди и отказы пула инференса для /metrics"""
+    if _executor is None:
+        return []
+    stats = _executor.stats()
+    return [
+        ("snapcalorie_inference_pending", "gauge", "Запросов инференса в работе и в очереди",
+         {(): stats["pending"]}),
+        ("snapcalorie_inference_requests_total", "counter", "Запросов инференса по результату", {
+            (("result", "completed"),): stats["completed"],
+            (("result", "rejected"),): stats["rejected"],
+        }),
+    ]
+
@@ -0,0 +1,172 @@
+import csv
+import logging
+import os
+import threading
+import time
+from typing import Dict, List, NamedTuple, Optional, Sequence
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+NUTRITION_PATH = os.path.join(os.path.dirname(__file__), 'nutrition.csv')
+
+# Колонки таблицы на 100 г продукта; порядок совпадает со столбцами массива
+MACROS = ("calories", "proteins", "fats", "carbs")
+
+
+class Nutrients(NamedTuple):
+    calories: float  # ккал
+    proteins: float  # г
+    fats: float      # г
+    carbs: float     # г
+    grams: float     # вес порции
+
+
+class NutritionTable:
+    """
+    Неизменяемая таблица КБЖУ по классам.
+
+    Значения хранятся в одном массиве float32 (классы x 4) на 100 г и
+    массиве типичных порций; строка ищется по имени класса через словарь,
+    батч — одной векторной операцией по индексам строк.
+    """
+
+    def __init__(self, names: Sequence[str], per_100g: np.ndarray, portions: np.ndarray):
+        self.names = list(names)
+        self.per_100g = np.ascontiguousarray(per_100g, dtype=np.float32)
+        self.portions = np.ascontiguousarray(portions, dtype=np.float32)
+        self._rows: Dict[str, int] = {name: row for row, name in enumerate(self.names)}
+
+    @classmethod
+    def load(cls, path: str) -> "NutritionTable":
+        """Читает CSV: class, calories, proteins, fats, carbs, portion_g"""
+        names, values, portions = [], [], []
+        with open(path, newline="", encoding="utf-8") as f:
+            for line, record in enumerate(csv.DictReader(f), start=2):
+                try:
+                    values.append([float(record[column]) for column in MACROS])
+                    portions.append(float(record["portion_g"]))
+                except (KeyError, TypeError, ValueError) as e:
+                    raise ValueError(f"{path}:{line}: некорректная строка таблицы КБЖУ: {e}")
+                names.append(record["class"].strip())
+        return cls(names, np.asarray(values).reshape(-1, len(MACROS)), np.asarray(portions))
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._rows
+
+    def rows(self, names: Sequence[str]) -> np.ndarray:
+        """Индексы строк для имён классов; -1 для отсутствующих"""
+        return np.fromiter((self._rows.get(name, -1) for name in names), dtype=np.int64, count=len(names))
+
+    def lookup(self, name: str, grams: Optional[float] = None) -> Optional[Nutrients]:
+        """КБЖУ для класса и веса порции (по умолчанию — типичная порция)"""
+        row = self._rows.get(name)
+        if row is None:
+            return None
+        weight = float(self.portions[row]) if grams is None else float(grams)
+        calories, proteins, fats, carbs = (self.per_100g[row] * (weight / 100.0)).tolist()
+        return Nutrients(calories, proteins, fats, carbs, weight)
+
+    def lookup_rows(self, rows: np.ndarray, grams: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        Векторный поиск по индексам строк
+
+        Args:
+            rows: Индексы строк (N,), -1 — нет в таблице
+            grams: Веса порций (N,); по умолчанию типичные порции
+
+        Returns:
+            Массив (N, 5): calories, proteins, fats, carbs, grams; NaN для отсутствующих
+        """
+        rows = np.asarray(rows, dtype=np.int64)
+        known = rows >= 0
+        safe = np.where(known, rows, 0)
+        weights = self.portions[safe] if grams is None else np.asarray(grams, dtype=np.float32)
+
+        result = np.empty((len(rows), len(MACROS) + 1), dtype=np.float32)
+        np.multiply(self.per_100g[safe], (weights / 100.0)[:, None], out=result[:, :len(MACROS)])
+        result[:, len(MACROS)] = weights
+        result[~known] = np.nan
+        return result
+
+    def lookup_batch(self, names: Sequence[str], grams: Optional[Sequence[float]] = None) -> List[Optional[Nutrients]]:
+        """lookup для списка классов одной векторной операцией"""
+        rows = self.rows(names)
+        values = self.lookup_rows(rows, None if grams is None else np.asarray(grams, dtype=np.float32))
+        return [
+            Nutrients(*row.tolist()) if index >= 0 else None
+            for index, row in zip(rows, values)
+        ]
+
+
+class NutritionDatabase:
+    """
+    Таблица КБЖУ с горячей перезагрузкой.
+
+    Не чаще раза в check_interval секунд сравнивает время изменения файла;
+    если файл изменился, загружает новую таблицу и атомарно подменяет ссылку.
+    Читатели всегда работают с целой неизменяемой таблицей. Битый файл не
+    заменяет рабочую таблицу — ошибка только логируется.
+    """
+
+    def __init__(self, path: str = NUTRITION_PATH, check_interval: float = 5.0):
+        self.path = path
+        self.check_interval = check_interval
+        self._table: Optional[NutritionTable] = None
+        self._mtime_ns: Optional[int] = None
+        self._next_check = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def table(self) -> NutritionTable:
+        now = time.monotonic()
+        if self._table is None or now >= self._next_check:
+            self._maybe_reload(now)
+        return self._table
+
+    def _maybe_reload(self, now: float):
+        with self._lock:
+            if self._table is not None and now < self._next_check:
+                return
+            self._next_check = now + self.check_interval
+            try:
+                mtime_ns = os.stat(self.path).st_mtime_ns
+                if mtime_ns == self._mtime_ns:
+                    return
+                table = NutritionTable.load(self.path)
+            except (OSError, ValueError) as e:
+                if self._table is None:
+                    raise
+                logger.error(f"Не удалось перезагрузить таблицу КБЖУ, оставляю прежнюю: {e}")
+                return
+
+            if self._table is not None:
+                logger.info(f"Таблица КБЖУ перезагружена: {len(table)} классов")
+            self._table = table
+            self._mtime_ns = mtime_ns
+
+    def lookup(self, name: str, grams: Optional[float] = None) -> Optional[Nutrients]:
+        return self.table.lookup(name, grams)
+
+    def lookup_batch(self, names: Sequence[str], grams: Optional[Sequence[float]] = None) -> List[Optional[Nutrients]]:
+        return self.table.lookup_batch(names, grams)
+
+
+_database: Optional[NutritionDatabase] = None
+
+
+def get_nutrition_db() -> NutritionDatabase:
+    """Возвращает таблицу КБЖУ (singleton)"""
+    global _database
+    if _database is None:
+        from app.core.config import settings
+
+        _database = NutritionDatabase(
+            path=settings.NUTRITION_TABLE_PATH or NUTRITION_PATH,
+            check_interval=settings.NUTRITION_RELOAD_INTERVAL_SECONDS,
+        )
+    return _database
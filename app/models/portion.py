@@ -0,0 +1,347 @@
+import logging
+import os
+import threading
+from typing import List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+
+from app.models.preprocessing import MEAN, STD, ImageSource, Preprocessor
+
+logger = logging.getLogger(__name__)
+
+# Веса сегментации (state_dict torchvision DeepLabV3-MobileNetV3, класс 0 — фон).
+# В репозитории их нет — без файла используется классическая сегментация
+SEGMENTATION_MODEL_PATH = os.path.join(os.path.dirname(__file__), 'segmentation_model.pth')
+
+AUTO = "auto"
+DEEPLAB = "deeplab"
+CLASSICAL = "classical"
+MODES = (AUTO, DEEPLAB, CLASSICAL)
+
+# Порция без известного класса
+DEFAULT_PORTION_G = 250.0
+
+
+class PortionRegion(NamedTuple):
+    mask: np.ndarray  # bool (h, w) в пониженном разрешении
+    bbox: Tuple[float, float, float, float]  # x0, y0, x1, y1 в долях кадра
+    area_fraction: float  # доля кадра
+    grams: float
+
+
+class PortionEstimate(NamedTuple):
+    regions: List[PortionRegion]
+    area_fraction: float
+    grams: float
+    mode: str
+    resolution: Tuple[int, int]  # (w, h) маски
+
+
+def otsu_threshold(values: np.ndarray, bins: int = 64) -> float:
+    """Порог Оцу по гистограмме значений из [0, 1]"""
+    hist, edges = np.histogram(values, bins=bins, range=(0.0, 1.0))
+    hist = hist.astype(np.float64)
+    centers = (edges[:-1] + edges[1:]) / 2
+    weight_bg = np.cumsum(hist)
+    weight_fg = weight_bg[-1] - weight_bg
+    mean_bg = np.cumsum(hist * centers) / np.maximum(weight_bg, 1)
+    mean_fg = ((hist * centers).sum() - np.cumsum(hist * centers)) / np.maximum(weight_fg, 1)
+    between = weight_bg * weight_fg * (mean_bg - mean_fg) ** 2
+    return float(edges[np.argmax(between) + 1])
+
+
+def label_components(mask: np.ndarray) -> np.ndarray:
+    """
+    Связные компоненты (4-связность) маски: положительная метка компоненты,
+    0 — фон.
+
+    Маска разбивается на горизонтальные серии; серии соседних строк,
+    перекрывающиеся по столбцам, связываются рёбрами, и компоненты графа
+    серий находятся объединением минимумов со сжатием путей. Всё векторно
+    по NumPy: число итераций не зависит от формы областей.
+    """
+    h, w = mask.shape
+    stride = w + 2
+    padded = np.zeros((h, stride), dtype=np.int8)
+    padded[:, 1:-1] = mask
+    edges = np.diff(padded, axis=1)
+    start_rows, starts = np.nonzero(edges == 1)
+    _, ends = np.nonzero(edges == -1)  # конец серии (не включительно)
+    if not len(starts):
+        return np.zeros((h, w), dtype=np.int64)
+
+    # Серии нижней строки, перекрывающиеся с серией i: конец > начала i и начало < конца i
+    start_keys = start_rows * stride + starts
+    end_keys = start_rows * stride + ends
+    below = (start_rows + 1) * stride
+    first = np.searchsorted(end_keys, below + starts, side="right")
+    last = np.searchsorted(start_keys, below + ends, side="left")
+    counts = np.maximum(last - first, 0)
+    upper = np.repeat(np.arange(len(starts)), counts)
+    lower = np.repeat(first - np.cumsum(counts) + counts, counts) + np.arange(counts.sum())
+
+    parent = np.arange(len(starts))
+    while True:
+        previous = parent.copy()
+        np.minimum.at(parent, parent[upper], parent[lower])
+        np.minimum.at(parent, parent[lower], parent[upper])
+        while True:
+            jumped = parent[parent]
+            if np.array_equal(jumped, parent):
+                break
+            parent = jumped
+        if np.array_equal(parent, previous):
+            break
+
+    # Заливка серий метками через разностный массив
+    flat = np.zeros(h * w + 1, dtype=np.int64)
+    offsets = start_rows * w
+    np.add.at(flat, offsets + starts, parent + 1)
+    np.add.at(flat, offsets + ends, -(parent + 1))
+    return np.cumsum(flat[:-1]).reshape(h, w)
+
+
+class PortionEstimator:
+    """
+    Сегментация блюда и оценка веса порции.
+
+    Режимы:
+    - deeplab: DeepLabV3 (torchvision, MobileNetV3) по весам SEGMENTATION_MODEL_PATH,
+      вход — квадрат resolution x resolution, батчится общим BatchScheduler;
+    - classical: без нейросети — отличие от цвета фона по краю кадра и
+      насыщенность, порог Оцу, морфология и связные компоненты; ~15 мс на CPU
+      для фото 2 Мп, почти всё время — уменьшение кадра;
+    - auto: deeplab, если есть веса, иначе classical.
+
+    Вес оценивается по площади: типичная порция класса соответствует
+    reference_area доле кадра, масса растёт как площадь^1.5 (высота
+    пропорциональна линейному размеру).
+    """
+
+    def __init__(
+        self,
+        mode: str = AUTO,
+        resolution: int = 128,
+        model_path: str = SEGMENTATION_MODEL_PATH,
+        reference_area: float = 0.25,
+        min_region: float = 0.02,
+        max_regions: int = 5,
+        batching: bool = False,
+        max_batch_size: int = 16,
+        max_wait_ms: float = 10.0,
+        torch_threads: int = 0,
+    ):
+        if mode not in MODES:
+            raise ValueError(f"Неизвестный режим сегментации: {mode}. Доступные: {', '.join(MODES)}")
+        if mode == AUTO:
+            mode = DEEPLAB if os.path.exists(model_path) else CLASSICAL
+
+        self.mode = mode
+        self.resolution = resolution
+        self.model_path = model_path
+        self.reference_area = reference_area
+        self.min_region = min_region
+        self.max_regions = max_regions
+        self.preprocessor = Preprocessor()
+
+        self.model = None
+        self._load_lock = threading.Lock()
+
+        # Планировщик микро-батчей для DeepLab (создаётся при загрузке модели)
+        self.batching = batching
+        self.max_batch_size = max_batch_size
+        self.max_wait_ms = max_wait_ms
+        self.torch_threads = torch_threads
+        self.scheduler = None
+
+    # Загрузка DeepLab
+
+    def _load_model(self):
+        if self.model is not None:
+            return
+        with self._load_lock:
+            if self.model is not None:
+                return
+            import torch
+            from torchvision.models.segmentation import deeplabv3_mobilenet_v3_large
+
+            state = torch.load(self.model_path, map_location="cpu")
+            num_classes = state["classifier.4.weight"].shape[0]
+            model = deeplabv3_mobilenet_v3_large(
+                weights=None, weights_backbone=None, num_classes=num_classes, aux_loss=False
+            )
+            # aux_classifier из обучения не нужен, остальные веса обязательны
+            missing, _ = model.load_state_dict(state, strict=False)
+            if missing:
+                raise ValueError(f"В весах сегментации не хватает параметров: {missing[:5]}")
+            self.model = model.eval()
+
+            if self.batching:
+                from app.models.classifier import BatchScheduler
+                self.scheduler = BatchScheduler(
+                    self._forward_masks, self.max_batch_size, self.max_wait_ms, self.torch_threads
+                )
+            logger.info(f"Модель сегментации загружена: {num_classes} классов")
+
+    def _forward_masks(self, x):
+        """Батч (N, 3, R, R) -> маски еды (N, R, R): всё, что не фон"""
+        import torch
+
+        from app.core.metrics import INFERENCE_STAGE_SECONDS
+
+        with INFERENCE_STAGE_SECONDS.time(stage="segment"), torch.no_grad():
+            return self.model(x)["out"].argmax(dim=1) > 0
+
+    # Маски
+
+    def _resize(self, img, size: Tuple[int, int]):
+        from PIL import Image
+
+        if img.mode != "RGB":
+            img = img.convert("RGB")
+        # reducing_gap: сначала быстрое целочисленное уменьшение, затем bilinear
+        return img.resize(size, Image.BILINEAR, reducing_gap=2.0)
+
+    def _classical_mask(self, img) -> np.ndarray:
+        w, h = img.size
+        scale = self.resolution / min(w, h)
+        small = self._resize(img, (max(1, round(w * scale)), max(1, round(h * scale))))
+
+        rgb = np.asarray(small, dtype=np.float32) / 255.0
+        saturation = np.asarray(small.convert("HSV"), dtype=np.float32)[..., 1] / 255.0
+
+        # Фон — медианный цвет рамки кадра (стол, тарелка по краям)
+        border = np.concatenate([rgb[0], rgb[-1], rgb[:, 0], rgb[:, -1]])
+        distance = np.linalg.norm(rgb - np.median(border, axis=0), axis=-1) / np.sqrt(3.0)
+        score = 0.6 * distance + 0.4 * saturation
+
+        mask = score > otsu_threshold(score)
+        return self._clean(mask)
+
+    def _clean(self, mask: np.ndarray) -> np.ndarray:
+        """Морфологическое открытие и закрытие 3x3"""
+        from PIL import Image, ImageFilter
+
+        img = Image.fromarray(mask.astype(np.uint8) * 255)
+        img = img.filter(ImageFilter.MinFilter(3)).filter(ImageFilter.MaxFilter(3))
+        img = img.filter(ImageFilter.MaxFilter(3)).filter(ImageFilter.MinFilter(3))
+        return np.asarray(img) > 127
+
+    def _deeplab_input(self, img) -> np.ndarray:
+        small = self._resize(img, (self.resolution, self.resolution))
+        x = np.asarray(small, dtype=np.float32) / 255.0
+        x = (x - np.asarray(MEAN, dtype=np.float32)) / np.asarray(STD, dtype=np.float32)
+        return np.ascontiguousarray(x.transpose(2, 0, 1))
+
+    def masks(self, images: Sequence) -> List[np.ndarray]:
+        """Маски еды для декодированных изображений"""
+        if self.mode == CLASSICAL:
+            return [self._classical_mask(img) for img in images]
+
+        import torch
+
+        self._load_model()
+        x = torch.from_numpy(np.stack([self._deeplab_input(img) for img in images]))
+        if self.scheduler is not None:
+            futures = [self.scheduler.submit(row) for row in x]
+            return [future.result().numpy() for future in futures]
+        return list(self._forward_masks(x).numpy())
+
+    # Порции
+
+    def regions(self, mask: np.ndarray, portion_g: float) -> List[PortionRegion]:
+        """Связные области маски с оценкой веса каждой"""
+        h, w = mask.shape
+        labels = label_components(mask)
+        ids, counts = np.unique(labels[labels > 0], return_counts=True)
+        order = np.argsort(-counts)
+
+        regions = []
+        for index in order[:self.max_regions]:
+            area = counts[index] / (h * w)
+            if area < self.min_region:
+                break
+            region = labels == ids[index]
+            rows = np.flatnonzero(region.any(axis=1))
+            cols = np.flatnonzero(region.any(axis=0))
+            bbox = (float(cols[0] / w), float(rows[0] / h), float((cols[-1] + 1) / w), float((rows[-1] + 1) / h))
+            regions.append(PortionRegion(region, bbox, float(area), self.grams(area, portion_g)))
+        return regions
+
+    def grams(self, area_fraction: float, portion_g: float) -> float:
+        """Вес по доле кадра; ограничен 0.25–4 типичных порций"""
+        ratio = (area_fraction / self.reference_area) ** 1.5
+        return float(portion_g * min(max(ratio, 0.25), 4.0))
+
+    def estimate_batch(
+        self, images: Sequence[ImageSource], portions_g: Optional[Sequence[Optional[float]]] = None
+    ) -> List[PortionEstimate]:
+        """
+        Оценивает порции для изображений
+
+        Args:
+            images: Байты, файлы или уже декодированные изображения (общие с классификатором)
+            portions_g: Типичная порция распознанного блюда для каждого изображения
+        """
+        decoded = [self.preprocessor.decode(image) for image in images]
+        portions_g = portions_g or [None] * len(decoded)
+
+        estimates = []
+        for mask, portion in zip(self.masks(decoded), portions_g):
+            portion = portion or DEFAULT_PORTION_G
+            regions = self.regions(mask, portion)
+            area = float(sum(region.area_fraction for region in regions))
+            estimates.append(PortionEstimate(
+                regions=regions,
+                area_fraction=area,
+                grams=float(sum(region.grams for region in regions)) if regions else 0.0,
+                mode=self.mode,
+                resolution=(mask.shape[1], mask.shape[0]),
+            ))
+        return estimates
+
+    def estimate(self, image: ImageSource, portion_g: Optional[float] = None) -> PortionEstimate:
+        return self.estimate_batch([image], [portion_g])[0]
+
+    def reweigh(self, estimate: PortionEstimate, portion_g: float) -> PortionEstimate:
+        """
+        Пересчитывает вес под типичную порцию класса без повторной сегментации —
+        сегментация может идти параллельно с классификацией, пока класс неизвестен
+        """
+        regions = [
+            region._replace(grams=self.grams(region.area_fraction, portion_g))
+            for region in estimate.regions
+        ]
+        return estimate._replace(regions=regions, grams=float(sum(region.grams for region in regions)))
+
+
+def mask_to_rle(mask: np.ndarray) -> dict:
+    """Маска -> RLE по строкам: длины чередующихся серий, первая — фон (может быть 0)"""
+    flat = mask.ravel()
+    changes = np.flatnonzero(flat[1:] != flat[:-1]) + 1
+    counts = np.diff(np.concatenate([[0], changes, [flat.size]]))
+    if flat.size and flat[0]:
+        counts = np.concatenate([[0], counts])
+    return {"size": [int(mask.shape[0]), int(mask.shape[1])], "counts": counts.tolist()}
+
+
+_estimator: Optional[PortionEstimator] = None
+
+
+def get_portion_estimator() -> PortionEstimator:
+    """Возвращает оценщик порций (singleton)"""
+    global _estimator
+    if _estimator is None:
+        from app.core.config import settings
+
+        _estimator = PortionEstimator(
+            mode=settings.PORTION_MODE,
+            resolution=settings.PORTION_RESOLUTION,
+            model_path=settings.SEGMENTATION_MODEL_PATH or SEGMENTATION_MODEL_PATH,
+            reference_area=settings.PORTION_REFERENCE_AREA,
+            batching=settings.CLASSIFIER_BATCHING_ENABLED,
+            max_batch_size=settings.CLASSIFIER_BATCH_MAX_SIZE,
+            max_wait_ms=settings.CLASSIFIER_BATCH_MAX_WAIT_MS,
+            torch_threads=settings.INFERENCE_TORCH_THREADS or (os.cpu_count() or 1),
+        )
+    return _estimator
@@ -0,0 +1,146 @@
+import io
+import threading
+from typing import BinaryIO, Iterable, Optional, Union
+
+import numpy as np
+from PIL import Image
+
+# Параметры пре-процессинга, на которых обучалась модель
+RESIZE_SIZE = 256
+INPUT_SIZE = 224
+MEAN = (0.485, 0.456, 0.406)
+STD = (0.229, 0.224, 0.225)
+
+# Предел размера декодируемого изображения (после draft-уменьшения JPEG):
+# ограничивает пиковую память на одно изображение (~120 МБ для RGB)
+MAX_PIXELS = 40_000_000
+
+# Байты, файл или уже декодированное изображение (повторно не декодируется)
+ImageSource = Union[bytes, BinaryIO, Image.Image]
+
+
+class Preprocessor:
+    """
+    Пре-процессинг изображений для классификатора.
+
+    Эквивалент Resize(256) + CenterCrop(224) + ToTensor + Normalize, но:
+    - JPEG декодируется сразу в уменьшенном масштабе (draft mode), без полного
+      декодирования 12 Мп фотографий;
+    - RGB-конверсия выполняется один раз и только при необходимости;
+    - resize выполняется только для области центрального кропа;
+    - нормализация векторизована в NumPy и пишет прямо в буфер батча.
+    """
+
+    def __init__(self, resize_size: int = RESIZE_SIZE, input_size: int = INPUT_SIZE,
+                 mean=MEAN, std=STD, draft: bool = True, max_pixels: int = MAX_PIXELS):
+        self.resize_size = resize_size
+        self.input_size = input_size
+        self.draft = draft
+        self.max_pixels = max_pixels
+
+        # x_norm = (x / 255 - mean) / std = x * scale + bias
+        std = np.asarray(std, dtype=np.float32)
+        self._scale = (1.0 / (255.0 * std)).astype(np.float32)
+        self._bias = (-np.asarray(mean, dtype=np.float32) / std).astype(np.float32)
+
+        self._local = threading.local()
+
+    @staticmethod
+    def is_decoded(source: ImageSource) -> bool:
+        return isinstance(source, Image.Image)
+
+    def decode(self, source: ImageSource, min_size: int = 0) -> Image.Image:
+        """
+        Декодирует изображение в RGB; JPEG — сразу в уменьшенном масштабе.
+        Файл читается напрямую, без копирования в bytes.
+
+        Args:
+            source: Байты, файл или уже декодированное изображение
+            min_size: Минимальная короткая сторона, если изображение нужно
+                не только классификатору (например, для миниатюры)
+        """
+        if self.is_decoded(source):
+            return source
+
+        img = Image.open(io.BytesIO(source) if isinstance(source, (bytes, bytearray)) else source)
+        if self.draft and img.format == "JPEG":
+            # Декодер выберет наибольшее уменьшение (1/2, 1/4, 1/8),
+            # при котором обе стороны не меньше resize_size (и min_size)
+            size = max(self.resize_size, min_size)
+            img.draft("RGB", (size, size))
+        # Размер известен из заголовка — проверяем до выделения памяти под пиксели
+        width, height = img.size
+        if width * height > self.max_pixels:
+            raise ValueError(f"Слишком большое изображение: {width}x{height}")
+        img.load()
+        if img.mode != "RGB":
+            img = img.convert("RGB")
+        return img
+
+    def resize_crop(self, img: Image.Image) -> Image.Image:
+        """
+        Resize по короткой стороне до resize_size и центральный кроп input_size.
+        Пересчитывается только область кропа в координатах исходного изображения.
+        """
+        w, h = img.size
+        if w <= h:
+            new_w, new_h = self.resize_size, int(self.resize_size * h / w)
+        else:
+            new_w, new_h = int(self.resize_size * w / h), self.resize_size
+
+        top = int(round((new_h - self.input_size) / 2.0))
+        left = int(round((new_w - self.input_size) / 2.0))
+        sx, sy = w / new_w, h / new_h
+        box = (left * sx, top * sy, (left + self.input_size) * sx, (top + self.input_size) * sy)
+
+        return img.resize((self.input_size, self.input_size), Image.BILINEAR, box=box)
+
+    def crop(self, img: Image.Image) -> np.ndarray:
+        """Resize/crop декодированного изображения; uint8-массив (input_size, input_size, 3)"""
+        return np.asarray(self.resize_crop(img), dtype=np.uint8)
+
+    def prepare(self, source: ImageSource) -> np.ndarray:
+        """Декодирование + resize/crop; uint8-массив (input_size, input_size, 3)"""
+        return self.crop(self.decode(source))
+
+    def normalize_into(self, array: np.ndarray, out: np.ndarray) -> np.ndarray:
+        """Нормализует uint8-массив (H, W, 3) в out (3, H, W) float32"""
+        scratch = self._scratch()
+        np.multiply(array, self._scale, out=scratch, casting="unsafe")
+        scratch += self._bias
+        out[...] = scratch.transpose(2, 0, 1)
+        return out
+
+    def array(self, source: ImageSource) -> np.ndarray:
+        """Нормализованный массив одного изображения (3, input_size, input_size)"""
+        out = np.empty((3, self.input_size, self.input_size), dtype=np.float32)
+        return self.normalize_into(self.prepare(source), out)
+
+    def batch(self, sources: Iterable[ImageSource], out: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        Нормализованный батч (N, 3, input_size, input_size).
+
+        Без out используется буфер текущего потока: результат действителен
+        до следующего вызова batch() в этом же потоке.
+        """
+        sources = list(sources)
+        if out is None:
+            out = self.buffer(len(sources))
+        for i, source in enumerate(sources):
+            self.normalize_into(self.prepare(source), out[i])
+        return out
+
+    def _scratch(self) -> np.ndarray:
+        scratch = getattr(self._local, "scratch", None)
+        if scratch is None:
+            scratch = np.empty((self.input_size, self.input_size, 3), dtype=np.float32)
+            self._local.scratch = scratch
+        return scratch
+
+    def buffer(self, size: int) -> np.ndarray:
+        """Предвыделенный буфер батча текущего потока (N, 3, input_size, input_size)"""
+        buffer = getattr(self._local, "buffer", None)
+        if buffer is None or len(buffer) < size:
+            buffer = np.empty((size, 3, self.input_size, self.input_size), dtype=np.float32)
+            self._local.buffer = buffer
+        return buffer[:size]
@@ -0,0 +1,418 @@
+#!/usr/bin/env python3
+"""
+Сервер модели: пул процессов инференса с одной общей копией весов.
+
+Веса FineTunedViT загружаются один раз и переносятся в разделяемую память
+(model.share_memory()), процессы инференса получают их по дескриптору,
+без копирования. API-воркеры подключаются к серверу через
+multiprocessing.connection и отправляют подготовленные изображения 224x224,
+поэтому им не нужно держать собственную копию модели.
+
+Запуск:
+    python -m app.models.server
+"""
+
+import itertools
+import logging
+import os
+import queue
+import threading
+from concurrent.futures import Future
+from multiprocessing.connection import Client, Listener
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from app.models.preprocessing import MEAN, STD, ImageSource, Preprocessor
+
+logger = logging.getLogger(__name__)
+
+def parse_address(address: str):
+    """'host:port' -> (host, port); иначе — путь unix-сокета"""
+    host, sep, port = address.rpartition(":")
+    if sep and port.isdigit():
+        return host, int(port)
+    return address
+
+
+def _inference_worker(model, classes, requests, results, torch_threads: int, max_batch_size: int):
+    """
+    Процесс инференса: забирает изображения из очереди и классифицирует их батчами.
+    Для запросов с эмбеддингом вместе с классами возвращается эмбеддинг бэкбона
+    """
+    import torch
+
+    if torch_threads > 0:
+        torch.set_num_threads(torch_threads)
+    torch.set_grad_enabled(False)
+
+    mean = torch.tensor(MEAN).view(1, 3, 1, 1)
+    std = torch.tensor(STD).view(1, 3, 1, 1)
+
+    stop = False
+    while not stop:
+        item = requests.get()
+        if item is None:
+            break
+
+        # Всё, что уже накопилось в очереди, обрабатываем одним батчем
+        batch = [item]
+        while len(batch) < max_batch_size:
+            try:
+                item = requests.get_nowait()
+            except queue.Empty:
+                break
+            if item is None:
+                stop = True
+                break
+            batch.append(item)
+
+        keys = [key for key, _, _, _ in batch]
+        try:
+            x = torch.from_numpy(np.stack([array for _, array, _, _ in batch]))
+            x = x.permute(0, 3, 1, 2).float().div_(255.0)
+            x = (x - mean) / std
+
+            embeddings, logits = model(x)
+            probs = torch.nn.functional.softmax(logits, dim=1)
+            k = min(max(top_k for _, _, top_k, _ in batch), len(classes))
+            values, indices = probs.topk(k, dim=1)
+
+            for row, (key, _, top_k, with_embedding) in enumerate(batch):
+                ranked = [
+                    (classes[idx], prob)
+                    for idx, prob in zip(indices[row].tolist()[:top_k], values[row].tolist()[:top_k])
+                ]
+                if with_embedding:
+                    results.put((key, (ranked, embeddings[row].float().numpy().copy()), None))
+                else:
+                    results.put((key, ranked, None))
+        except Exception as e:
+            for key in keys:
+                results.put((key, None, str(e)))
+
+
+class ModelServer:
+    """Сервер модели с пулом процессов инференса"""
+
+    def __init__(
+        self,
+        address: str,
+        authkey: bytes,
+        processes: int = 2,
+        torch_threads: int = 0,
+        max_batch_size: int = 16,
+    ):
+        self.address = parse_address(address)
+        self.authkey = authkey
+        self.processes = max(1, processes)
+        self.torch_threads = torch_threads or max(1, (os.cpu_count() or 1) // self.processes)
+        self.max_batch_size = max_batch_size
+
+        self.classes: Optional[list] = None
+        self.model_version: Optional[str] = None
+        self._workers = []
+        self._requests = None
+        self._results = None
+
+        self._connections = {}
+        self._connections_lock = threading.Lock()
+        self._conn_ids = itertools.count()
+
+    def start(self):
+        """Загружает модель, переносит веса в разделяемую память и запускает процессы"""
+        import torch.multiprocessing as mp
+        from app.models.classifier import ImageClassifier
+
+        base = ImageClassifier()
+        base._load_model()
+        model = base.model
+        model.share_memory()
+        self.classes = list(base.classes)
+        self.model_version = base.model_version
+
+        # spawn: дочерние процессы не наследуют состояние OpenMP родителя,
+        # а тензоры модели передаются им через разделяемую память
+        ctx = mp.get_context("spawn")
+        self._requests = ctx.Queue()
+        self._results = ctx.Queue()
+
+        for i in range(self.processes):
+            process = ctx.Process(
+                target=_inference_worker,
+                args=(model, self.classes, self._requests, self._results,
+                      self.torch_threads, self.max_batch_size),
+                name=f"model-worker-{i}",
+                daemon=True,
+            )
+            process.start()
+            self._workers.append(process)
+
+        threading.Thread(target=self._dispatch_results, name="model-results", daemon=True).start()
+        logger.info(
+            f"Сервер модели запущен: процессов={self.processes}, "
+            f"потоков torch на процесс={self.torch_threads}"
+        )
+
+    def serve_forever(self):
+        """Принимает подключения API-воркеров"""
+        with Listener(self.address, authkey=self.authkey) as listener:
+            logger.info(f"Ожидаю подключения на {self.address}")
+            while True:
+                try:
+                    conn = listener.accept()
+                except Exception as e:
+                    logger.warning(f"Не удалось принять подключение: {e}")
+                    continue
+
+                conn_id = next(self._conn_ids)
+                with self._connections_lock:
+                    self._connections[conn_id] = (conn, threading.Lock())
+                threading.Thread(
+                    target=self._handle_client, args=(conn_id, conn), daemon=True
+                ).start()
+
+    def stop(self):
+        for _ in self._workers:
+            self._requests.put(None)
+        for process in self._workers:
+            process.join(timeout=5)
+        self._workers = []
+
+    def _handle_client(self, conn_id: int, conn):
+        """Читает запросы одного API-воркера и ставит их в общую очередь"""
+        try:
+            while True:
+                message = conn.recv()
+                kind, req_id = message[0], message[1]
+                if kind in ("classify", "embed"):
+                    _, _, array, top_k = message
+                    self._requests.put(((conn_id, req_id), array, top_k, kind == "embed"))
+                elif kind == "ping":
+                    self._send(conn_id, ("pong", req_id, {
+                        "processes": self.processes,
+                        "torch_threads": self.torch_threads,
+                        "classes": self.classes,
+                        "model_version": self.model_version,
+                    }))
+        except (EOFError, OSError):
+            pass
+        finally:
+            with self._connections_lock:
+                self._connections.pop(conn_id, None)
+            conn.close()
+
+    def _dispatch_results(self):
+        """Отправляет результаты инференса тем воркерам, от которых пришли запросы"""
+        while True:
+            (conn_id, req_id), ranked, error = self._results.get()
+            self._send(conn_id, ("result", req_id, ranked, error))
+
+    def _send(self, conn_id: int, message):
+        with self._connections_lock:
+            entry = self._connections.get(conn_id)
+        if entry is None:
+            return
+        conn, lock = entry
+        with lock:
+            try:
+                conn.send(message)
+            except OSError:
+                pass
+
+
+class RemoteClassifier:
+    """
+    Клиент сервера модели с интерфейсом ImageClassifier.
+
+    Декодирование и resize/crop выполняются локально, на сервер уходит
+    только uint8-массив 224x224x3.
+    """
+
+    def __init__(self, address: str, authkey: bytes, timeout: float = 30.0):
+        self.address = parse_address(address)
+        self.authkey = authkey
+        self.timeout = timeout
+        self.confidence_threshold = 0.9  # 90% порог уверенности
+        self.classes: Optional[list] = None
+        self._model_version: Optional[str] = None
+        self._is_loaded = False
+
+        self._conn = None
+        self._conn_lock = threading.Lock()
+        self._send_lock = threading.Lock()
+        self._pending = {}
+        self._req_ids = itertools.count()
+
+        # Нормализация выполняется на сервере, здесь только decode + resize/crop
+        self.preprocessor = Preprocessor()
+
+    def _connect(self):
+        """Подключается к серверу (при первом обращении или после обрыва)"""
+        with self._conn_lock:
+            if self._conn is None:
+                conn = Client(self.address, authkey=self.authkey)
+                threading.Thread(
+                    target=self._read_replies, args=(conn,), name="model-client", daemon=True
+                ).start()
+                self._conn = conn
+            return self._conn
+
+    def _read_replies(self, conn):
+        """Раздаёт ответы сервера ожидающим запросам"""
+        try:
+            while True:
+                reply = conn.recv()
+                future = self._pending.pop(reply[1], None)
+                if future is not None:
+                    future.set_result(reply)
+        except (EOFError, OSError):
+            pass
+
+        with self._conn_lock:
+            if self._conn is conn:
+                self._conn = None
+        self._is_loaded = False
+        for req_id in list(self._pending):
+            future = self._pending.pop(req_id, None)
+            if future is not None:
+                future.set_exception(ConnectionError("Соединение с сервером модели потеряно"))
+
+    def _send_request(self, kind: str, *payload) -> Tuple[int, Future]:
+        conn = self._connect()
+        req_id = next(self._req_ids)
+        future: Future = Future()
+        self._pending[req_id] = future
+        try:
+            with self._send_lock:
+                conn.send((kind, req_id, *payload))
+        except Exception:
+            self._pending.pop(req_id, None)
+            raise
+        return req_id, future
+
+    def _wait(self, request: Tuple[int, Future], timeout: Optional[float] = None):
+        req_id, future = request
+        try:
+            return future.result(timeout=timeout or self.timeout)
+        finally:
+            self._pending.pop(req_id, None)
+
+    def _request(self, kind: str, *payload, timeout: Optional[float] = None):
+        return self._wait(self._send_request(kind, *payload), timeout)
+
+    @property
+    def model_version(self) -> str:
+        """Версия модели на сервере (для ключей эмбеддингов); известна после ping"""
+        if self._model_version is None and not self.is_ready():
+            raise ConnectionError("Сервер модели недоступен")
+        return self._model_version
+
+    def classify_batch(
+        self, images: List[ImageSource], top_k: int = 1
+    ) -> List[Optional[List[Tuple[str, float]]]]:
+        """
+        Классифицирует несколько изображений; запросы отправляются сразу все,
+        и сервер обрабатывает их одним батчем
+        """
+        return self._run(images, top_k, "classify")
+
+    def embed_batch(self, images: List[ImageSource], top_k: int = 1) -> List[Optional[tuple]]:
+        """
+        Классифицирует изображения и возвращает эмбеддинги бэкбона
+
+        Returns:
+            Для каждого изображения (top-k классов, эмбеддинг float32 (768,))
+            или None, если изображение не декодируется
+        """
+        return self._run(images, top_k, "embed")
+
+    def _run(self, images: List[ImageSource], top_k: int, kind: str) -> list:
+        requests = []
+        for image_bytes in images:
+            try:
+                array = self.preprocessor.prepare(image_bytes)
+            except Exception as e:
+                logger.warning(f"Не удалось декодировать изображение: {e}")
+                requests.append(None)
+                continue
+            requests.append(self._send_request(kind, array, top_k))
+
+        results = []
+        for request in requests:
+            if request is None:
+                results.append(None)
+                continue
+            _, _, ranked, error = self._wait(request)
+            if error is not None:
+                raise RuntimeError(f"Ошибка сервера модели: {error}")
+            results.append(ranked)
+        return results
+
+    def predict(self, image_bytes: ImageSource) -> str:
+        """Классифицирует изображение; 'unknown' если уверенность < 90%"""
+        class_name, _ = self.get_prediction_with_confidence(image_bytes)
+        return class_name
+
+    def get_prediction_with_confidence(self, image_bytes: ImageSource) -> Tuple[str, float]:
+        """Классифицирует изображение и возвращает (класс, уверенность)"""
+        try:
+            ranked = self.classify_batch([image_bytes])[0]
+        except Exception as e:
+            logger.error(f"Ошибка при классификации на сервере модели: {e}")
+            return "unknown", 0.0
+        if ranked is None:
+            return "unknown", 0.0
+        class_name, confidence = ranked[0]
+        if confidence >= self.confidence_threshold:
+            return class_name, confidence
+        return "unknown", confidence
+
+    @property
+    def load_state(self) -> str:
+        return "ready" if self._is_loaded else "not_loaded"
+
+    def start_background_load(self, warmup_batch_sizes=(1,)) -> threading.Thread:
+        """Подключается к серверу модели в фоне; модель загружена и прогрета на сервере"""
+        thread = threading.Thread(target=self.is_ready, name="model-client-connect", daemon=True)
+        thread.start()
+        return thread
+
+    def is_ready(self) -> bool:
+        """Проверяет доступность сервера модели"""
+        try:
+            _, _, info = self._request("ping", timeout=1.0)
+            self.classes = info["classes"]
+            self._model_version = info.get("model_version")
+            self._is_loaded = True
+        except Exception:
+            self._is_loaded = False
+        return self._is_loaded
+
+    def batch_stats(self) -> dict:
+        return {"enabled": False, "mode": "server", "address": str(self.address)}
+
+    def cache_stats(self) -> dict:
+        return {"enabled": False}
+
+
+def main():
+    logging.basicConfig(level=logging.INFO)
+    from app.core.config import settings
+
+    server = ModelServer(
+        address=settings.MODEL_SERVER_ADDRESS,
+        authkey=(settings.MODEL_SERVER_AUTHKEY or settings.SECRET_KEY).encode(),
+        processes=settings.MODEL_SERVER_PROCESSES,
+        torch_threads=settings.MODEL_SERVER_TORCH_THREADS,
+        max_batch_size=settings.CLASSIFIER_BATCH_MAX_SIZE,
+    )
+    server.start()
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+import json
+from datetime import date, datetime, timedelta
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+import numpy as np
+
+from app.db.session import get_db
+from app.db.models import DailyNutritionSummary, UserPlan
+from app.utils.analytics import MACROS, ROLLING_WINDOWS, get_analytics_cache, progress_report
+from app.utils.dependencies import get_current_user
+from app.utils.user_cache import CurrentUser
+
+router = APIRouter(
+    prefix="/analytics",
+    tags=["Analytics"]
+)
+
+MAX_RANGE_DAYS = 366
+PERIOD_DAYS = {"week": 7, "month": 30}
+
+
+@router.get("/progress")
+async def get_progress(
+    period: str = Query("week", pattern="^(week|month)$", description="Период, если date_from не задан"),
+    date_from: Optional[date] = Query(None, description="Первый день отчёта"),
+    date_to: Optional[date] = Query(None, description="Последний день отчёта (по умолчанию сегодня)"),
+    tolerance: float = Query(0.1, gt=0, le=1, description="Допустимое отклонение калорий от цели"),
+    current_user: CurrentUser = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Прогресс относительно плана питания: соблюдение по дням, скользящие
+    средние за 7 и 30 дней, серии дней в плане и итоги периода
+    """
+    # По user_id, а не по plan_id из снимка: снимок может отставать от других процессов
+    plan = (await db.execute(
+        select(UserPlan).where(UserPlan.user_id == current_user.id)
+    )).scalar_one_or_none()
+    if not plan:
+        raise HTTPException(status_code=404, detail="План питания не найден")
+
+    date_to = date_to or datetime.utcnow().date()
+    date_from = date_from or date_to - timedelta(days=PERIOD_DAYS[period] - 1)
+    if date_from > date_to:
+        raise HTTPException(status_code=400, detail="date_from позже date_to")
+    if (date_to - date_from).days >= MAX_RANGE_DAYS:
+        raise HTTPException(status_code=400, detail=f"Период не длиннее {MAX_RANGE_DAYS} дней")
+
+    # Допуск округляется до процента: иначе каждое новое значение — новый отчёт в кэше
+    tolerance = max(round(tolerance, 2), 0.01)
+    targets = (plan.calories_per_day, plan.protein_g, plan.fat_g, plan.carb_g)
+    # Цели плана входят в ключ: пересчёт плана сам делает старые отчёты недоступными
+    key = (date_from, date_to, tolerance, targets)
+    cache = get_analytics_cache()
+    body = cache.get(current_user.id, key)
+    if body is not None:
+        return Response(content=body, media_type="application/json")
+
+    generation = cache.generation(current_user.id)
+    history_from = date_from - timedelta(days=max(ROLLING_WINDOWS) - 1)
+    rows = (await db.execute(select(
+        DailyNutritionSummary.date,
+        *(getattr(DailyNutritionSummary, name) for name in MACROS),
+    ).where(
+        DailyNutritionSummary.user_id == current_user.id,
+        DailyNutritionSummary.date >= history_from,
+        DailyNutritionSummary.date <= date_to,
+        DailyNutritionSummary.meals_count > 0,
+    ))).all()
+
+    def render() -> bytes:
+        days = [row[0] for row in rows]
+        values = np.array([row[1:] for row in rows], dtype=np.float64).reshape(-1, len(MACROS))
+        report = progress_report(days, values, targets, date_from, date_to, tolerance)
+        # В кэше — готовый JSON: повторный запрос не сериализует сотни дней заново
+        return json.dumps(report, ensure_ascii=False).encode()
+
+    # Расчёт и сериализация за год — миллисекунды CPU: вне цикла событий
+    body = await run_in_threadpool(render)
+    cache.put(current_user.id, key, body, generation)
+    return Response(content=body, media_type="application/json")
@@ -1,78 +1,69 @@
 # app/routers/auth.py
 from fastapi import APIRouter, Depends, HTTPException, status
-from fastapi.security import OAuth2PasswordRequestForm, OAuth2PasswordBearer
-from sqlalchemy.orm import Session
-import jwt
+from fastapi.security import OAuth2PasswordRequestForm
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.schemas.auth import UserCreate, UserRead, Token
 from app.db.models import User
-from app.core.security import hash_password, verify_password, create_access_token, decode_access_token
+from app.core.passwords import PasswordQueueFull, get_password_hasher
+from app.core.security import create_access_token
 from app.db.session import get_db
-from app.core.config import settings
 
 router = APIRouter()
-oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/login")
 
 
-async def get_current_user(
-    token: str = Depends(oauth2_scheme),
-    db: Session = Depends(get_db)
-) -> User:
-    """
-    Получает текущего пользователя по токену из заголовка Authorization
-    """
-    credentials_exception = HTTPException(
-        status_code=status.HTTP_401_UNAUTHORIZED,
-        detail="Could not validate credentials",
-        headers={"WWW-Authenticate": "Bearer"},
-    )
-    
+async def _run_hasher(method, *args):
+    """bcrypt в пуле процессов; при переполнении очереди — 503"""
     try:
-        user_id = decode_access_token(token)
-        user = db.query(User).filter(User.id == user_id).first()
-        if user is None:
-            raise credentials_exception
-        return user
-    except jwt.ExpiredSignatureError:
+        return await method(*args)
+    except PasswordQueueFull as e:
         raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Token has expired",
-            headers={"WWW-Authenticate": "Bearer"},
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Too many authentication requests, please retry later",
+            headers={"Retry-After": str(e.retry_after)},
         )
-    except Exception:
-        raise credentials_exception
 
 
 @router.post("/register", response_model=UserRead, status_code=status.HTTP_201_CREATED)
-def register(user_in: UserCreate, db: Session = Depends(get_db)):
-    if db.query(User).filter_by(email=user_in.email).first():
+async def register(user_in: UserCreate, db: AsyncSession = Depends(get_db)):
+    if await db.scalar(select(User).filter_by(email=user_in.email)):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Email already registered"
         )
     user = User(
         email=user_in.email,
-        hashed_password=hash_password(user_in.password)
+        hashed_password=await _run_hasher(get_password_hasher().hash, user_in.password)
     )
     db.add(user)
-    db.commit()
-    db.refresh(user)
+    await db.commit()
     return user
 
 
 @router.post("/login", response_model=Token)
-def login(
+async def login(
     form_data: OAuth2PasswordRequestForm = Depends(),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     # Ищем пользователя по form_data.username
-    user = db.query(User).filter_by(email=form_data.username).first()
-    if not user or not verify_password(form_data.password, user.hashed_password):
+    user = await db.scalar(select(User).filter_by(email=form_data.username))
+    verified, new_hash = False, None
+    if user:
+        verified, new_hash = await _run_hasher(
+            get_password_hasher().verify_and_update, form_data.password, user.hashed_password
+        )
+    if not verified:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect email or password",
             headers={"WWW-Authenticate": "Bearer"},
         )
 
+    # Стоимость bcrypt изменилась — сохраняем хеш, пересчитанный из введённого пароля
+    if new_hash:
+        user.hashed_password = new_hash
+        await db.commit()
+
     access_token = create_access_token(user.id)
     return {"access_token": access_token, "token_type": "bearer"}
@@ -1,31 +1,32 @@
-from fastapi import APIRouter, File, UploadFile, HTTPException
+import asyncio
+from typing import List
+
+from fastapi import APIRouter, File, UploadFile, HTTPException, Query
+from fastapi.concurrency import run_in_threadpool
 from fastapi.responses import JSONResponse
 import logging
 import os
 
+from app.models.nutrition import get_nutrition_db
+from app.models.portion import get_portion_estimator, mask_to_rle
+from app.utils.inference import get_classifier_safe, run_inference
+from app.utils.uploads import read_image_upload
+
 # Настраиваем логирование
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
-def _get_classifier_safe():
-    """Безопасное получение классификатора с обработкой ошибок"""
-    try:
-        from app.models.classifier import get_classifier
-        return get_classifier()
-    except ImportError as e:
-        logger.error(f"Ошибка импорта зависимостей: {e}")
-        raise HTTPException(
-            status_code=500,
-            detail="Зависимости для машинного обучения не установлены. Установите: pip install torch torchvision timm pillow"
-        )
-    except Exception as e:
-        logger.error(f"Ошибка при получении классификатора: {e}")
-        raise HTTPException(
-            status_code=500,
-            detail=f"Ошибка инициализации модели: {str(e)}"
-        )
+def _format_ranked(ranked):
+    """Список (класс, вероятность) -> JSON"""
+    return [{"class": name, "confidence": round(prob, 3)} for name, prob in ranked]
+
+def _format_nutrients(nutrients):
+    """Nutrients -> JSON (None, если класса нет в таблице)"""
+    if nutrients is None:
+        return None
+    return {name: round(value, 1) for name, value in nutrients._asdict().items()}
 
 @router.post("/classify")
 async def classify_image(file: UploadFile = File(...)):
@@ -38,22 +39,15 @@ async def classify_image(file: UploadFile = File(...)):
     Returns:
         JSON с результатом классификации
     """
-    # Проверяем тип файла
-    if not file.content_type or not file.content_type.startswith('image/'):
-        raise HTTPException(
-            status_code=400, 
-            detail="Файл должен быть изображением"
-        )
-    
     try:
-        # Читаем содержимое файла
-        image_bytes = await file.read()
+        # Проверяем размер и формат; файл декодируется из буфера загрузки без копирования
+        image = await read_image_upload(file)
         
         # Получаем классификатор
-        classifier = _get_classifier_safe()
+        classifier = get_classifier_safe()
         
-        # Классифицируем изображение
-        predicted_class = classifier.predict(image_bytes)
+        # Классифицируем изображение в пуле инференса, не блокируя event loop
+        predicted_class = await run_inference(classifier.predict, image)
         
         logger.info(f"Классификация завершена: {predicted_class}")
         
@@ -75,32 +69,38 @@ async def classify_image(file: UploadFile = File(...)):
         )
 
 @router.post("/classify-detailed")
-async def classify_image_detailed(file: UploadFile = File(...)):
+async def classify_image_detailed(
+    file: UploadFile = File(...),
+    top_k: int = Query(1, ge=1, le=10, description="Сколько наиболее вероятных классов вернуть"),
+):
     """
     Классифицирует загруженное изображение с подробной информацией
     
     Args:
         file: Загруженный файл изображения
+        top_k: Сколько наиболее вероятных классов вернуть
         
     Returns:
-        JSON с результатом классификации и уверенностью
+        JSON с результатом классификации, уверенностью и top-k классами
     """
-    # Проверяем тип файла
-    if not file.content_type or not file.content_type.startswith('image/'):
-        raise HTTPException(
-            status_code=400, 
-            detail="Файл должен быть изображением"
-        )
-    
     try:
-        # Читаем содержимое файла
-        image_bytes = await file.read()
+        # Проверяем размер и формат; файл декодируется из буфера загрузки без копирования
+        image = await read_image_upload(file)
         
         # Получаем классификатор
-        classifier = _get_classifier_safe()
+        classifier = get_classifier_safe()
         
-        # Классифицируем изображение с получением уверенности
-        predicted_class, confidence = classifier.get_prediction_with_confidence(image_bytes)
+        # Классифицируем изображение с получением top-k классов
+        ranked = (await run_inference(classifier.classify_batch, [image], top_k))[0]
+        if ranked is None:
+            # Изображение не декодируется — как и раньше, отвечаем unknown
+            ranked = []
+        predicted_class, confidence = ranked[0] if ranked else ("unknown", 0.0)
+        if confidence < classifier.confidence_threshold:
+            predicted_class = "unknown"
+
+        # КБЖУ типичной порции распознанного блюда
+        nutrients = get_nutrition_db().lookup(predicted_class)
         
         logger.info(f"Классификация завершена: {predicted_class} (уверенность: {confidence:.3f})")
         
@@ -111,6 +111,8 @@ async def classify_image_detailed(file: UploadFile = File(...)):
                 "confidence": round(confidence, 3),
                 "confidence_percentage": round(confidence * 100, 1),
                 "threshold_met": confidence >= 0.9,
+                "top_k": _format_ranked(ranked),
+                "nutrition": _format_nutrients(nutrients),
                 "message": "Классификация выполнена успешно"
             }
         )
@@ -124,6 +126,211 @@ async def classify_image_detailed(file: UploadFile = File(...)):
             detail=f"Ошибка при обработке изображения: {str(e)}"
         )
 
+@router.post("/classify-batch")
+async def classify_images_batch(
+    files: List[UploadFile] = File(...),
+    top_k: int = Query(3, ge=1, le=10, description="Сколько наиболее вероятных классов вернуть"),
+):
+    """
+    Классифицирует несколько изображений одним запросом и одним forward-проходом
+    
+    Args:
+        files: Загруженные файлы изображений
+        top_k: Сколько наиболее вероятных классов вернуть для каждого
+        
+    Returns:
+        JSON с результатами в порядке загрузки файлов
+    """
+    from app.core.config import settings
+
+    if len(files) > settings.CLASSIFIER_MAX_BATCH_FILES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Можно загрузить не более {settings.CLASSIFIER_MAX_BATCH_FILES} файлов"
+        )
+
+    try:
+        images = []
+        for file in files:
+            try:
+                images.append(await read_image_upload(file))
+            except HTTPException as e:
+                if e.status_code != 400:
+                    raise
+                raise HTTPException(status_code=400, detail=f"Файл {file.filename} должен быть изображением")
+        classifier = get_classifier_safe()
+
+        # Весь батч занимает одно место в очереди инференса
+        batch = await run_inference(classifier.classify_batch, images, top_k)
+
+        # КБЖУ типичных порций для всего батча — одной векторной операцией
+        predicted = [
+            ranked[0][0] if ranked and ranked[0][1] >= classifier.confidence_threshold else "unknown"
+            for ranked in batch
+        ]
+        nutrients = get_nutrition_db().lookup_batch(predicted)
+
+        results = []
+        for file, ranked, class_name, item_nutrients in zip(files, batch, predicted, nutrients):
+            if ranked is None:
+                results.append({"filename": file.filename, "error": "Не удалось декодировать изображение"})
+                continue
+            confidence = ranked[0][1]
+            results.append({
+                "filename": file.filename,
+                "class": class_name,
+                "confidence": round(confidence, 3),
+                "threshold_met": confidence >= classifier.confidence_threshold,
+                "top_k": _format_ranked(ranked),
+                "nutrition": _format_nutrients(item_nutrients),
+            })
+
+        logger.info(f"Пакетная классификация завершена: {len(results)} изображений")
+
+        return JSONResponse(
+            status_code=200,
+            content={
+                "results": results,
+                "message": "Классификация выполнена успешно"
+            }
+        )
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Ошибка при пакетной классификации: {str(e)}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"Ошибка при обработке изображений: {str(e)}"
+        )
+
+@router.post("/classify-portion")
+async def classify_portion(
+    file: UploadFile = File(...),
+    include_masks: bool = Query(False, description="Вернуть маски областей в RLE"),
+):
+    """
+    Классифицирует блюдо и оценивает вес порции по фото
+    
+    Изображение декодируется один раз; классификация и сегментация
+    выполняются параллельно в пуле инференса, затем вес пересчитывается
+    под типичную порцию распознанного блюда.
+    
+    Args:
+        file: Загруженный файл изображения
+        include_masks: Вернуть маски областей (RLE в разрешении сегментации)
+        
+    Returns:
+        JSON с классом, весом порции, областями блюда и КБЖУ на этот вес
+    """
+    try:
+        image = await read_image_upload(file)
+        classifier = get_classifier_safe()
+        estimator = get_portion_estimator()
+
+        try:
+            decoded = await run_in_threadpool(classifier.preprocessor.decode, image)
+        except Exception:
+            raise HTTPException(status_code=400, detail="Не удалось декодировать изображение")
+
+        batch, estimate = await asyncio.gather(
+            run_inference(classifier.classify_batch, [decoded], 1),
+            run_inference(estimator.estimate, decoded),
+        )
+        if batch[0] is None:
+            # Декодированное изображение не прошло предобработку
+            raise HTTPException(status_code=400, detail="Не удалось декодировать изображение")
+        predicted_class, confidence = batch[0][0]
+        if confidence < classifier.confidence_threshold:
+            predicted_class = "unknown"
+
+        nutrition_db = get_nutrition_db()
+        typical = nutrition_db.lookup(predicted_class)
+        if typical is not None:
+            estimate = estimator.reweigh(estimate, typical.grams)
+        nutrients = nutrition_db.lookup(predicted_class, estimate.grams) if estimate.regions else typical
+
+        regions = []
+        for region in estimate.regions:
+            item = {
+                "bbox": [round(value, 3) for value in region.bbox],
+                "area_fraction": round(region.area_fraction, 3),
+                "grams": round(region.grams, 1),
+            }
+            if include_masks:
+                item["mask"] = mask_to_rle(region.mask)
+            regions.append(item)
+
+        logger.info(
+            f"Оценка порции завершена: {predicted_class}, {estimate.grams:.0f} г "
+            f"({estimate.mode}, областей: {len(regions)})"
+        )
+
+        return JSONResponse(
+            status_code=200,
+            content={
+                "class": predicted_class,
+                "confidence": round(confidence, 3),
+                "threshold_met": confidence >= classifier.confidence_threshold,
+                "portion": {
+                    "grams": round(estimate.grams, 1),
+                    "area_fraction": round(estimate.area_fraction, 3),
+                    "mode": estimate.mode,
+                    "resolution": list(estimate.resolution),
+                    "regions": regions,
+                },
+                "nutrition": _format_nutrients(nutrients),
+                "message": "Оценка порции выполнена успешно"
+            }
+        )
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Ошибка при оценке порции: {str(e)}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"Ошибка при обработке изображения: {str(e)}"
+        )
+
+@router.get("/stats")
+async def batching_stats():
+    """Статистика инференса: пул потоков, глубина очереди и размеры батчей"""
+    from app.models.executor import get_inference_executor
+
+    classifier = get_classifier_safe()
+    return JSONResponse(
+        status_code=200,
+        content={
+            "executor": get_inference_executor().stats(),
+            "batching": classifier.batch_stats(),
+            "cache": classifier.cache_stats(),
+        },
+    )
+
+@router.get("/live")
+async def liveness():
+    """Liveness: процесс жив и обслуживает запросы (модель не проверяется)"""
+    return {"status": "alive"}
+
+@router.get("/ready")
+async def readiness():
+    """Readiness: модель загружена и прогрета, можно направлять трафик"""
+    try:
+        classifier = get_classifier_safe()
+    except HTTPException as e:
+        return JSONResponse(status_code=503, content={"status": "not_ready", "error": e.detail})
+
+    ready = classifier.is_ready()
+    return JSONResponse(
+        status_code=200 if ready else 503,
+        content={
+            "status": "ready" if ready else "not_ready",
+            "state": classifier.load_state,
+            "error": getattr(classifier, "load_error", None),
+        },
+    )
+
 @router.get("/health")
 async def health_check():
     """Проверка работоспособности модели классификации"""
@@ -134,9 +341,9 @@ async def health_check():
         model_file_exists = os.path.exists(MODEL_PATH)
         classes_file_exists = os.path.exists(CLASSES_PATH)
         
-        classifier = _get_classifier_safe()
+        classifier = get_classifier_safe()
         
-        # Проверяем готовность модели
+        # Проверяем готовность модели (без загрузки — её выполняет старт приложения)
         model_ready = classifier.is_ready()
         
         return JSONResponse(
@@ -144,6 +351,8 @@ async def health_check():
             content={
                 "status": "healthy" if model_ready else "not_ready",
                 "model_loaded": classifier._is_loaded,
+                "state": classifier.load_state,
+                "backend": getattr(classifier, "backend", None),
                 "classes_count": len(classifier.classes) if classifier.classes else 0,
                 "files_exist": {
                     "model_file": model_file_exists,
@@ -1,30 +1,37 @@
-from typing import List
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File
-from sqlalchemy.orm import Session
-from sqlalchemy import func
-from datetime import datetime
+import asyncio
+import base64
+from typing import List, Optional, Tuple
+from fastapi import APIRouter, Depends, Form, HTTPException, Query, Response, UploadFile, File
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import func, select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+from datetime import date, datetime as dt, time, timedelta
 import os
-import shutil
-from pathlib import Path
 
+import numpy as np
+
+from app.core.config import settings
 from app.db.session import get_db
-from app.db.models import MealRecord
-from app.schemas.meals import MealRecordCreate, MealRecord as MealRecordSchema, DayMealsSummary
+from app.db.models import DailyNutritionSummary, MealRecord, MealEmbedding, MealType
+from app.db.summaries import MEAL_TYPE_COLUMNS
+from app.models.embeddings import from_bytes, get_index_registry, normalize, to_bytes
+from app.models.nutrition import get_nutrition_db
+from app.models.portion import get_portion_estimator
+from app.schemas.meals import to_naive_utc, MealRecordCreate, MealRecord as MealRecordSchema, DayMealsSummary, DailyNutrition, MealMatch, MealImage, MealSnap
 from app.utils.dependencies import get_current_user
-from app.db.models import User
+from app.utils.user_cache import CurrentUser
+from app.utils.inference import get_classifier_safe, run_inference
+from app.utils.storage import get_image_store
+from app.utils.uploads import read_image_upload
 
 router = APIRouter(prefix="/meals", tags=["meals"])
 
-# Создаем директорию для изображений, если она не существует
-MEAL_IMAGES_DIR = Path("app/static/meal_images")
-MEAL_IMAGES_DIR.mkdir(parents=True, exist_ok=True)
-
 
 @router.post("/", response_model=MealRecordSchema)
-def create_meal_record(
+async def create_meal_record(
     meal: MealRecordCreate,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: CurrentUser = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
 ):
     """Создание новой записи о приеме пищи (image_path — строка, загрузка файла отдельно)"""
     db_meal = MealRecord(
@@ -32,68 +39,393 @@ def create_meal_record(
         user_id=current_user.id
     )
     db.add(db_meal)
-    db.commit()
-    db.refresh(db_meal)
+    await db.commit()
     return db_meal
 
 
+def _encode_cursor(meal: MealRecord) -> str:
+    """Курсор — позиция последней записи страницы: (datetime, id)"""
+    raw = f"{meal.datetime.isoformat()}|{meal.id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def _decode_cursor(cursor: str) -> Tuple[dt, int]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        moment, meal_id = raw.rsplit("|", 1)
+        return to_naive_utc(dt.fromisoformat(moment)), int(meal_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
 @router.get("/", response_model=List[MealRecordSchema])
-def get_user_meals(
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+async def get_user_meals(
+    response: Response,
+    limit: int = Query(50, ge=1, le=200, description="Page size"),
+    cursor: Optional[str] = Query(None, description="X-Next-Cursor from the previous page"),
+    date_from: Optional[dt] = Query(None, description="Meals at or after this time"),
+    date_to: Optional[dt] = Query(None, description="Meals before this time"),
+    meal_type: Optional[List[MealType]] = Query(None, description="Only these meal types"),
+    current_user: CurrentUser = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
 ):
-    """Получение всех записей о приемах пищи текущего пользователя"""
-    return db.query(MealRecord).filter(MealRecord.user_id == current_user.id).all()
+    """
+    Записи о приемах пищи текущего пользователя, от новых к старым, постранично.
+
+    Пагинация по курсору (keyset): следующая страница начинается строго после
+    (datetime, id) последней записи, поэтому запрос идёт по индексу
+    (user_id, datetime, id) и не зависит от длины истории. Курсор следующей
+    страницы возвращается в заголовке X-Next-Cursor (нет заголовка — страниц больше нет).
+    """
+    query = select(MealRecord).where(MealRecord.user_id == current_user.id)
+    if date_from is not None:
+        query = query.where(MealRecord.datetime >= to_naive_utc(date_from))
+    if date_to is not None:
+        query = query.where(MealRecord.datetime < to_naive_utc(date_to))
+    if meal_type:
+        query = query.where(MealRecord.meal_type.in_([int(value) for value in meal_type]))
+    if cursor is not None:
+        query = query.where(tuple_(MealRecord.datetime, MealRecord.id) < _decode_cursor(cursor))
+
+    # Лишняя запись показывает, есть ли следующая страница
+    query = query.order_by(MealRecord.datetime.desc(), MealRecord.id.desc()).limit(limit + 1)
+    meals = (await db.scalars(query)).all()
+    if len(meals) > limit:
+        meals = meals[:limit]
+        response.headers["X-Next-Cursor"] = _encode_cursor(meals[-1])
+    return meals
+
+
+def _day_start(day: date) -> dt:
+    return dt.combine(day, time.min)
 
 
 @router.get("/grouped", response_model=List[DayMealsSummary])
-def get_grouped_meals(
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+async def get_grouped_meals(
+    response: Response,
+    days: int = Query(7, ge=1, le=90, description="Days with meals per page"),
+    cursor: Optional[str] = Query(None, description="X-Next-Cursor from the previous page"),
+    date_from: Optional[date] = Query(None, description="First day to include"),
+    date_to: Optional[date] = Query(None, description="Last day to include"),
+    current_user: CurrentUser = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Получение записей о приемах пищи, сгруппированных по дате.
-    Для каждой даты возвращается список приемов пищи и общая сумма калорий.
+    Для каждой даты возвращается список приемов пищи и суммы КБЖУ.
     Даты отсортированы в порядке убывания (сначала последние).
+
+    Суммы по дням читаются из daily_nutrition_summary (строка на день,
+    по первичному ключу), записи загружаются только для дней текущей
+    страницы. Курсор следующей страницы — в заголовке X-Next-Cursor.
     """
-    # Получаем все приемы пищи пользователя
-    meals = db.query(MealRecord).filter(
-        MealRecord.user_id == current_user.id
-    ).order_by(MealRecord.datetime.desc()).all()
+    upper = date_to + timedelta(days=1) if date_to is not None else None
+    if cursor is not None:
+        try:
+            before = date.fromisoformat(cursor)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        upper = min(upper, before) if upper is not None else before
+
+    query = select(DailyNutritionSummary).where(
+        DailyNutritionSummary.user_id == current_user.id,
+        DailyNutritionSummary.meals_count > 0,
+    )
+    if date_from is not None:
+        query = query.where(DailyNutritionSummary.date >= date_from)
+    if upper is not None:
+        query = query.where(DailyNutritionSummary.date < upper)
+    summaries = (await db.scalars(query.order_by(DailyNutritionSummary.date.desc()).limit(days + 1))).all()
+
+    if len(summaries) > days:
+        summaries = summaries[:days]
+        response.headers["X-Next-Cursor"] = summaries[-1].date.isoformat()
+    if not summaries:
+        return []
+
+    # Записи только для дней этой страницы; границы по datetime — запрос идёт по индексу
+    meals = (await db.scalars(select(MealRecord).where(
+        MealRecord.user_id == current_user.id,
+        MealRecord.datetime >= _day_start(summaries[-1].date),
+        MealRecord.datetime < _day_start(summaries[0].date + timedelta(days=1)),
+    ).order_by(MealRecord.datetime.desc(), MealRecord.id.desc()))).all()
 
-    # Группируем приемы пищи по дате
-    grouped_meals = {}
+    meals_by_day = {}
     for meal in meals:
-        meal_date = meal.datetime.date()
-        if meal_date not in grouped_meals:
-            grouped_meals[meal_date] = {
-                'date': meal_date,
-                'total_calories': 0,
-                'meals': []
-            }
-        grouped_meals[meal_date]['meals'].append(meal)
-        grouped_meals[meal_date]['total_calories'] += meal.calories
+        meals_by_day.setdefault(meal.datetime.date(), []).append(meal)
 
-    # Преобразуем в список и сортируем по дате (убывание)
-    result = [DayMealsSummary(**day_data) for day_data in grouped_meals.values()]
-    result.sort(key=lambda x: x.date, reverse=True)
+    return [
+        DayMealsSummary(
+            date=summary.date,
+            total_calories=summary.calories,
+            total_proteins=summary.proteins,
+            total_fats=summary.fats,
+            total_carbs=summary.carbs,
+            meals_count=summary.meals_count,
+            meals=meals_by_day.get(summary.date, []),
+        )
+        for summary in summaries
+    ]
 
-    return result
+
+@router.get("/summary/{day}", response_model=DailyNutrition)
+async def get_daily_summary(
+    day: date,
+    current_user: CurrentUser = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """Суммы КБЖУ и количество приемов пищи за день — одна строка сводки по ключу"""
+    summary = await db.get(DailyNutritionSummary, (current_user.id, day))
+    if summary is None:
+        return DailyNutrition(date=day)
+    return DailyNutrition(
+        date=day,
+        calories=summary.calories,
+        proteins=summary.proteins,
+        fats=summary.fats,
+        carbs=summary.carbs,
+        meals_count=summary.meals_count,
+        meal_type_counts={
+            meal_type: getattr(summary, column)
+            for meal_type, column in MEAL_TYPE_COLUMNS.items()
+            if getattr(summary, column)
+        },
+    )
 
 
 @router.get("/{meal_id}", response_model=MealRecordSchema)
-def get_meal_record(
+async def get_meal_record(
     meal_id: int,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: CurrentUser = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
 ):
     """Получение конкретной записи о приеме пищи"""
-    meal = db.query(MealRecord).filter(
+    meal = await db.scalar(select(MealRecord).where(
         MealRecord.id == meal_id,
         MealRecord.user_id == current_user.id
-    ).first()
+    ))
     
     if meal is None:
         raise HTTPException(status_code=404, detail="Meal record not found")
     
-    return meal 
\ No newline at end of file
+    return meal
+
+
+async def _embed_upload(file: UploadFile, classifier) -> Tuple[list, np.ndarray]:
+    """Классифицирует загруженное фото и возвращает (top-1, нормализованный эмбеддинг)"""
+    image = await read_image_upload(file)
+    result = (await run_inference(classifier.embed_batch, [image], 1))[0]
+    if result is None:
+        raise HTTPException(status_code=400, detail="Could not decode image")
+
+    ranked, embedding = result
+    return ranked, normalize(embedding)
+
+
+async def _load_user_embeddings(db: AsyncSession, user_id: int, model_version: str):
+    """Эмбеддинги блюд пользователя, посчитанные текущей версией модели"""
+    rows = (await db.execute(select(MealEmbedding.meal_id, MealEmbedding.vector).where(
+        MealEmbedding.user_id == user_id,
+        MealEmbedding.model_version == model_version
+    ))).all()
+    if not rows:
+        return [], np.empty((0, 0), dtype=np.float32)
+    return [row.meal_id for row in rows], np.stack([from_bytes(row.vector) for row in rows])
+
+
+async def _embeddings_version(db: AsyncSession, user_id: int, model_version: str) -> Tuple[int, int]:
+    """
+    Версия эмбеддингов пользователя: (количество, максимальный meal_id).
+    Меняется при записи из любого воркера — индекс в памяти сверяется с ней
+    """
+    count, last = (await db.execute(select(func.count(), func.max(MealEmbedding.meal_id)).where(
+        MealEmbedding.user_id == user_id,
+        MealEmbedding.model_version == model_version
+    ))).one()
+    return count, last or 0
+
+
+@router.post("/{meal_id}/embedding", status_code=204)
+async def set_meal_embedding(
+    meal_id: int,
+    file: UploadFile = File(...),
+    current_user: CurrentUser = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """Сохраняет эмбеддинг фото блюда для последующего поиска похожих блюд"""
+    meal = await get_meal_record(meal_id, current_user, db)
+    classifier = get_classifier_safe()
+    _, embedding = await _embed_upload(file, classifier)
+
+    record = await db.get(MealEmbedding, meal.id) or MealEmbedding(meal_id=meal.id, user_id=current_user.id)
+    record.model_version = classifier.model_version
+    record.vector = to_bytes(embedding)
+    db.add(record)
+    await db.commit()
+    get_index_registry().add(current_user.id, meal.id, embedding)
+
+
+@router.post("/match", response_model=MealMatch)
+async def match_meal(
+    file: UploadFile = File(...),
+    current_user: CurrentUser = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Ищет среди прошлых блюд пользователя то же блюдо, что на фото.
+    Если близость эмбеддингов не ниже MEAL_MATCH_MIN_SIMILARITY, возвращает
+    найденную запись (её КБЖУ можно переиспользовать), иначе только класс.
+    """
+    classifier = get_classifier_safe()
+    ranked, embedding = await _embed_upload(file, classifier)
+    predicted_class, confidence = ranked[0]
+
+    registry = get_index_registry()
+    version = await _embeddings_version(db, current_user.id, classifier.model_version)
+    index = registry.peek(current_user.id, version)
+    if index is None:
+        # Эмбеддинги читаются асинхронно, индекс (IVF — с k-means) строится в пуле потоков
+        loaded = await _load_user_embeddings(db, current_user.id, classifier.model_version)
+        index = await run_in_threadpool(registry.get, current_user.id, lambda: loaded, version)
+    matches = index.search(embedding, k=1)
+
+    meal = None
+    similarity = None
+    if matches:
+        meal_id, similarity = matches[0]
+        if similarity >= settings.MEAL_MATCH_MIN_SIMILARITY:
+            meal = await db.scalar(select(MealRecord).where(
+                MealRecord.id == meal_id,
+                MealRecord.user_id == current_user.id
+            ))
+
+    return MealMatch(
+        predicted_class=predicted_class,
+        confidence=round(confidence, 3),
+        similarity=None if similarity is None else round(similarity, 3),
+        meal=meal
+    )
+
+
+@router.post("/{meal_id}/image", response_model=MealImage)
+async def upload_meal_image(
+    meal_id: int,
+    file: UploadFile = File(...),
+    current_user: CurrentUser = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Загружает фото блюда в хранилище и привязывает его к записи.
+    Одинаковые фото хранятся один раз; миниатюра создаётся в фоне.
+    """
+    meal = await get_meal_record(meal_id, current_user, db)
+    image = await read_image_upload(file)
+    stored = await get_image_store().save(image)
+
+    meal.image_path = stored.url
+    await db.commit()
+    return MealImage(
+        image_url=stored.url,
+        thumbnail_url=stored.thumbnail_url,
+        deduplicated=not stored.created
+    )
+
+
+async def _classify_decoded(classifier, image) -> Tuple[list, np.ndarray]:
+    """Классифицирует декодированное изображение: (top-1, нормализованный эмбеддинг)"""
+    result = (await run_inference(classifier.embed_batch, [image], 1))[0]
+    if result is None:
+        # Декодированное изображение не прошло предобработку
+        raise HTTPException(status_code=400, detail="Could not decode image")
+
+    ranked, embedding = result
+    return ranked, normalize(embedding)
+
+
+@router.post("/snap", response_model=MealSnap)
+async def snap_meal(
+    file: UploadFile = File(...),
+    calories: Optional[float] = Form(None, gt=0, description="Calories in kcal"),
+    proteins: Optional[float] = Form(None, ge=0, description="Proteins in grams"),
+    fats: Optional[float] = Form(None, ge=0, description="Fats in grams"),
+    carbs: Optional[float] = Form(None, ge=0, description="Carbohydrates in grams"),
+    portion_g: Optional[float] = Form(None, gt=0, description="Portion weight for nutrition lookup"),
+    meal_type: MealType = Form(MealType.OTHER, description="Type of meal"),
+    datetime: Optional[dt] = Form(None, description="Meal time, defaults to now"),
+    current_user: CurrentUser = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Фото блюда одним запросом: сохранение, классификация и создание записи.
+
+    Изображение декодируется один раз; сохранение оригинала и классификация
+    выполняются параллельно, миниатюра строится в фоне из того же bitmap.
+    Не переданные КБЖУ берутся из таблицы по распознанному блюду и весу порции.
+    """
+    image = await read_image_upload(file)
+    classifier = get_classifier_safe()
+    store = get_image_store()
+
+    # Декодируем с запасом под миниатюру; дальше файл читает только хранилище,
+    # а декодированное изображение — классификатор и генератор миниатюр
+    try:
+        decoded = await run_in_threadpool(classifier.preprocessor.decode, image, store.thumbnail_size)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Could not decode image")
+
+    macros = {"calories": calories, "proteins": proteins, "fats": fats, "carbs": carbs}
+    needs_lookup = any(value is None for value in macros.values())
+
+    # Вес порции не передан — оцениваем его по фото параллельно с классификацией
+    tasks = [store.save(image, decoded), _classify_decoded(classifier, decoded)]
+    if needs_lookup and portion_g is None:
+        estimator = get_portion_estimator()
+        tasks.append(run_inference(estimator.estimate, decoded))
+    stored, (ranked, embedding), *portion = await asyncio.gather(*tasks)
+    predicted_class, confidence = ranked[0]
+    threshold_met = confidence >= classifier.confidence_threshold
+
+    if needs_lookup:
+        nutrition_db = get_nutrition_db()
+        if portion and portion[0].regions and threshold_met:
+            typical = nutrition_db.lookup(predicted_class)
+            if typical is not None:
+                portion_g = round(estimator.reweigh(portion[0], typical.grams).grams, 1)
+        nutrients = nutrition_db.lookup(predicted_class, portion_g) if threshold_met else None
+        if nutrients is None:
+            raise HTTPException(
+                status_code=422,
+                detail="Meal was not recognized: calories, proteins, fats and carbs are required"
+            )
+        portion_g = nutrients.grams
+        macros = {
+            name: round(getattr(nutrients, name), 1) if value is None else value
+            for name, value in macros.items()
+        }
+
+    meal = MealRecord(
+        user_id=current_user.id,
+        datetime=to_naive_utc(datetime) or dt.utcnow(),
+        **macros,
+        meal_type=meal_type,
+        image_path=stored.url,
+    )
+    # Эмбеддинг посчитан тем же forward-проходом — сразу доступен для /meals/match
+    meal.embedding = MealEmbedding(
+        user_id=current_user.id,
+        model_version=classifier.model_version,
+        vector=to_bytes(embedding),
+    )
+    db.add(meal)
+    await db.commit()
+    get_index_registry().add(current_user.id, meal.id, embedding)
+
+    return MealSnap(
+        meal=meal,
+        predicted_class=predicted_class if threshold_met else "unknown",
+        confidence=round(confidence, 3),
+        threshold_met=threshold_met,
+        deduplicated=not stored.created,
+        portion_g=portion_g if needs_lookup else None
+    )
+
@@ -1,10 +1,12 @@
 from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.db.session import get_db
 from app.db.models import User, UserProfile, UserPlan
-from app.schemas.profiles import UserProfileCreate
-from app.utils.dependencies import get_current_user
+from app.schemas.plans import UserPlan as UserPlanSchema
+from app.schemas.profiles import UserProfileCreate, UserProfile as UserProfileSchema
+from app.utils.dependencies import get_current_user, get_user_context
+from app.utils.user_cache import CurrentUser
 from app.utils.plan_calculator import build_nutrition_plan
 
 router = APIRouter(
@@ -14,7 +16,7 @@ router = APIRouter(
 
 
 @router.get("/status")
-def get_onboarding_plan_status(current_user: User = Depends(get_current_user)):
+async def get_onboarding_plan_status(current_user: CurrentUser = Depends(get_current_user)):
     """
     Проверяет, завершил ли пользователь онбординг план.
     """
@@ -22,25 +24,25 @@ def get_onboarding_plan_status(current_user: User = Depends(get_current_user)):
 
 
 @router.post("/complete")
-def complete_onboarding_plan(
+async def complete_onboarding_plan(
     profile_data: UserProfileCreate,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    user: User = Depends(get_user_context),
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Завершает онбординг план пользователя, создавая его профиль
     и устанавливая флаг onboarding_plan_completed.
     Также автоматически создает план питания.
     """
-    # Проверяем, не создан ли уже профиль
-    if current_user.profile is not None:
+    # Проверяем, не создан ли уже профиль (profile загружен вместе с пользователем)
+    if user.profile is not None:
         raise HTTPException(
             status_code=400,
             detail="User profile already exists"
         )
 
     # Создаем профиль пользователя
-    profile = UserProfile(**profile_data.model_dump(), user_id=current_user.id)
+    profile = UserProfile(**profile_data.model_dump(), user_id=user.id)
     db.add(profile)
     
     # Создаем план питания
@@ -55,26 +57,19 @@ def complete_onboarding_plan(
         goal_type=profile.goal_type
     )
     
-    plan = UserPlan(user_id=current_user.id, **plan_data)
+    plan = UserPlan(user_id=user.id, **plan_data)
     db.add(plan)
     
-    # Получаем свежий объект пользователя из текущей сессии
-    user = db.query(User).filter(User.id == current_user.id).first()
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
-    
     # Отмечаем онбординг как завершенный
     user.onboarding_plan_completed = True
-    
-    db.commit()
-    db.refresh(profile)
-    db.refresh(plan)
-    db.refresh(user)
-    
+
+    # id профиля и плана присваиваются при commit; объекты после него не
+    # сбрасываются (expire_on_commit=False), ответ собирается без запросов
+    await db.commit()
     return {
         "status": "success",
         "message": "Onboarding plan completed successfully",
-        "profile": profile,
-        "nutrition_plan": plan,
+        "profile": UserProfileSchema.model_validate(profile),
+        "nutrition_plan": UserPlanSchema.model_validate(plan),
         "onboarding_completed": user.onboarding_plan_completed
-    } 
\ No newline at end of file
+    }
@@ -1,36 +1,48 @@
 from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import Optional
 
 from app.db.session import get_db
-from app.db.models import User, UserProfile, UserPlan
+from app.db.models import User, UserPlan
 from app.schemas.plans import UserPlan as UserPlanSchema
 from app.utils.plan_calculator import build_nutrition_plan
-from app.utils.dependencies import get_current_user
+from app.utils.dependencies import get_current_user, get_user_context
+from app.utils.user_cache import CurrentUser
 
 router = APIRouter()
 
 
+async def _load_plan(db: AsyncSession, user_id: int) -> Optional[UserPlan]:
+    """
+    План пользователя по user_id. plan_id из снимка не используется: снимок
+    в другом процессе API может ещё не знать о только что созданном плане
+    """
+    return (await db.execute(
+        select(UserPlan).where(UserPlan.user_id == user_id)
+    )).scalar_one_or_none()
+
+
 @router.get("/plans/me", response_model=UserPlanSchema)
-def get_my_plan(
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+async def get_my_plan(
+    current_user: CurrentUser = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
 ):
     """Получить текущий план питания пользователя"""
-    plan = db.query(UserPlan).filter(UserPlan.user_id == current_user.id).first()
+    plan = await _load_plan(db, current_user.id)
     if not plan:
         raise HTTPException(status_code=404, detail="План питания не найден")
     return plan
 
 
 @router.post("/plans/calculate", response_model=UserPlanSchema)
-def calculate_and_save_plan(
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+async def calculate_and_save_plan(
+    user: User = Depends(get_user_context),
+    db: AsyncSession = Depends(get_db)
 ):
     """Рассчитать и сохранить план питания на основе профиля пользователя"""
-    # Получаем профиль пользователя
-    profile = db.query(UserProfile).filter(UserProfile.user_id == current_user.id).first()
+    # Профиль и план загружены вместе с пользователем одним запросом
+    profile = user.profile
     if not profile:
         raise HTTPException(status_code=404, detail="Профиль пользователя не найден")
 
@@ -43,39 +55,35 @@ def calculate_and_save_plan(
         height=profile.height,
         age=profile.age,
         gender=profile.gender,
-        activity_multiplier=profile.activity_level / 10,  # Преобразуем 1-7 в 0.1-0.7
+        activity_multiplier=profile.activity_level,  # уровень 1-7, множитель подбирает калькулятор
         delta_kg=delta_kg,
         goal_type=profile.goal_type
     )
 
-    # Проверяем, существует ли уже план
-    existing_plan = db.query(UserPlan).filter(UserPlan.user_id == current_user.id).first()
-    
-    if existing_plan:
+    if user.plan:
         # Обновляем существующий план
+        plan = user.plan
         for key, value in plan_data.items():
-            setattr(existing_plan, key, value)
-        plan = existing_plan
+            setattr(plan, key, value)
     else:
         # Создаем новый план
-        plan = UserPlan(user_id=current_user.id, **plan_data)
+        plan = UserPlan(user_id=user.id, **plan_data)
         db.add(plan)
 
-    db.commit()
-    db.refresh(plan)
+    await db.commit()
     return plan
 
 
 @router.delete("/plans/me", status_code=204)
-def delete_my_plan(
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+async def delete_my_plan(
+    current_user: CurrentUser = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
 ):
     """Удалить текущий план питания"""
-    plan = db.query(UserPlan).filter(UserPlan.user_id == current_user.id).first()
+    plan = await _load_plan(db, current_user.id)
     if not plan:
         raise HTTPException(status_code=404, detail="План питания не найден")
     
-    db.delete(plan)
-    db.commit()
+    await db.delete(plan)
+    await db.commit()
     return None 
\ No newline at end of file
@@ -1,11 +1,13 @@
 from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.db.session import get_db
 from app.db.models import User, UserProfile, UserPlan
 from app.schemas.profiles import UserProfile as UserProfileSchema
 from app.schemas.profiles import UserProfileUpdate
-from app.utils.dependencies import get_current_user
+from app.utils.dependencies import get_current_user, get_user_context
+from app.utils.user_cache import CurrentUser
 from app.utils.plan_calculator import build_nutrition_plan
 
 router = APIRouter(
@@ -15,31 +17,33 @@ router = APIRouter(
 
 
 @router.get("/me", response_model=UserProfileSchema)
-def get_my_profile(
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+async def get_my_profile(
+    current_user: CurrentUser = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
 ):
     """Получить профиль текущего пользователя"""
-    if not current_user.profile:
+    # Профиль ищется по user_id, а не по profile_id из снимка: снимок в другом
+    # процессе API может ещё не знать о только что созданном профиле
+    profile = (await db.execute(
+        select(UserProfile).where(UserProfile.user_id == current_user.id)
+    )).scalar_one_or_none()
+    if not profile:
         raise HTTPException(status_code=404, detail="Profile not found")
-    return current_user.profile
+    return profile
 
 
 @router.put("/me", response_model=UserProfileSchema)
-def update_my_profile(
+async def update_my_profile(
     profile_data: UserProfileUpdate,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    user: User = Depends(get_user_context),
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Обновить профиль текущего пользователя.
     Автоматически пересчитывает и обновляет план питания.
     """
-    if not current_user.profile:
-        raise HTTPException(status_code=404, detail="Profile not found")
-
-    # Получаем профиль из базы данных для обновления
-    profile = db.query(UserProfile).filter(UserProfile.id == current_user.profile.id).first()
+    # Профиль и план загружены вместе с пользователем одним запросом
+    profile = user.profile
     if not profile:
         raise HTTPException(status_code=404, detail="Profile not found")
 
@@ -60,14 +64,11 @@ def update_my_profile(
     )
 
     # Обновляем или создаем план
-    if current_user.plan:
-        plan = db.query(UserPlan).filter(UserPlan.id == current_user.plan.id).first()
-        if plan:
-            for key, value in plan_data.items():
-                setattr(plan, key, value)
+    if user.plan:
+        for key, value in plan_data.items():
+            setattr(user.plan, key, value)
     else:
-        plan = UserPlan(user_id=current_user.id, **plan_data)
-        db.add(plan)
+        db.add(UserPlan(user_id=user.id, **plan_data))
 
-    db.commit()
-    return profile 
\ No newline at end of file
+    await db.commit()
+    return profile
@@ -1,9 +1,8 @@
 from fastapi import APIRouter, Depends
-from sqlalchemy.orm import Session
 
 from app.schemas.auth import UserRead
-from app.db.models import User
 from app.utils.dependencies import get_current_user
+from app.utils.user_cache import CurrentUser
 
 router = APIRouter(
     prefix="/users",
@@ -12,7 +11,7 @@ router = APIRouter(
 
 
 @router.get("/me", response_model=UserRead)
-def read_current_user(current_user: User = Depends(get_current_user)):
+async def read_current_user(current_user: CurrentUser = Depends(get_current_user)):
     """
     Возвращает данные текущего пользователя,
     извлечённого из JWT-токена.
@@ -1,7 +1,21 @@
-from datetime import datetime, date
-from pydantic import BaseModel, Field
-from typing import List, Optional
+from datetime import datetime, date, timezone
+from pydantic import BaseModel, Field, computed_field, field_validator
+from typing import Dict, List, Optional
 from app.db.models import MealType
+from app.utils.storage import thumbnail_url
+
+
+def to_naive_utc(value: Optional[datetime]) -> Optional[datetime]:
+    """
+    Время с часовым поясом — в naive UTC.
+
+    Колонки DateTime хранятся без пояса: asyncpg отклоняет aware-значения
+    для timestamp without time zone, а день сводки берётся из времени
+    записи и должен считаться в UTC.
+    """
+    if value is None or value.tzinfo is None:
+        return value
+    return value.astimezone(timezone.utc).replace(tzinfo=None)
 
 
 class MealRecordBase(BaseModel):
@@ -13,6 +27,11 @@ class MealRecordBase(BaseModel):
     meal_type: MealType = Field(default=MealType.OTHER, description="Type of meal")
     image_path: Optional[str] = None
 
+    @field_validator("datetime")
+    @classmethod
+    def _naive_utc(cls, value):
+        return to_naive_utc(value)
+
 
 class MealRecordCreate(MealRecordBase):
     pass
@@ -22,6 +41,12 @@ class MealRecord(MealRecordBase):
     id: int
     user_id: int
 
+    @computed_field
+    @property
+    def thumbnail_url(self) -> Optional[str]:
+        """Миниатюра WebP для фото из хранилища (для лент и списков)"""
+        return thumbnail_url(self.image_path)
+
     class Config:
         from_attributes = True
 
@@ -29,7 +54,48 @@ class MealRecord(MealRecordBase):
 class DayMealsSummary(BaseModel):
     date: date
     total_calories: float
+    total_proteins: float = 0
+    total_fats: float = 0
+    total_carbs: float = 0
+    meals_count: int = 0
     meals: List[MealRecord]
 
     class Config:
-        from_attributes = True 
\ No newline at end of file
+        from_attributes = True
+
+
+class DailyNutrition(BaseModel):
+    """Суммы КБЖУ за день из daily_nutrition_summary"""
+    date: date
+    calories: float = 0
+    proteins: float = 0
+    fats: float = 0
+    carbs: float = 0
+    meals_count: int = 0
+    meal_type_counts: Dict[MealType, int] = {}
+
+
+class MealMatch(BaseModel):
+    """Результат поиска похожего блюда по фото"""
+    predicted_class: str
+    confidence: float
+    similarity: Optional[float] = None
+    meal: Optional[MealRecord] = None
+
+
+class MealImage(BaseModel):
+    """Результат загрузки фото блюда"""
+    image_url: str
+    thumbnail_url: str
+    deduplicated: bool
+
+
+class MealSnap(BaseModel):
+    """Результат /meals/snap: созданная запись и распознанное блюдо"""
+    meal: MealRecord
+    predicted_class: str
+    confidence: float
+    threshold_met: bool
+    deduplicated: bool
+    portion_g: Optional[float] = None  # вес, по которому КБЖУ взяты из таблицы
+
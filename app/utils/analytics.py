@@ -0,0 +1,230 @@
+# app/utils/analytics.py
+"""
+Аналитика прогресса: потребление по дням против целей UserPlan.
+
+Источник — daily_nutrition_summary: не больше одной строки на день, поэтому
+временной ряд пользователя компактен. Ряд разворачивается в плотный
+массив дней, и всё остальное (скользящие средние, соблюдение плана,
+серии) считается векторно по NumPy через накопленные суммы.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from datetime import date, timedelta
+from typing import Dict, Hashable, Iterable, Optional, Sequence
+
+import numpy as np
+
+MACROS = ("calories", "proteins", "fats", "carbs")
+ROLLING_WINDOWS = (7, 30)
+
+
+def _rolling_means(values: np.ndarray, logged: np.ndarray, window: int) -> np.ndarray:
+    """
+    Скользящее среднее за window дней по дням с записями (дни без записей —
+    отсутствие данных, а не нулевое потребление); NaN — в окне нет записей
+    """
+    sums = np.concatenate([np.zeros((1, values.shape[1])), np.cumsum(values, axis=0)])
+    counts = np.concatenate([[0], np.cumsum(logged)])
+    end = np.arange(1, len(values) + 1)
+    begin = np.maximum(end - window, 0)
+    window_counts = (counts[end] - counts[begin])[:, None]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(window_counts > 0, (sums[end] - sums[begin]) / window_counts, np.nan)
+
+
+def _runs(flags: np.ndarray) -> np.ndarray:
+    """Длина серии True, заканчивающейся в каждом дне"""
+    index = np.arange(len(flags))
+    last_break = np.maximum.accumulate(np.where(flags, -1, index))
+    return index - last_break
+
+
+def _rounded(values: np.ndarray, digits: int = 1) -> list:
+    """Массив -> список для JSON; NaN -> None"""
+    return [None if np.isnan(value) else round(float(value), digits) for value in values]
+
+
+def progress_report(
+    days: Sequence[date],
+    values: np.ndarray,
+    targets: Sequence[float],
+    date_from: date,
+    date_to: date,
+    tolerance: float = 0.1,
+) -> dict:
+    """
+    Отчёт о прогрессе за период
+
+    Args:
+        days: Дни с записями (в любом порядке), включая до 29 дней до date_from
+            для скользящих средних
+        values: Суммы КБЖУ по этим дням, (len(days), 4)
+        targets: Цели плана на день: calories, proteins, fats, carbs
+        date_from: Первый день отчёта
+        date_to: Последний день отчёта
+        tolerance: Допустимое отклонение калорий от цели (доля) для дня «в плане»
+
+    Returns:
+        JSON-совместимый словарь: дни, скользящие средние, серии и итоги
+    """
+    history = max(ROLLING_WINDOWS) - 1
+    origin = date_from - timedelta(days=history)
+    length = (date_to - origin).days + 1
+
+    series = np.zeros((length, len(MACROS)), dtype=np.float64)
+    logged = np.zeros(length, dtype=bool)
+    if len(days):
+        offsets = np.fromiter(((day - origin).days for day in days), dtype=np.int64, count=len(days))
+        inside = (offsets >= 0) & (offsets < length)
+        series[offsets[inside]] = np.asarray(values, dtype=np.float64).reshape(-1, len(MACROS))[inside]
+        logged[offsets[inside]] = True
+
+    rolling = {window: _rolling_means(series, logged, window)[history:] for window in ROLLING_WINDOWS}
+    series, logged = series[history:], logged[history:]
+
+    targets = np.asarray(targets, dtype=np.float64)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        ratios = np.where(logged[:, None] & (targets > 0), series / targets, np.nan)
+    on_target = logged & (np.abs(ratios[:, 0] - 1.0) <= tolerance)
+
+    adherent_runs = _runs(on_target)
+    logged_runs = _runs(logged)
+    days_logged = int(logged.sum())
+
+    dates = [date_from + timedelta(days=offset) for offset in range(len(logged))]
+    report_days = [
+        {
+            "date": day.isoformat(),
+            "logged": bool(is_logged),
+            "on_target": bool(is_on_target),
+            **dict(zip(MACROS, _rounded(intake))),
+            "adherence": dict(zip(MACROS, _rounded(ratio, 3))),
+            **{
+                f"avg_{window}d": dict(zip(MACROS, _rounded(rolling[window][row])))
+                for window in ROLLING_WINDOWS
+            },
+        }
+        for row, (day, is_logged, is_on_target, intake, ratio)
+        in enumerate(zip(dates, logged, on_target, series, ratios))
+    ]
+
+    mean_intake = series[logged].mean(axis=0) if days_logged else np.full(len(MACROS), np.nan)
+    return {
+        "date_from": date_from.isoformat(),
+        "date_to": date_to.isoformat(),
+        "tolerance": tolerance,
+        "targets": dict(zip(MACROS, _rounded(targets))),
+        "summary": {
+            "days": len(logged),
+            "days_logged": days_logged,
+            "days_on_target": int(on_target.sum()),
+            "adherence_rate": round(float(on_target.sum()) / days_logged, 3) if days_logged else None,
+            "average": dict(zip(MACROS, _rounded(mean_intake))),
+        },
+        "streaks": {
+            "current_on_target": int(adherent_runs[-1]),
+            "longest_on_target": int(adherent_runs.max()),
+            "current_logged": int(logged_runs[-1]),
+            "longest_logged": int(logged_runs.max()),
+        },
+        "days": report_days,
+    }
+
+
+class AnalyticsCache:
+    """
+    Кэш отчётов (готовый JSON) по пользователям: LRU по пользователям,
+    LRU отчётов внутри пользователя (не больше max_reports) и TTL записей.
+
+    Отчёты пользователя сбрасываются целиком после commit, изменившего его
+    сводки (invalidate подписан на app.db.summaries). TTL ограничивает
+    устаревание в других процессах API, которые этого commit не видят.
+    Поколение пользователя не даёт сохранить отчёт, посчитанный по данным
+    до сброса. Поколения хранятся только для max_users последних сброшенных
+    пользователей: у вытесненных поколение не меньше _generation_floor,
+    поэтому отчёт, начатый до вытеснения, всё равно не будет сохранён.
+    """
+
+    def __init__(self, max_users: int = 1024, ttl_seconds: float = 300.0, max_reports: int = 8):
+        self.max_users = max_users
+        self.ttl = ttl_seconds
+        self.max_reports = max(1, max_reports)
+        self._users: "OrderedDict[int, OrderedDict[Hashable, tuple]]" = OrderedDict()
+        self._generations: "OrderedDict[int, int]" = OrderedDict()
+        self._generation_counter = 0
+        self._generation_floor = 0
+        self._lock = threading.Lock()
+
+    def generation(self, user_id: int) -> int:
+        """Берётся до чтения данных и передаётся в put"""
+        with self._lock:
+            return self._generations.get(user_id, self._generation_floor)
+
+    def get(self, user_id: int, key: Hashable) -> Optional[bytes]:
+        with self._lock:
+            entries = self._users.get(user_id)
+            if entries is None:
+                return None
+            entry = entries.get(key)
+            if entry is None:
+                return None
+            expires, report = entry
+            if time.monotonic() >= expires:
+                del entries[key]
+                return None
+            entries.move_to_end(key)
+            self._users.move_to_end(user_id)
+            return report
+
+    def put(self, user_id: int, key: Hashable, report: bytes, generation: int):
+        with self._lock:
+            if self._generations.get(user_id, self._generation_floor) != generation:
+                return  # данные изменились, пока считался отчёт
+            now = time.monotonic()
+            entries = self._users.setdefault(user_id, OrderedDict())
+            for stale in [name for name, (expires, _) in entries.items() if expires <= now]:
+                del entries[stale]
+            entries[key] = (now + self.ttl, report)
+            entries.move_to_end(key)
+            while len(entries) > self.max_reports:
+                entries.popitem(last=False)
+            self._users.move_to_end(user_id)
+            while len(self._users) > self.max_users:
+                self._users.popitem(last=False)
+
+    def invalidate(self, user_ids: Iterable[int]):
+        with self._lock:
+            for user_id in user_ids:
+                self._users.pop(user_id, None)
+                # Общий счётчик: поколение пользователя всегда больше floor
+                self._generation_counter += 1
+                self._generations[user_id] = self._generation_counter
+                self._generations.move_to_end(user_id)
+            while len(self._generations) > self.max_users:
+                _, evicted = self._generations.popitem(last=False)
+                self._generation_floor = max(self._generation_floor, evicted)
+
+    def clear(self):
+        with self._lock:
+            self._users.clear()
+
+
+_cache: Optional[AnalyticsCache] = None
+
+
+def get_analytics_cache() -> AnalyticsCache:
+    """Возвращает кэш отчётов (singleton), подписанный на изменения сводок"""
+    global _cache
+    if _cache is None:
+        from app.core.config import settings
+        from app.db.summaries import add_change_listener
+
+        _cache = AnalyticsCache(
+            max_users=settings.ANALYTICS_CACHE_MAX_USERS,
+            ttl_seconds=settings.ANALYTICS_CACHE_TTL_SECONDS,
+            max_reports=settings.ANALYTICS_CACHE_MAX_REPORTS_PER_USER,
+        )
+        add_change_listener(_cache.invalidate)
+    return _cache
@@ -1,42 +1,67 @@
 # app/utils/dependencies.py
 
-from typing import Generator
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
+import jwt
 
-from app.db.session import SessionLocal
-from app.db.models import User
+# Та же зависимость, что и в роутерах: FastAPI создаёт одну сессию на запрос
+from app.db.session import get_db
 from app.core.security import decode_access_token
+from app.db.models import User
+from app.utils.user_cache import CurrentUser, get_user_cache, load_current_user, load_user_context
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/login")
 
 
-def get_db() -> Generator[Session, None, None]:
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
-
-def get_current_user(
+async def get_current_user(
         token: str = Depends(oauth2_scheme),
-        db: Session = Depends(get_db)
-) -> User:
+        db: AsyncSession = Depends(get_db)
+) -> CurrentUser:
     """
     Проверяет JWT из заголовка Authorization Bearer,
-    достаёт user_id и возвращает объект User из БД.
+    достаёт user_id и возвращает снимок пользователя.
+
+    Снимок берётся из кэша процесса; к базе (один запрос, соединение
+    открывается только при промахе) — если снимка нет или он устарел.
+    Подпись токена проверяется один раз за время его жизни, поэтому
+    обычный запрос с тем же токеном обходится без криптографии и SQL.
     """
     try:
         user_id = decode_access_token(token)
+    except jwt.ExpiredSignatureError:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Token has expired",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
     except Exception:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Could not validate credentials",
             headers={"WWW-Authenticate": "Bearer"},
         )
-    user = db.query(User).get(user_id)
+
+    cache = get_user_cache()
+    user = cache.get(user_id)
+    if user is None:
+        generation = cache.generation(user_id)
+        user = await db.run_sync(load_current_user, user_id)
+        if not user:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
+        cache.put(user, generation)
+    return user
+
+
+async def get_user_context(
+        current_user: CurrentUser = Depends(get_current_user),
+        db: AsyncSession = Depends(get_db)
+) -> User:
+    """
+    ORM-объект пользователя с загруженными profile и plan (один запрос) —
+    для endpoints, которые их изменяют
+    """
+    user = await db.run_sync(load_user_context, current_user.id)
     if not user:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
     return user
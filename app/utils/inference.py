@@ -0,0 +1,41 @@
+# app/utils/inference.py
+import logging
+
+from fastapi import HTTPException
+
+logger = logging.getLogger(__name__)
+
+
+def get_classifier_safe():
+    """Безопасное получение классификатора с обработкой ошибок"""
+    try:
+        from app.models.classifier import get_classifier
+        return get_classifier()
+    except ImportError as e:
+        logger.error(f"Ошибка импорта зависимостей: {e}")
+        raise HTTPException(
+            status_code=500,
+            detail="Зависимости для машинного обучения не установлены. Установите: pip install torch torchvision timm pillow"
+        )
+    except Exception as e:
+        logger.error(f"Ошибка при получении классификатора: {e}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"Ошибка инициализации модели: {str(e)}"
+        )
+
+
+async def run_inference(fn, *args):
+    """Выполняет инференс в выделенном пуле; при переполнении очереди — 503"""
+    from app.models.executor import get_inference_executor, InferenceQueueFull
+
+    try:
+        return await get_inference_executor().run(fn, *args)
+    except InferenceQueueFull as e:
+        logger.warning("Очередь инференса переполнена, запрос отклонён")
+        raise HTTPException(
+            status_code=503,
+            detail="Сервис классификации перегружен, повторите запрос позже",
+            headers={"Retry-After": str(e.retry_after)},
+        )
+
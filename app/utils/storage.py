@@ -0,0 +1,196 @@
+# app/utils/storage.py
+"""
+Контентно-адресуемое хранилище фотографий блюд.
+
+Файл хранится под хешем содержимого: meal_images/ab/cd/<sha256>.<ext>,
+поэтому одинаковые фотографии сохраняются один раз, а URL никогда не
+меняет содержимое. Миниатюры WebP лежат рядом в meal_images/thumbs/ и
+создаются фоновым пулом после загрузки.
+"""
+
+import hashlib
+import logging
+import os
+import shutil
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import BinaryIO, NamedTuple, Optional
+
+from fastapi.concurrency import run_in_threadpool
+
+from app.utils.uploads import BMP, GIF, HEIC, JPEG, PNG, SNIFF_BYTES, WEBP, sniff_image_type
+
+logger = logging.getLogger(__name__)
+
+MEAL_IMAGES_DIR = Path("app/static/meal_images")
+MEAL_IMAGES_URL = "/static/meal_images"
+THUMBNAILS_SUBDIR = "thumbs"
+
+_EXTENSIONS = {JPEG: "jpg", PNG: "png", GIF: "gif", WEBP: "webp", BMP: "bmp", HEIC: "heic"}
+_CHUNK_SIZE = 1024 * 1024
+
+
+class StoredImage(NamedTuple):
+    digest: str
+    url: str
+    thumbnail_url: str
+    created: bool  # False — такое изображение уже было сохранено
+
+
+def _relative_path(digest: str, extension: str) -> str:
+    return f"{digest[:2]}/{digest[2:4]}/{digest}.{extension}"
+
+
+def _write_atomic(path: Path, write):
+    """
+    Пишет во временный файл рядом и атомарно переименовывает: параллельные
+    читатели и загрузки того же изображения не увидят недописанный файл
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent, suffix=".part")
+    try:
+        with os.fdopen(fd, "wb") as out:
+            write(out)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+
+
+def thumbnail_url(image_url: Optional[str]) -> Optional[str]:
+    """URL миниатюры для URL изображения из хранилища; None для внешних путей"""
+    if not image_url or not image_url.startswith(MEAL_IMAGES_URL + "/"):
+        return None
+    relative = image_url[len(MEAL_IMAGES_URL) + 1:]
+    if relative.startswith(THUMBNAILS_SUBDIR + "/"):
+        return image_url
+    stem = relative.rsplit(".", 1)[0]
+    return f"{MEAL_IMAGES_URL}/{THUMBNAILS_SUBDIR}/{stem}.webp"
+
+
+class ImageStore:
+    """Хранилище изображений с дедупликацией по SHA-256 и фоновыми миниатюрами"""
+
+    def __init__(self, root: Path = MEAL_IMAGES_DIR, base_url: str = MEAL_IMAGES_URL,
+                 thumbnail_size: int = 320, thumbnail_quality: int = 75, workers: int = 1):
+        self.root = Path(root)
+        self.base_url = base_url.rstrip("/")
+        self.thumbnail_size = thumbnail_size
+        self.thumbnail_quality = thumbnail_quality
+
+        self.root.mkdir(parents=True, exist_ok=True)
+        self._thumbnailer = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="thumbnails")
+        self._in_flight = set()
+        self._in_flight_lock = threading.Lock()
+
+    async def save(self, file: BinaryIO, decoded=None) -> StoredImage:
+        """
+        Сохраняет изображение; хеширование и запись выполняются в пуле потоков,
+        не блокируя event loop. Миниатюра ставится в фоновую очередь.
+
+        Args:
+            file: Файл изображения
+            decoded: Уже декодированное изображение (PIL) — миниатюра строится
+                из него, без повторного декодирования сохранённого файла
+        """
+        stored, path = await run_in_threadpool(self._save_sync, file)
+        self.schedule_thumbnail(stored.digest, decoded if decoded is not None else path)
+        return stored
+
+    def _save_sync(self, file: BinaryIO):
+        file.seek(0)
+        kind = sniff_image_type(file.read(SNIFF_BYTES))
+        if kind is None:
+            raise ValueError("Файл не является изображением")
+
+        hasher = hashlib.sha256()
+        file.seek(0)
+        for chunk in iter(lambda: file.read(_CHUNK_SIZE), b""):
+            hasher.update(chunk)
+        digest = hasher.hexdigest()
+
+        relative = _relative_path(digest, _EXTENSIONS[kind])
+        path = self.root / relative
+        created = not path.exists()
+        if created:
+            file.seek(0)
+            _write_atomic(path, lambda out: shutil.copyfileobj(file, out, _CHUNK_SIZE))
+
+        url = f"{self.base_url}/{relative}"
+        return StoredImage(digest, url, thumbnail_url(url), created), path
+
+    def thumbnail_path(self, digest: str) -> Path:
+        return self.root / THUMBNAILS_SUBDIR / _relative_path(digest, "webp")
+
+    def schedule_thumbnail(self, digest: str, source):
+        """Ставит создание миниатюры в фоновый пул (если её ещё нет)"""
+        if self.thumbnail_path(digest).exists():
+            return
+        with self._in_flight_lock:
+            if digest in self._in_flight:
+                return
+            self._in_flight.add(digest)
+        self._thumbnailer.submit(self._make_thumbnail, digest, source)
+
+    def _make_thumbnail(self, digest: str, source):
+        """source — путь к сохранённому файлу или уже декодированное изображение"""
+        from PIL import Image
+
+        target = self.thumbnail_path(digest)
+        try:
+            if isinstance(source, Image.Image):
+                self._write_thumbnail(source, target)
+            else:
+                with Image.open(source) as img:
+                    # draft: JPEG сразу декодируется в уменьшенном масштабе
+                    img.draft("RGB", (self.thumbnail_size * 2, self.thumbnail_size * 2))
+                    self._write_thumbnail(img, target)
+        except Exception as e:
+            logger.warning(f"Не удалось создать миниатюру {digest}: {e}")
+        finally:
+            with self._in_flight_lock:
+                self._in_flight.discard(digest)
+
+    def _write_thumbnail(self, img, target: Path):
+        from PIL import Image, ImageOps
+
+        # exif_transpose возвращает копию — исходное изображение не меняется
+        img = ImageOps.exif_transpose(img)
+        if img.mode not in ("RGB", "RGBA"):
+            img = img.convert("RGB")
+        img.thumbnail((self.thumbnail_size, self.thumbnail_size), Image.LANCZOS)
+        _write_atomic(target, lambda out: img.save(
+            out, format="WEBP", quality=self.thumbnail_quality, method=4
+        ))
+
+    def shutdown(self):
+        """Дожидается записи поставленных в очередь миниатюр"""
+        self._thumbnailer.shutdown(wait=True)
+
+
+_store: Optional[ImageStore] = None
+
+
+def get_image_store() -> ImageStore:
+    """Возвращает хранилище изображений блюд (singleton)"""
+    global _store
+    if _store is None:
+        from app.core.config import settings
+
+        _store = ImageStore(
+            thumbnail_size=settings.THUMBNAIL_SIZE,
+            thumbnail_quality=settings.THUMBNAIL_QUALITY,
+            workers=settings.THUMBNAIL_WORKERS,
+        )
+    return _store
+
+
+def shutdown_image_store():
+    """Останавливает пул миниатюр (при завершении приложения), если хранилище создавалось"""
+    global _store
+    if _store is not None:
+        _store.shutdown()
+        _store = None
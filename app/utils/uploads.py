@@ -0,0 +1,163 @@
+# app/utils/uploads.py
+import logging
+import os
+import time
+from typing import BinaryIO, Optional
+
+from fastapi import HTTPException, UploadFile
+
+from app.core.config import settings
+from app.core.metrics import INFERENCE_STAGE_SECONDS
+
+logger = logging.getLogger(__name__)
+
+# Сколько байт заголовка нужно для определения формата
+SNIFF_BYTES = 32
+
+JPEG = "jpeg"
+PNG = "png"
+GIF = "gif"
+WEBP = "webp"
+BMP = "bmp"
+HEIC = "heic"
+
+_HEIC_BRANDS = (b"heic", b"heix", b"hevc", b"hevx", b"heim", b"heis", b"mif1", b"msf1")
+
+_heif_registered: Optional[bool] = None
+
+
+def sniff_image_type(head: bytes) -> Optional[str]:
+    """Определяет формат изображения по сигнатуре; None — не изображение"""
+    if head.startswith(b"\xff\xd8\xff"):
+        return JPEG
+    if head.startswith(b"\x89PNG\r\n\x1a\n"):
+        return PNG
+    if head[:6] in (b"GIF87a", b"GIF89a"):
+        return GIF
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return WEBP
+    if head.startswith(b"BM"):
+        return BMP
+    if head[4:8] == b"ftyp" and head[8:12] in _HEIC_BRANDS:
+        return HEIC
+    return None
+
+
+def heif_supported() -> bool:
+    """HEIC декодируется, только если установлен pillow-heif"""
+    global _heif_registered
+    if _heif_registered is None:
+        try:
+            from pillow_heif import register_heif_opener
+            register_heif_opener()
+            _heif_registered = True
+        except ImportError:
+            _heif_registered = False
+    return _heif_registered
+
+
+def format_size(num_bytes: int) -> str:
+    """Размер для сообщений об ошибках: в МБ, меньше мегабайта — в КБ"""
+    if num_bytes >= 1024 * 1024:
+        return f"{round(num_bytes / (1024 * 1024), 1):g} МБ"
+    return f"{round(num_bytes / 1024, 1):g} КБ"
+
+
+def _upload_size(file: UploadFile) -> int:
+    if file.size is not None:
+        return file.size
+    position = file.file.tell()
+    file.file.seek(0, os.SEEK_END)
+    size = file.file.tell()
+    file.file.seek(position)
+    return size
+
+
+async def read_image_upload(file: UploadFile, max_bytes: Optional[int] = None) -> BinaryIO:
+    """
+    Проверяет загруженное изображение и возвращает его файл для декодирования
+
+    Starlette уже сохранил файл во временный spooled-буфер (в памяти до 1 МБ,
+    дальше на диске), поэтому содержимое не копируется в bytes: проверяются
+    размер и сигнатура формата, а декодер читает тот же файл.
+
+    Сигнатура проверяется после буферизации, а не в потоке: multipart
+    разбирает Starlette до вызова endpoint. До буферизации ограничен только
+    размер тела (UploadLimitMiddleware), поэтому не-изображение стоит не
+    больше одного загруженного файла в пределах лимита, но не декодируется.
+    Метрика стадии "validate" — время этой проверки, без приёма тела.
+
+    Raises:
+        HTTPException: 413 — файл больше лимита, 400 — не изображение,
+            415 — HEIC без установленного pillow-heif
+    """
+    started = time.perf_counter()
+    max_bytes = max_bytes or int(settings.UPLOAD_MAX_FILE_MB * 1024 * 1024)
+
+    size = _upload_size(file)
+    if size > max_bytes:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Файл {file.filename} больше {format_size(max_bytes)}"
+        )
+
+    await file.seek(0)
+    kind = sniff_image_type(await file.read(SNIFF_BYTES))
+    await file.seek(0)
+    if kind is None:
+        raise HTTPException(status_code=400, detail="Файл должен быть изображением")
+    if kind == HEIC and not heif_supported():
+        raise HTTPException(
+            status_code=415,
+            detail="Формат HEIC не поддерживается: загрузите JPEG или PNG"
+        )
+
+    INFERENCE_STAGE_SECONDS.observe(time.perf_counter() - started, stage="validate")
+    return file.file
+
+
+class UploadLimitMiddleware:
+    """
+    Ограничивает размер тела запроса до разбора multipart.
+
+    Запрос с Content-Length больше лимита отклоняется сразу, без чтения тела;
+    тело без Content-Length (chunked) обрывается, как только превысит лимит.
+    """
+
+    def __init__(self, app, max_bytes: int):
+        self.app = app
+        self.max_bytes = max_bytes
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        content_length = dict(scope["headers"]).get(b"content-length")
+        if content_length is not None and content_length.isdigit() and int(content_length) > self.max_bytes:
+            await self._reject(scope, receive, send)
+            return
+
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_bytes:
+                    # Пробрасывается через обработчик запроса и превращается в ответ 413
+                    raise HTTPException(status_code=413, detail=self._detail())
+            return message
+
+        await self.app(scope, limited_receive, send)
+
+    def _detail(self) -> str:
+        return f"Размер запроса превышает {format_size(self.max_bytes)}"
+
+    async def _reject(self, scope, receive, send):
+        from fastapi.responses import JSONResponse
+
+        logger.warning("Запрос отклонён: превышен лимит размера тела")
+        response = JSONResponse(status_code=413, content={"detail": self._detail()})
+        await response(scope, receive, send)
@@ -0,0 +1,169 @@
+# app/utils/user_cache.py
+"""
+Кэш аутентифицированных пользователей.
+
+get_current_user получает из кэша лёгкий снимок пользователя (без
+ORM-объекта и ленивых связей), поэтому endpoints вроде /users/me не
+обращаются к базе. Снимок сбрасывается после commit, изменившего
+User этого пользователя; короткий TTL ограничивает устаревание в других
+процессах API. Профиль и план в снимок не входят: наличие связанных строк
+endpoints проверяют запросом, иначе в другом процессе API только что
+созданный план до истечения TTL выглядел бы отсутствующим.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Iterable, NamedTuple, Optional
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session, joinedload
+
+from app.db.models import User
+
+_CHANGED_USERS = "user_cache_changed_users"
+
+
+class CurrentUser(NamedTuple):
+    """Снимок пользователя для зависимостей: только поля самого User, без связей"""
+    id: int
+    email: str
+    registered_at: Optional[datetime]
+    onboarding_plan_completed: bool
+
+
+def load_current_user(db: Session, user_id: int) -> Optional[CurrentUser]:
+    """Снимок пользователя одним запросом"""
+    row = db.query(
+        User.id, User.email, User.registered_at, User.onboarding_plan_completed,
+    ).filter(User.id == user_id).first()
+    return CurrentUser(*row) if row is not None else None
+
+
+def load_user_context(db: Session, user_id: int) -> Optional[User]:
+    """
+    Пользователь с профилем и планом одним запросом (joined eager load) —
+    для endpoints, которые изменяют профиль или план: связи уже загружены,
+    обращение к ним не делает отдельных запросов
+    """
+    return db.query(User).options(
+        joinedload(User.profile), joinedload(User.plan)
+    ).filter(User.id == user_id).first()
+
+
+class UserCache:
+    """
+    LRU-кэш снимков с TTL; поколение не даёт сохранить снимок, прочитанный до сброса.
+
+    Поколения хранятся только для max_entries последних сброшенных
+    пользователей: у вытесненных поколение не меньше _generation_floor,
+    поэтому снимок, прочитанный до вытеснения, всё равно не будет сохранён.
+    """
+
+    def __init__(self, max_entries: int = 10000, ttl_seconds: float = 30.0):
+        self.max_entries = max_entries
+        self.ttl = ttl_seconds
+        self._entries: "OrderedDict[int, tuple]" = OrderedDict()
+        self._generations: "OrderedDict[int, int]" = OrderedDict()
+        self._generation_counter = 0
+        self._generation_floor = 0
+        self._lock = threading.Lock()
+
+        self._hits = 0
+        self._misses = 0
+
+    def get(self, user_id: int) -> Optional[CurrentUser]:
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None and time.monotonic() < entry[0]:
+                self._entries.move_to_end(user_id)
+                self._hits += 1
+                return entry[1]
+            if entry is not None:
+                del self._entries[user_id]
+            self._misses += 1
+            return None
+
+    def generation(self, user_id: int) -> int:
+        with self._lock:
+            return self._generations.get(user_id, self._generation_floor)
+
+    def put(self, user: CurrentUser, generation: int):
+        with self._lock:
+            if self._generations.get(user.id, self._generation_floor) != generation:
+                return
+            self._entries[user.id] = (time.monotonic() + self.ttl, user)
+            self._entries.move_to_end(user.id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, user_ids: Iterable[int]):
+        with self._lock:
+            for user_id in user_ids:
+                self._entries.pop(user_id, None)
+                # Общий счётчик: поколение пользователя всегда больше floor
+                self._generation_counter += 1
+                self._generations[user_id] = self._generation_counter
+                self._generations.move_to_end(user_id)
+            while len(self._generations) > self.max_entries:
+                _, evicted = self._generations.popitem(last=False)
+                self._generation_floor = max(self._generation_floor, evicted)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "hits": self._hits,
+                "misses": self._misses,
+            }
+
+
+_cache: Optional[UserCache] = None
+
+
+def get_user_cache() -> UserCache:
+    """Возвращает кэш пользователей (singleton)"""
+    global _cache
+    if _cache is None:
+        from app.core.config import settings
+
+        _cache = UserCache(
+            max_entries=settings.AUTH_USER_CACHE_MAX_ENTRIES,
+            ttl_seconds=settings.AUTH_USER_CACHE_TTL_SECONDS,
+        )
+    return _cache
+
+
+def _owner(instance) -> Optional[int]:
+    if isinstance(instance, User):
+        return instance.id
+    return None
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_changed_users(session: Session, flush_context):
+    owners = {
+        _owner(instance)
+        for changed in (session.new, session.dirty, session.deleted)
+        for instance in changed
+    }
+    owners.discard(None)
+    if owners:
+        session.info.setdefault(_CHANGED_USERS, set()).update(owners)
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_changed_users(session: Session):
+    owners = session.info.pop(_CHANGED_USERS, None)
+    if owners and _cache is not None:
+        _cache.invalidate(owners)
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_changed_users(session: Session):
+    session.info.pop(_CHANGED_USERS, None)
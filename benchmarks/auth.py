@@ -0,0 +1,281 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк хеширования паролей и входа
+
+Измеряет:
+- задержку bcrypt hash/verify в процессе при разной стоимости (rounds);
+- пропускную способность проверки паролей через пул процессов
+  PasswordHasher при разном числе воркеров — в пересчёте на ядро;
+- вход целиком (POST /auth/login через in-process ASGI-клиент на временной
+  SQLite) при разной параллельности;
+- накладные расходы аутентификации на запрос: проверка JWT и get_current_user
+  без кэшей (подпись + SQL) и с кэшами проверенных токенов и снимков.
+
+Запуск:
+    python -m benchmarks.auth [--rounds 10,12] [--workers 1,2,4]
+                              [--concurrency 1,8,32] [--requests 64]
+                              [--iterations 2000] [--skip-login]
+                              [--json | --output FILE]
+"""
+
+import argparse
+import asyncio
+import datetime
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+from collections import Counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.inference import git_revision, parse_ints, summarize  # noqa: E402
+
+PASSWORD = "benchmark-password"
+EMAIL = "benchmark@example.com"
+
+
+def hash_latency(rounds_list, repeat: int):
+    """Задержка hash и verify в текущем процессе по стоимостям, мс"""
+    from passlib.context import CryptContext
+
+    results = []
+    for rounds in rounds_list:
+        context = CryptContext(schemes=["bcrypt"], bcrypt__default_rounds=rounds)
+        hashed = context.hash(PASSWORD)
+        hashes, verifies = [], []
+        for _ in range(repeat):
+            t0 = time.perf_counter()
+            context.hash(PASSWORD)
+            t1 = time.perf_counter()
+            context.verify(PASSWORD, hashed)
+            t2 = time.perf_counter()
+            hashes.append((t1 - t0) * 1000)
+            verifies.append((t2 - t1) * 1000)
+        results.append({"rounds": rounds, "hash_ms": summarize(hashes), "verify_ms": summarize(verifies)})
+        print(f"  rounds={rounds:<3} verify p50={results[-1]['verify_ms']['p50']:8.1f} мс", file=sys.stderr)
+    return results
+
+
+async def pool_throughput(workers_list, requests: int):
+    """Проверок пароля в секунду через пул процессов, всего и на ядро"""
+    from app.core.passwords import PasswordHasher
+    from app.core.security import hash_password
+
+    hashed = hash_password(PASSWORD)
+    cores = os.cpu_count() or 1
+    results = []
+    for workers in workers_list:
+        hasher = PasswordHasher(workers=workers, max_pending=requests)
+        try:
+            # Прогрев: запуск процессов и импорт passlib в них в замер не входят
+            await asyncio.gather(*(hasher.verify_and_update(PASSWORD, hashed) for _ in range(workers)))
+            started = time.perf_counter()
+            await asyncio.gather(*(hasher.verify_and_update(PASSWORD, hashed) for _ in range(requests)))
+            elapsed = time.perf_counter() - started
+        finally:
+            hasher.shutdown()
+
+        per_sec = requests / elapsed
+        results.append({
+            "workers": workers,
+            "requests": requests,
+            "duration_s": round(elapsed, 3),
+            "verifies_per_sec": round(per_sec, 2),
+            "verifies_per_sec_per_core": round(per_sec / min(workers, cores), 2),
+        })
+        print(f"  воркеров={workers:<3} {per_sec:8.2f} проверок/с  "
+              f"{results[-1]['verifies_per_sec_per_core']:8.2f} на ядро", file=sys.stderr)
+    return results
+
+
+async def login_throughput(concurrency_list, requests: int, workers: int):
+    """POST /auth/login целиком: входов в секунду по уровням параллельности"""
+    import httpx
+    import numpy as np
+    from app.main import app
+
+    levels = []
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://benchmark", timeout=None) as client:
+            await client.post("/auth/register", json={"email": EMAIL, "password": PASSWORD})
+            form = {"username": EMAIL, "password": PASSWORD}
+            await asyncio.gather(*(client.post("/auth/login", data=form) for _ in range(workers)))
+
+            for concurrency in concurrency_list:
+                latencies = []
+                statuses = Counter()
+                counter = iter(range(requests))
+
+                async def worker():
+                    for _ in counter:
+                        started = time.perf_counter()
+                        response = await client.post("/auth/login", data=form)
+                        statuses[str(response.status_code)] += 1
+                        latencies.append((time.perf_counter() - started) * 1000)
+
+                started = time.perf_counter()
+                await asyncio.gather(*(worker() for _ in range(concurrency)))
+                elapsed = time.perf_counter() - started
+
+                ok = statuses.get("200", 0)
+                levels.append({
+                    "concurrency": concurrency,
+                    "requests": requests,
+                    "duration_s": round(elapsed, 3),
+                    "logins_per_sec": round(ok / elapsed, 2),
+                    "logins_per_sec_per_core": round(ok / elapsed / min(workers, os.cpu_count() or 1), 2),
+                    "statuses": dict(statuses),
+                    "latency_ms": {**summarize(latencies), "p99": round(float(np.percentile(latencies, 99)), 3)},
+                })
+                print(f"  параллельно={concurrency:<4} {levels[-1]['logins_per_sec']:8.2f} входов/с  "
+                      f"p50={levels[-1]['latency_ms']['p50']:8.1f} мс  {levels[-1]['statuses']}", file=sys.stderr)
+    return levels
+
+
+def _microseconds(samples_s):
+    return summarize([sample * 1e6 for sample in samples_s])
+
+
+async def auth_overhead(iterations: int):
+    """
+    Стоимость аутентификации одного запроса, мкс: до (jwt.decode и запрос
+    снимка пользователя каждый раз) и после (кэши токенов и снимков прогреты)
+    """
+    import jwt
+
+    from app.core.config import settings
+    from app.core.security import create_access_token, decode_access_token, get_token_cache
+    from app.db.models import User
+    from app.db.session import AsyncSessionLocal, SessionLocal, async_engine
+    from app.utils.dependencies import get_current_user
+    from app.utils.user_cache import get_user_cache
+
+    import app.main  # noqa: F401 — создаёт таблицы
+
+    with SessionLocal() as db:
+        user = db.query(User).filter_by(email=EMAIL).first()
+        if user is None:
+            user = User(email=EMAIL, hashed_password="-")
+            db.add(user)
+            db.commit()
+        token = create_access_token(user.id)
+
+    token_cache, user_cache = get_token_cache(), get_user_cache()
+
+    def measure(fn, cold: bool):
+        samples = []
+        for _ in range(iterations):
+            if cold:
+                token_cache.clear()
+            started = time.perf_counter()
+            fn()
+            samples.append(time.perf_counter() - started)
+        return _microseconds(samples)
+
+    async def measure_dependency(cold: bool):
+        samples = []
+        async with AsyncSessionLocal() as db:
+            for _ in range(iterations):
+                if cold:
+                    token_cache.clear()
+                    user_cache.clear()
+                started = time.perf_counter()
+                await get_current_user(token, db)
+                samples.append(time.perf_counter() - started)
+                # Снимки из прошлых итераций не должны копиться в identity map
+                db.expunge_all()
+        return _microseconds(samples)
+
+    try:
+        results = {
+            "jwt_decode_us": measure(
+                lambda: jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM]), cold=False
+            ),
+            "decode_access_token_cold_us": measure(lambda: decode_access_token(token), cold=True),
+            "decode_access_token_cached_us": measure(lambda: decode_access_token(token), cold=False),
+            "get_current_user_cold_us": await measure_dependency(cold=True),
+            "get_current_user_cached_us": await measure_dependency(cold=False),
+        }
+    finally:
+        # Соединения aiosqlite держат потоки — без dispose процесс не завершится
+        await async_engine.dispose()
+    for name, stats in results.items():
+        print(f"  {name:<32} p50={stats['p50']:9.2f} мкс", file=sys.stderr)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rounds", type=parse_ints, default=[10, 11, 12], help="Стоимости bcrypt для замера задержки")
+    parser.add_argument("--workers", type=parse_ints, default=None,
+                        help="Воркеров пула через запятую (по умолчанию 1 и число ядер)")
+    parser.add_argument("--concurrency", type=parse_ints, default=[1, 8, 32])
+    parser.add_argument("--requests", type=int, default=64, help="Проверок/входов на каждый уровень")
+    parser.add_argument("--repeat", type=int, default=5, help="Повторов замера задержки")
+    parser.add_argument("--iterations", type=int, default=2000, help="Итераций замера аутентификации")
+    parser.add_argument("--skip-login", action="store_true", help="Не замерять вход через приложение")
+    parser.add_argument("--json", action="store_true", help="Вывести результат в JSON")
+    parser.add_argument("--output", help="Сохранить JSON-результат в файл")
+    args = parser.parse_args()
+
+    cores = os.cpu_count() or 1
+    workers_list = args.workers or sorted({1, cores})
+
+    # Настройки читаются при импорте приложения (и в процессах пула) — выставляем их заранее
+    tmp = tempfile.mkdtemp()
+    os.environ.setdefault("DB_URL", f"sqlite:///{os.path.join(tmp, 'auth.db')}")
+    os.environ.setdefault("SECRET_KEY", "benchmark")
+    os.environ.setdefault("ALGORITHM", "HS256")
+    os.environ.setdefault("ACCESS_TOKEN_EXPIRE_MINUTES", "60")
+    os.environ["CLASSIFIER_EAGER_LOAD"] = "false"
+    os.environ["PASSWORD_HASH_WORKERS"] = str(max(workers_list))
+    os.environ["PASSWORD_HASH_MAX_PENDING"] = str(max(args.requests, max(args.concurrency)))
+
+    from app.core.config import settings
+
+    results = {
+        "benchmark": "auth",
+        "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+        "revision": git_revision(),
+        "environment": {
+            "python": platform.python_version(),
+            "cpu_count": cores,
+            "platform": platform.platform(),
+            "bcrypt_rounds": settings.PASSWORD_BCRYPT_ROUNDS,
+        },
+        "latency": hash_latency(args.rounds, args.repeat),
+        "pool": asyncio.run(pool_throughput(workers_list, args.requests)),
+    }
+    if not args.skip_login:
+        results["login"] = asyncio.run(login_throughput(args.concurrency, args.requests, max(workers_list)))
+    results["auth_overhead"] = asyncio.run(auth_overhead(args.iterations))
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print(f"Ревизия: {results['revision']}, ядер: {cores}, rounds: {settings.PASSWORD_BCRYPT_ROUNDS}")
+    for item in results["latency"]:
+        print(f"  rounds={item['rounds']:<3} hash p50={item['hash_ms']['p50']:8.1f} мс  "
+              f"verify p50={item['verify_ms']['p50']:8.1f} мс")
+    for item in results["pool"]:
+        print(f"  пул, воркеров={item['workers']:<3} {item['verifies_per_sec']:8.2f} проверок/с  "
+              f"({item['verifies_per_sec_per_core']:.2f} на ядро)")
+    for item in results.get("login", []):
+        print(f"  вход, параллельно={item['concurrency']:<4} {item['logins_per_sec']:8.2f} входов/с  "
+              f"({item['logins_per_sec_per_core']:.2f} на ядро)  p50={item['latency_ms']['p50']:.1f} мс  "
+              f"p99={item['latency_ms']['p99']:.1f} мс")
+    print("Аутентификация запроса:")
+    for name, stats in results["auth_overhead"].items():
+        print(f"  {name:<32} p50={stats['p50']:9.2f} мкс  p95={stats['p95']:9.2f} мкс")
+
+
+if __name__ == "__main__":
+    main()
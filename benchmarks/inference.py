@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк инференса ImageClassifier
+
+Измеряет:
+- холодный старт: импорт torch/timm, загрузка весов, первый forward;
+- задержку по этапам на одном изображении: decode, preprocess, forward, softmax;
+- пропускную способность forward на батчах 1–64 при разном числе потоков torch.
+
+Запуск:
+    python -m benchmarks.inference [--backend eager] [--batch-sizes 1,8,64]
+                                   [--threads 1,4] [--images DIR] [--json | --output FILE]
+"""
+
+import argparse
+import datetime
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.preprocessing import load_images, synthetic_photo  # noqa: E402
+
+
+def parse_ints(value: str):
+    return [int(item) for item in value.split(",") if item.strip()]
+
+
+def summarize(samples_ms):
+    """Сводка по выборке задержек, мс"""
+    values = np.asarray(samples_ms, dtype=np.float64)
+    return {
+        "mean": round(float(values.mean()), 3),
+        "p50": round(float(np.percentile(values, 50)), 3),
+        "p95": round(float(np.percentile(values, 95)), 3),
+        "min": round(float(values.min()), 3),
+    }
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], stderr=subprocess.DEVNULL, text=True
+        ).strip()
+    except Exception:
+        return None
+
+
+def cold_start(backend: str):
+    """Время импорта зависимостей, загрузки модели и первого forward, мс"""
+    started = time.perf_counter()
+    from app.models import classifier as classifier_module
+    classifier_module._lazy_import()
+    imported = time.perf_counter()
+
+    classifier = classifier_module.ImageClassifier(backend=backend)
+    classifier._load_model()
+    loaded = time.perf_counter()
+
+    classifier._forward_batch(classifier_module.torch.zeros(1, 3, 224, 224))
+    first_forward = time.perf_counter()
+
+    return classifier, {
+        "import_ms": round((imported - started) * 1000, 1),
+        "load_ms": round((loaded - imported) * 1000, 1),
+        "first_forward_ms": round((first_forward - loaded) * 1000, 1),
+        "total_ms": round((first_forward - started) * 1000, 1),
+    }
+
+
+def stage_latency(classifier, images, repeat: int):
+    """Задержка этапов для одного изображения (батч 1)"""
+    from app.models.classifier import torch
+
+    preprocessor = classifier.preprocessor
+    stages = {"decode": [], "preprocess": [], "forward": [], "softmax": []}
+    out = np.empty((1, 3, preprocessor.input_size, preprocessor.input_size), dtype=np.float32)
+
+    with torch.no_grad():
+        for _ in range(repeat):
+            for data in images:
+                t0 = time.perf_counter()
+                img = preprocessor.decode(data)
+                img.load()
+                t1 = time.perf_counter()
+                preprocessor.normalize_into(np.asarray(preprocessor.resize_crop(img)), out[0])
+                x = torch.from_numpy(out)
+                t2 = time.perf_counter()
+                _, logits = classifier.model(x)
+                t3 = time.perf_counter()
+                torch.nn.functional.softmax(logits, dim=1).topk(min(5, logits.shape[1]), dim=1)
+                t4 = time.perf_counter()
+
+                stages["decode"].append((t1 - t0) * 1000)
+                stages["preprocess"].append((t2 - t1) * 1000)
+                stages["forward"].append((t3 - t2) * 1000)
+                stages["softmax"].append((t4 - t3) * 1000)
+
+    return {name: summarize(values) for name, values in stages.items()}
+
+
+def throughput(classifier, image: bytes, batch_sizes, thread_counts, min_seconds: float):
+    """Изображений в секунду для forward + softmax по размерам батча и числу потоков"""
+    from app.models.classifier import torch
+
+    template = classifier.preprocessor.array(image)
+    results = []
+    for threads in thread_counts:
+        torch.set_num_threads(threads)
+        for size in batch_sizes:
+            x = torch.from_numpy(np.repeat(template[None], size, axis=0))
+            classifier._forward_batch(x)  # прогрев под этот размер
+
+            latencies = []
+            started = time.perf_counter()
+            while time.perf_counter() - started < min_seconds or len(latencies) < 3:
+                t0 = time.perf_counter()
+                classifier._forward_batch(x)
+                latencies.append((time.perf_counter() - t0) * 1000)
+            elapsed = time.perf_counter() - started
+
+            results.append({
+                "threads": threads,
+                "batch_size": size,
+                "iterations": len(latencies),
+                "images_per_sec": round(size * len(latencies) / elapsed, 2),
+                "batch_ms": summarize(latencies),
+            })
+            print(
+                f"  потоков={threads:<3} батч={size:<3} "
+                f"{results[-1]['images_per_sec']:8.2f} изобр./с",
+                file=sys.stderr,
+            )
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backend", default="eager", help="Бэкенд инференса (eager, int8, torchscript, onnx)")
+    parser.add_argument("--images", help="Каталог с изображениями для замера этапов")
+    parser.add_argument("--repeat", type=int, default=5, help="Повторов замера этапов")
+    parser.add_argument("--batch-sizes", type=parse_ints, default=[1, 2, 4, 8, 16, 32, 64])
+    parser.add_argument("--threads", type=parse_ints, default=None,
+                        help="Числа потоков torch через запятую (по умолчанию 1 и все ядра)")
+    parser.add_argument("--min-seconds", type=float, default=2.0,
+                        help="Минимальная длительность замера на одну конфигурацию")
+    parser.add_argument("--json", action="store_true", help="Вывести результат в JSON")
+    parser.add_argument("--output", help="Сохранить JSON-результат в файл")
+    args = parser.parse_args()
+
+    images = load_images(args.images) if args.images else [synthetic_photo()]
+    if not images:
+        parser.error("В каталоге нет изображений")
+
+    cpus = os.cpu_count() or 1
+    thread_counts = args.threads or sorted({1, cpus})
+
+    classifier, cold = cold_start(args.backend)
+    from app.models.classifier import torch
+
+    results = {
+        "benchmark": "inference",
+        "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+        "revision": git_revision(),
+        "environment": {
+            "python": platform.python_version(),
+            "torch": torch.__version__,
+            "cpu_count": cpus,
+            "platform": platform.platform(),
+        },
+        "backend": classifier.backend,
+        "classes": len(classifier.classes),
+        "cold_start": cold,
+        "stages_ms": stage_latency(classifier, images, args.repeat),
+        "throughput": throughput(classifier, images[0], args.batch_sizes, thread_counts, args.min_seconds),
+    }
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print(f"Бэкенд: {results['backend']}, классов: {results['classes']}, ревизия: {results['revision']}")
+    print(f"Холодный старт: {cold['total_ms']:.0f} мс (импорт {cold['import_ms']:.0f}, "
+          f"загрузка {cold['load_ms']:.0f}, первый forward {cold['first_forward_ms']:.0f})")
+    for name, stats in results["stages_ms"].items():
+        print(f"  {name:<12} p50={stats['p50']:8.2f} мс  p95={stats['p95']:8.2f} мс")
+    best = max(results["throughput"], key=lambda item: item["images_per_sec"])
+    print(f"Лучшая пропускная способность: {best['images_per_sec']:.1f} изобр./с "
+          f"(батч {best['batch_size']}, потоков {best['threads']})")
+
+
+if __name__ == "__main__":
+    main()
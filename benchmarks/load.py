@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+"""
+Нагрузочный тест эндпоинтов классификации через in-process ASGI-клиент
+
+Приложение запускается в этом же процессе (httpx.ASGITransport), сеть и
+uvicorn в замер не входят — измеряется стоимость самого сервиса:
+пул инференса, микро-батчинг, кэш, пре-процессинг.
+
+Запуск:
+    python -m benchmarks.load [--endpoint /classification/classify]
+                              [--concurrency 1,4,16,64] [--requests 200]
+                              [--images DIR] [--cache] [--json | --output FILE]
+
+По умолчанию кэш результатов выключен и каждое изображение уникально,
+иначе замер показывал бы скорость кэша, а не модели.
+"""
+
+import argparse
+import asyncio
+import datetime
+import io
+import json
+import os
+import sys
+import time
+from collections import Counter
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.inference import git_revision, parse_ints, summarize  # noqa: E402
+from benchmarks.preprocessing import load_images, synthetic_photo  # noqa: E402
+
+
+def distinct_images(base: bytes, count: int):
+    """Копии изображения с изменённым пикселем — разные хэши для кэша"""
+    from PIL import Image
+
+    img = Image.open(io.BytesIO(base)).convert("RGB")
+    images = []
+    for i in range(count):
+        copy = img.copy()
+        copy.putpixel((0, 0), (i % 256, (i // 256) % 256, 0))
+        buf = io.BytesIO()
+        copy.save(buf, format="JPEG", quality=90)
+        images.append(buf.getvalue())
+    return images
+
+
+async def run_level(client, endpoint: str, images, concurrency: int, total: int):
+    """Отправляет total запросов, держа concurrency одновременно"""
+    latencies = []
+    statuses = Counter()
+    counter = iter(range(total))
+
+    async def worker():
+        for i in counter:
+            data = images[i % len(images)]
+            started = time.perf_counter()
+            try:
+                response = await client.post(
+                    endpoint, files={"file": (f"{i}.jpg", data, "image/jpeg")}
+                )
+                statuses[str(response.status_code)] += 1
+            except Exception as e:
+                statuses[type(e).__name__] += 1
+            latencies.append((time.perf_counter() - started) * 1000)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    ok = statuses.get("200", 0)
+    return {
+        "concurrency": concurrency,
+        "requests": total,
+        "duration_s": round(elapsed, 3),
+        "requests_per_sec": round(total / elapsed, 2),
+        "success_per_sec": round(ok / elapsed, 2),
+        "statuses": dict(statuses),
+        "latency_ms": {
+            **summarize(latencies),
+            "p99": round(float(np.percentile(latencies, 99)), 3),
+            "max": round(float(max(latencies)), 3),
+        },
+    }
+
+
+async def run(args, images):
+    import httpx
+    from app.main import app
+    from app.models.classifier import get_classifier
+
+    # Лайфспан ASGITransport не запускает — загружаем и прогреваем модель явно
+    classifier = get_classifier()
+    started = time.perf_counter()
+    await asyncio.to_thread(classifier.warmup, [1])
+    warmup_ms = (time.perf_counter() - started) * 1000
+
+    transport = httpx.ASGITransport(app=app)
+    levels = []
+    async with httpx.AsyncClient(transport=transport, base_url="http://benchmark", timeout=None) as client:
+        for concurrency in args.concurrency:
+            level = await run_level(client, args.endpoint, images, concurrency, args.requests)
+            levels.append(level)
+            print(
+                f"  параллельно={concurrency:<4} {level['requests_per_sec']:8.2f} rps  "
+                f"p50={level['latency_ms']['p50']:8.1f} мс  p99={level['latency_ms']['p99']:8.1f} мс  "
+                f"{level['statuses']}",
+                file=sys.stderr,
+            )
+
+    return {
+        "warmup_ms": round(warmup_ms, 1),
+        "batch": classifier.batch_stats(),
+        "cache": classifier.cache_stats(),
+        "levels": levels,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--endpoint", default="/classification/classify")
+    parser.add_argument("--concurrency", type=parse_ints, default=[1, 4, 16, 64])
+    parser.add_argument("--requests", type=int, default=200, help="Запросов на каждый уровень параллельности")
+    parser.add_argument("--images", help="Каталог с изображениями")
+    parser.add_argument("--cache", action="store_true", help="Не отключать кэш результатов")
+    parser.add_argument("--json", action="store_true", help="Вывести результат в JSON")
+    parser.add_argument("--output", help="Сохранить JSON-результат в файл")
+    args = parser.parse_args()
+
+    # Настройки читаются при импорте приложения — выставляем их заранее
+    if not args.cache:
+        os.environ["CLASSIFIER_CACHE_ENABLED"] = "false"
+    os.environ["CLASSIFIER_EAGER_LOAD"] = "false"
+
+    base = load_images(args.images) if args.images else [synthetic_photo(1600, 1200)]
+    if not base:
+        parser.error("В каталоге нет изображений")
+    images = base if args.cache else distinct_images(base[0], max(args.requests, len(base)))
+
+    from app.core.config import settings
+
+    results = {
+        "benchmark": "load",
+        "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+        "revision": git_revision(),
+        "endpoint": args.endpoint,
+        "settings": {
+            "backend": settings.CLASSIFIER_BACKEND,
+            "batching": settings.CLASSIFIER_BATCHING_ENABLED,
+            "batch_max_size": settings.CLASSIFIER_BATCH_MAX_SIZE,
+            "inference_workers": settings.INFERENCE_WORKERS,
+            "inference_max_pending": settings.INFERENCE_MAX_PENDING,
+            "cache": settings.CLASSIFIER_CACHE_ENABLED,
+        },
+        **asyncio.run(run(args, images)),
+    }
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print(f"Эндпоинт {results['endpoint']}, ревизия {results['revision']}, прогрев {results['warmup_ms']:.0f} мс")
+    for level in results["levels"]:
+        print(
+            f"  параллельно={level['concurrency']:<4} {level['requests_per_sec']:8.2f} rps  "
+            f"p95={level['latency_ms']['p95']:8.1f} мс  ошибок={level['requests'] - level['statuses'].get('200', 0)}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк оценки порции
+
+Измеряет:
+- задержку сегментации и оценки веса по режимам и разрешениям маски
+  (classical и deeplab; без --weights DeepLab берётся со случайными весами —
+  для замера скорости этого достаточно);
+- полный путь фото -> класс -> граммы -> калории: последовательно и с
+  параллельными классификацией и сегментацией, как в /classification/classify-portion.
+
+Запуск:
+    python -m benchmarks.portion [--resolutions 64,128,256] [--weights FILE]
+                                 [--images DIR] [--json | --output FILE]
+"""
+
+import argparse
+import datetime
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.inference import git_revision, parse_ints, summarize  # noqa: E402
+from benchmarks.preprocessing import load_images, synthetic_photo  # noqa: E402
+
+
+def random_deeplab_weights(directory: str) -> str:
+    """state_dict DeepLabV3-MobileNetV3 со случайными весами (2 класса: фон и еда)"""
+    import torch
+    from torchvision.models.segmentation import deeplabv3_mobilenet_v3_large
+
+    path = os.path.join(directory, "segmentation_random.pth")
+    model = deeplabv3_mobilenet_v3_large(weights=None, weights_backbone=None, num_classes=2, aux_loss=False)
+    torch.save(model.state_dict(), path)
+    return path
+
+
+def segmentation_latency(estimator, decoded, repeat: int):
+    """Задержка masks() и estimate() для уже декодированных изображений, мс"""
+    estimator.estimate(decoded[0])  # прогрев (для DeepLab — загрузка модели)
+
+    masks, estimates = [], []
+    for _ in range(repeat):
+        for img in decoded:
+            t0 = time.perf_counter()
+            estimator.masks([img])
+            t1 = time.perf_counter()
+            estimator.estimate(img)
+            t2 = time.perf_counter()
+            masks.append((t1 - t0) * 1000)
+            estimates.append((t2 - t1) * 1000)
+    return {"mask_ms": summarize(masks), "estimate_ms": summarize(estimates)}
+
+
+def pipeline_latency(classifier, estimator, nutrition_db, images, repeat: int):
+    """Фото -> класс -> граммы -> калории: последовательно и параллельно, мс"""
+    def run(data, pool=None):
+        img = classifier.preprocessor.decode(data)
+        if pool is None:
+            ranked = classifier.classify_batch([img], 1)[0]
+            estimate = estimator.estimate(img)
+        else:
+            ranked_future = pool.submit(classifier.classify_batch, [img], 1)
+            estimate = pool.submit(estimator.estimate, img).result()
+            ranked = ranked_future.result()[0]
+        class_name = ranked[0][0]
+        typical = nutrition_db.lookup(class_name)
+        if typical is not None:
+            estimate = estimator.reweigh(estimate, typical.grams)
+        return nutrition_db.lookup(class_name, estimate.grams)
+
+    run(images[0])  # прогрев
+    sequential, concurrent = [], []
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        for _ in range(repeat):
+            for data in images:
+                t0 = time.perf_counter()
+                run(data)
+                t1 = time.perf_counter()
+                run(data, pool)
+                t2 = time.perf_counter()
+                sequential.append((t1 - t0) * 1000)
+                concurrent.append((t2 - t1) * 1000)
+    return {"sequential_ms": summarize(sequential), "concurrent_ms": summarize(concurrent)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--images", help="Каталог с изображениями")
+    parser.add_argument("--repeat", type=int, default=5, help="Повторов замера")
+    parser.add_argument("--resolutions", type=parse_ints, default=[64, 128, 256],
+                        help="Стороны маски через запятую")
+    parser.add_argument("--weights", help="Веса DeepLab (по умолчанию — случайные)")
+    parser.add_argument("--skip-deeplab", action="store_true", help="Замерять только classical")
+    parser.add_argument("--skip-pipeline", action="store_true", help="Не замерять полный путь с классификатором")
+    parser.add_argument("--json", action="store_true", help="Вывести результат в JSON")
+    parser.add_argument("--output", help="Сохранить JSON-результат в файл")
+    args = parser.parse_args()
+
+    from app.models.nutrition import get_nutrition_db
+    from app.models.portion import CLASSICAL, DEEPLAB, PortionEstimator
+    from app.models.preprocessing import Preprocessor
+
+    images = load_images(args.images) if args.images else [synthetic_photo()]
+    if not images:
+        parser.error("В каталоге нет изображений")
+    preprocessor = Preprocessor()
+    decoded = [preprocessor.decode(data) for data in images]
+
+    results = {
+        "benchmark": "portion",
+        "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+        "revision": git_revision(),
+        "environment": {
+            "python": platform.python_version(),
+            "cpu_count": os.cpu_count() or 1,
+            "platform": platform.platform(),
+        },
+        "segmentation": [],
+    }
+
+    with tempfile.TemporaryDirectory() as tmp:
+        modes = [CLASSICAL]
+        weights = None
+        if not args.skip_deeplab:
+            modes.append(DEEPLAB)
+            weights = args.weights or random_deeplab_weights(tmp)
+
+        for mode in modes:
+            for resolution in args.resolutions:
+                estimator = PortionEstimator(mode=mode, resolution=resolution, model_path=weights or "")
+                stats = segmentation_latency(estimator, decoded, args.repeat)
+                results["segmentation"].append({"mode": mode, "resolution": resolution, **stats})
+                print(f"  {mode:<10} {resolution:>4}px  маска p50={stats['mask_ms']['p50']:8.2f} мс",
+                      file=sys.stderr)
+
+    if not args.skip_pipeline:
+        from app.models.classifier import ImageClassifier
+
+        classifier = ImageClassifier()
+        classifier._load_model()
+        estimator = PortionEstimator(mode=CLASSICAL)
+        results["pipeline"] = {
+            "mode": estimator.mode,
+            "resolution": estimator.resolution,
+            **pipeline_latency(classifier, estimator, get_nutrition_db(), images, args.repeat),
+        }
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print(f"Ревизия: {results['revision']}")
+    for item in results["segmentation"]:
+        print(f"  {item['mode']:<10} {item['resolution']:>4}px  "
+              f"маска p50={item['mask_ms']['p50']:8.2f} мс  "
+              f"оценка p50={item['estimate_ms']['p50']:8.2f} мс")
+    if "pipeline" in results:
+        pipeline = results["pipeline"]
+        print(f"Фото -> калории ({pipeline['mode']}, {pipeline['resolution']}px): "
+              f"последовательно p50={pipeline['sequential_ms']['p50']:.1f} мс, "
+              f"параллельно p50={pipeline['concurrent_ms']['p50']:.1f} мс")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк пре-процессинга: torchvision-цепочка против Preprocessor
+
+Запуск:
+    python -m benchmarks.preprocessing [--images DIR] [--repeat N] [--json]
+
+Без --images используется синтетическая 12 Мп JPEG-фотография.
+"""
+
+import argparse
+import io
+import json
+import os
+import sys
+import time
+
+import numpy as np
+from PIL import Image
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.models.preprocessing import MEAN, STD, Preprocessor  # noqa: E402
+
+
+def synthetic_photo(width: int = 4032, height: int = 3024) -> bytes:
+    """Синтетическая «фотография»: градиенты с шумом, сохранённые в JPEG q=90"""
+    rng = np.random.default_rng(0)
+    y, x = np.mgrid[0:height, 0:width].astype(np.float32)
+    base = np.stack([
+        127 + 100 * np.sin(x / 211.0),
+        127 + 100 * np.cos(y / 173.0),
+        127 + 100 * np.sin((x + y) / 307.0),
+    ], axis=-1)
+    noise = rng.normal(0, 12, size=base.shape)
+    pixels = np.clip(base + noise, 0, 255).astype(np.uint8)
+
+    buf = io.BytesIO()
+    Image.fromarray(pixels).save(buf, format="JPEG", quality=90)
+    return buf.getvalue()
+
+
+def load_images(directory):
+    images = []
+    for name in sorted(os.listdir(directory)):
+        if name.lower().endswith((".jpg", ".jpeg", ".png", ".webp")):
+            with open(os.path.join(directory, name), "rb") as f:
+                images.append(f.read())
+    return images
+
+
+def reference_pipeline():
+    """Текущая цепочка: Image.open().convert() + transforms.Compose"""
+    from torchvision import transforms
+
+    transform = transforms.Compose([
+        transforms.Lambda(lambda img: img.convert('RGB')),
+        transforms.Resize(256),
+        transforms.CenterCrop(224),
+        transforms.ToTensor(),
+        transforms.Normalize(list(MEAN), list(STD)),
+    ])
+
+    def run(data: bytes) -> np.ndarray:
+        img = Image.open(io.BytesIO(data)).convert('RGB')
+        return transform(img).numpy()
+
+    return run
+
+
+def measure(fn, images, repeat: int) -> float:
+    """Среднее время на изображение, мс"""
+    fn(images[0])  # прогрев
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for data in images:
+            fn(data)
+    return (time.perf_counter() - start) * 1000 / (repeat * len(images))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--images", help="Каталог с изображениями")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--json", action="store_true", help="Вывести результат в JSON")
+    args = parser.parse_args()
+
+    images = load_images(args.images) if args.images else [synthetic_photo()]
+    if not images:
+        parser.error("В каталоге нет изображений")
+
+    reference = reference_pipeline()
+    fast = Preprocessor()
+    no_draft = Preprocessor(draft=False)
+
+    # Сравнение тензоров с эталонной цепочкой
+    diffs = {"fast": [], "no_draft": []}
+    for data in images:
+        expected = reference(data)
+        diffs["fast"].append(np.abs(fast.array(data) - expected))
+        diffs["no_draft"].append(np.abs(no_draft.array(data) - expected))
+
+    results = {
+        "images": len(images),
+        "image_bytes": int(np.mean([len(data) for data in images])),
+        "ms_per_image": {
+            "torchvision": round(measure(reference, images, args.repeat), 2),
+            "preprocessor": round(measure(fast.array, images, args.repeat), 2),
+            "preprocessor_no_draft": round(measure(no_draft.array, images, args.repeat), 2),
+        },
+        "batch_ms_per_image": round(
+            measure(lambda data: fast.batch([data] * 8), images, args.repeat) / 8, 2
+        ),
+        "diff_vs_torchvision": {
+            name: {
+                "max_abs": round(float(max(d.max() for d in values)), 4),
+                "mean_abs": round(float(np.mean([d.mean() for d in values])), 4),
+            }
+            for name, values in diffs.items()
+        },
+    }
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print(f"Изображений: {results['images']}, средний размер {results['image_bytes']:,} байт")
+    for name, value in results["ms_per_image"].items():
+        print(f"  {name:<24} {value:8.2f} мс/изобр.")
+    print(f"  {'preprocessor (батч 8)':<24} {results['batch_ms_per_image']:8.2f} мс/изобр.")
+    for name, diff in results["diff_vs_torchvision"].items():
+        print(f"  отличие {name:<16} max={diff['max_abs']:.4f} mean={diff['mean_abs']:.4f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+Проверка количества SQL-запросов на endpoint.
+
+Поднимает приложение на временной SQLite, проходит сценарий пользователя
+и считает выполненные SQL-команды для каждого запроса. Если endpoint
+делает больше запросов, чем записано в QUERY_BUDGET, скрипт завершается
+с кодом 1 — так ловятся N+1 и ленивые загрузки связей.
+
+Снимок пользователя перед каждым замером уже в кэше (как в рабочем
+режиме), поэтому запрос аутентификации в бюджет не входит.
+
+Запуск:
+    python check_queries.py
+"""
+
+import os
+import sys
+import tempfile
+
+_db_dir = tempfile.mkdtemp()
+os.environ.setdefault("DB_URL", f"sqlite:///{os.path.join(_db_dir, 'queries.db')}")
+os.environ.setdefault("SECRET_KEY", "check-queries")
+os.environ.setdefault("ALGORITHM", "HS256")
+os.environ.setdefault("ACCESS_TOKEN_EXPIRE_MINUTES", "60")
+os.environ.setdefault("CLASSIFIER_EAGER_LOAD", "false")
+
+from fastapi.testclient import TestClient  # noqa: E402
+from sqlalchemy import event  # noqa: E402
+
+from app.db import async_engine  # noqa: E402
+from app.main import app  # noqa: E402
+
+# Максимум SQL-команд на запрос
+QUERY_BUDGET = {
+    "GET /users/me": 0,
+    "GET /onboardingPlan/status": 0,
+    "POST /onboardingPlan/complete": 4,
+    "GET /profiles/me": 1,
+    "PUT /profiles/me": 3,
+    "GET /plans/me": 1,
+    "POST /plans/calculate": 2,
+    "DELETE /plans/me": 2,
+    "POST /meals/": 2,
+    "GET /meals/": 1,
+    "GET /meals/grouped": 2,
+    "GET /meals/summary/2024-05-01": 1,
+    "GET /analytics/progress": 2,
+}
+
+PROFILE = {
+    "username": "check_user", "age": 30, "gender": 1, "height": 180, "weight": 80,
+    "activity_level": 3, "goal_type": "loss", "goal_kg": 75,
+}
+MEAL = {"datetime": "2024-05-01T12:00:00", "calories": 500, "proteins": 20, "fats": 15, "carbs": 60}
+
+
+def main():
+    statements = []
+
+    @event.listens_for(async_engine.sync_engine, "before_cursor_execute")
+    def count(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    failed = False
+    with TestClient(app) as client:
+        client.post("/auth/register", json={"email": "check@example.com", "password": "secret123"})
+        token = client.post(
+            "/auth/login", data={"username": "check@example.com", "password": "secret123"}
+        ).json()["access_token"]
+        headers = {"Authorization": f"Bearer {token}"}
+
+        scenario = [
+            ("GET", "/users/me", None),
+            ("GET", "/onboardingPlan/status", None),
+            ("POST", "/onboardingPlan/complete", PROFILE),
+            ("GET", "/profiles/me", None),
+            ("PUT", "/profiles/me", {"weight": 78}),
+            ("GET", "/plans/me", None),
+            ("POST", "/plans/calculate", None),
+            ("DELETE", "/plans/me", None),
+            ("POST", "/meals/", MEAL),
+            ("GET", "/meals/", None),
+            ("GET", "/meals/grouped", None),
+            ("GET", "/meals/summary/2024-05-01", None),
+            ("POST", "/plans/calculate", None),
+            ("GET", "/analytics/progress", None),
+        ]
+        for method, path, body in scenario:
+            # Прогреваем снимок пользователя (после записей он сброшен)
+            client.get("/users/me", headers=headers)
+
+            statements.clear()
+            response = client.request(method, path, json=body, headers=headers)
+            executed = list(statements)
+
+            name = f"{method} {path}"
+            budget = QUERY_BUDGET[name]
+            ok = response.status_code < 400 and len(executed) <= budget
+            failed |= not ok
+            print(f"{'OK  ' if ok else 'FAIL'} {name:<36} {response.status_code}  "
+                  f"запросов: {len(executed)} (бюджет {budget})")
+            if not ok:
+                for statement in executed:
+                    print(f"        {' '.join(statement.split())[:120]}")
+
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
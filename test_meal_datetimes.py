@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""
+Тест времени приёма пищи с часовым поясом
+
+Время с поясом (например, "...Z" или "-05:00") сохраняется как naive UTC:
+на PostgreSQL asyncpg отклоняет aware-значения для колонок без пояса.
+На SQLite ошибку не воспроизвести, поэтому проверяется само приведение:
+сохранённое время, день сводки и фильтры списка.
+
+Запуск:
+    python test_meal_datetimes.py   или   python -m pytest test_meal_datetimes.py
+"""
+
+import os
+import sys
+import tempfile
+
+_db_dir = tempfile.mkdtemp()
+os.environ.setdefault("DB_URL", f"sqlite:///{os.path.join(_db_dir, 'datetimes.db')}")
+os.environ.setdefault("SECRET_KEY", "test-datetimes")
+os.environ.setdefault("ALGORITHM", "HS256")
+os.environ.setdefault("ACCESS_TOKEN_EXPIRE_MINUTES", "60")
+os.environ.setdefault("CLASSIFIER_EAGER_LOAD", "false")
+
+from fastapi.testclient import TestClient  # noqa: E402
+
+from app.main import app  # noqa: E402
+
+MEAL = {"datetime": "2024-05-01T23:30:00-05:00", "calories": 500, "proteins": 20, "fats": 15, "carbs": 60}
+
+
+def test_post_meal_with_timezone():
+    """POST /meals/ с поясом: запись в UTC, сводка за день по UTC, фильтры с поясом работают"""
+    with TestClient(app) as client:
+        client.post("/auth/register", json={"email": "tz@example.com", "password": "secret123"})
+        token = client.post(
+            "/auth/login", data={"username": "tz@example.com", "password": "secret123"}
+        ).json()["access_token"]
+        headers = {"Authorization": f"Bearer {token}"}
+
+        response = client.post("/meals/", json=MEAL, headers=headers)
+        assert response.status_code == 200, response.text
+        assert response.json()["datetime"] == "2024-05-02T04:30:00"
+
+        response = client.post("/meals/", json={**MEAL, "datetime": "2024-05-02T08:00:00Z"}, headers=headers)
+        assert response.status_code == 200, response.text
+        assert response.json()["datetime"] == "2024-05-02T08:00:00"
+
+        # 23:30 по UTC-5 — это уже 2 мая по UTC
+        summary = client.get("/meals/summary/2024-05-02", headers=headers).json()
+        assert summary["meals_count"] == 2, summary
+
+        response = client.get("/meals/", params={
+            "date_from": "2024-05-02T06:00:00+02:00",  # 04:00 UTC
+            "date_to": "2024-05-02T10:00:00+02:00",    # 08:00 UTC, не включительно
+        }, headers=headers)
+        assert response.status_code == 200, response.text
+        assert [meal["datetime"] for meal in response.json()] == ["2024-05-02T04:30:00"]
+
+
+if __name__ == "__main__":
+    test_post_meal_with_timezone()
+    print("✅ Время с часовым поясом сохраняется в UTC")
+    sys.exit(0)
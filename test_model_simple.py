@@ -19,8 +19,9 @@ def test_model_loading():
         classifier = get_classifier()
         print("✅ Классификатор создан")
         
-        # Проверяем готовность (это вызовет загрузку модели)
-        print(" Проверяю готовность модели...")
+        # Загружаем и прогреваем модель, затем проверяем готовность
+        print(" Загружаю модель...")
+        classifier.warmup()
         ready = classifier.is_ready()
         print(f"Готовность: {ready}")
         